@@ -1,19 +1,24 @@
 #!/usr/bin/env python3
 import argparse
+import fcntl
 import getpass
-import crypt
 import json
 import os
 import subprocess
-from datetime import datetime
+from execution_log import log_execution
+from session import check_login_status, open_session, close_session
 
-LOG_PATH = os.path.join(os.path.expanduser("~"), "ID1FS/log")
-LOG_FILE_NAME = "execution_log.txt"
 USERS_FILE = "/ID1FS/bin/users.json"
-LOGIN_STATUS_FILE = os.path.join(os.path.expanduser("~"), "ID1FS/metadata/login_status.json")
+# Comptes du backend "fichier" : une ligne nom:empreinte par utilisateur, sans toucher au système
+LOCAL_ACCOUNTS_FILE = os.environ.get("ID1FS_ACCOUNTS_FILE", os.path.expanduser("~/ID1FS/metadata/accounts.passwd"))
+DEFAULT_BACKEND = os.environ.get("ID1FS_USER_BACKEND", "system")
+# Ni users.json ni le backend "fichier" ne reçoivent d'empreinte pour un compte sans mot de passe :
+# "!" y marque, comme dans /etc/shadow, un mot de passe inutilisable
+MOT_DE_PASSE_DESACTIVE = "!"
 
 def crypter_mot_de_passe(mot_de_passe):
-    # Utilisation de la méthode SHA-512 pour le cryptage du mot de passe
+    # Utilisation de la méthode SHA-512 pour le cryptage du mot de passe ; crypt n'est chargé qu'à la première empreinte
+    import crypt
     return crypt.crypt(mot_de_passe, crypt.mksalt(crypt.METHOD_SHA512))
 
 def ajouter_utilisateur_systeme(nom_utilisateur):
@@ -37,18 +42,129 @@ def ajouter_utilisateur_systeme(nom_utilisateur):
     subprocess.run(["sudo", "passwd", nom_utilisateur])
 
 def enregistrer_utilisateur(nom_utilisateur):
-    # Charger les utilisateurs existants depuis le fichier users.json s'il existe
-    utilisateurs = {}
+    # Même écriture que l'ajout en masse : sous verrou, atomique, sans empreinte dans users.json
+    with open(USERS_FILE + ".lock", "a") as verrou:
+        fcntl.flock(verrou, fcntl.LOCK_EX)
+        utilisateurs = charger_utilisateurs()
+        utilisateurs[nom_utilisateur] = MOT_DE_PASSE_DESACTIVE
+        ecrire_utilisateurs(utilisateurs)
+
+def charger_utilisateurs():
     if os.path.exists(USERS_FILE):
         with open(USERS_FILE, "r") as file:
-            utilisateurs = json.load(file)
-
-    # Enregistrer le nouvel utilisateur
-    utilisateurs[nom_utilisateur] = crypter_mot_de_passe("")  # empty password as a placeholder
+            return json.load(file)
+    return {}
 
-    # Écrire la liste mise à jour dans le fichier users.json
-    with open(USERS_FILE, "w") as file:
+def ecrire_utilisateurs(utilisateurs):
+    # Écriture atomique : fichier temporaire (lisible par le seul propriétaire) puis rename,
+    # users.json n'est jamais à moitié écrit
+    temp_path = f"{USERS_FILE}.{os.getpid()}.tmp"
+    with os.fdopen(os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "w") as file:
         json.dump(utilisateurs, file)
+    os.replace(temp_path, USERS_FILE)
+
+def lire_fichier_utilisateurs(chemin):
+    # Lignes CSV : nom[,mot_de_passe] ; les lignes vides et les commentaires (#) sont ignorés.
+    # Sans mot de passe (None), le compte est créé désactivé
+    import csv
+    comptes = []
+    with open(chemin, "r", newline="") as file:
+        for ligne in csv.reader(file):
+            if not ligne or not ligne[0].strip() or ligne[0].startswith("#"):
+                continue
+            comptes.append((ligne[0].strip(), ligne[1] if len(ligne) > 1 and ligne[1] != "" else None))
+    return comptes
+
+def comptes_systeme_existants():
+    # Une seule lecture de la base des comptes au lieu d'un "id" par utilisateur
+    resultat = subprocess.run(["getent", "passwd"], capture_output=True, text=True, check=True)
+    return {ligne.split(":", 1)[0] for ligne in resultat.stdout.splitlines()}
+
+def creer_comptes_systeme(comptes):
+    # adduser (mot de passe désactivé) pour chaque nouveau compte, puis, en un seul appel à chpasswd, les mots de passe
+    # des seuls comptes qui en ont un. Un échec n'arrête pas les autres comptes
+    crees = []
+    echecs = []
+    for nom, empreinte in comptes:
+        try:
+            subprocess.run(["sudo", "adduser", "--disabled-password", "--gecos", "", nom],
+                           check=True, stdout=subprocess.DEVNULL)
+            crees.append((nom, empreinte))
+        except (OSError, subprocess.CalledProcessError) as e:
+            echecs.append((nom, str(e)))
+    avec_mot_de_passe = [(nom, empreinte) for nom, empreinte in crees if empreinte is not None]
+    if avec_mot_de_passe:
+        try:
+            subprocess.run(["sudo", "chpasswd", "-e"], input="".join(f"{nom}:{empreinte}\n" for nom, empreinte in avec_mot_de_passe),
+                           text=True, check=True)
+        except (OSError, subprocess.CalledProcessError) as e:
+            # Les comptes restent créés, mot de passe désactivé
+            echecs.extend((nom, f"mot de passe non appliqué : {e}") for nom, _ in avec_mot_de_passe)
+    return [nom for nom, _ in crees], echecs
+
+def comptes_fichier_existants():
+    if not os.path.exists(LOCAL_ACCOUNTS_FILE):
+        return set()
+    with open(LOCAL_ACCOUNTS_FILE, "r") as file:
+        return {ligne.split(":", 1)[0] for ligne in file.read().splitlines()}
+
+def creer_comptes_fichier(comptes):
+    os.makedirs(os.path.dirname(LOCAL_ACCOUNTS_FILE), exist_ok=True)
+    with os.fdopen(os.open(LOCAL_ACCOUNTS_FILE, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o600), "a+") as file:
+        fcntl.flock(file, fcntl.LOCK_EX)
+        file.seek(0)
+        existants = {ligne.split(":", 1)[0] for ligne in file.read().splitlines()}
+        crees = [(nom, empreinte) for nom, empreinte in comptes if nom not in existants]
+        file.write("".join(f"{nom}:{empreinte or MOT_DE_PASSE_DESACTIVE}\n" for nom, empreinte in crees))
+    return [nom for nom, _ in crees], []
+
+# Backend -> (comptes existants, création d'une liste de nouveaux (nom, empreinte ou None) qui retourne
+# les noms créés et les échecs (nom, message))
+BACKENDS = {
+    "system": (comptes_systeme_existants, creer_comptes_systeme),
+    "fichier": (comptes_fichier_existants, creer_comptes_fichier),
+}
+
+def ajouter_utilisateurs_depuis_fichier(chemin, backend=DEFAULT_BACKEND, jobs=None):
+    log_execution("add", f"Ajout des utilisateurs listés dans '{chemin}' (backend {backend}).")
+    comptes = lire_fichier_utilisateurs(chemin)
+    noms = [nom for nom, _ in comptes]
+    if len(set(noms)) != len(noms):
+        print(f"Le fichier '{chemin}' contient des noms en double.")
+        log_execution("Error", f"Duplicate user names in '{chemin}'.")
+        return
+
+    comptes_existants, creer_comptes = BACKENDS[backend]
+    existants = comptes_existants()
+    nouveaux = [(nom, mot_de_passe) for nom, mot_de_passe in comptes if nom not in existants]
+
+    # Le hachage SHA-512 est coûteux en CPU : il est réparti sur plusieurs processus
+    mots_de_passe = [mot_de_passe for _, mot_de_passe in nouveaux if mot_de_passe is not None]
+    empreintes = []
+    if mots_de_passe:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            empreintes = list(executor.map(crypter_mot_de_passe, mots_de_passe,
+                                           chunksize=max(1, len(mots_de_passe) // (4 * (jobs or os.cpu_count() or 1)))))
+    empreintes = iter(empreintes)
+    comptes = [(nom, next(empreintes) if mot_de_passe is not None else None) for nom, mot_de_passe in nouveaux]
+
+    crees, echecs = creer_comptes(comptes)
+
+    # users.json n'est lu et réécrit qu'une seule fois, sous verrou ; il ne garde pas les empreintes
+    if crees:
+        with open(USERS_FILE + ".lock", "a") as verrou:
+            fcntl.flock(verrou, fcntl.LOCK_EX)
+            utilisateurs = charger_utilisateurs()
+            utilisateurs.update((nom, MOT_DE_PASSE_DESACTIVE) for nom in crees)
+            ecrire_utilisateurs(utilisateurs)
+
+    for nom, message in echecs:
+        print(f"Erreur pour l'utilisateur {nom} : {message}")
+    deja_existants = len(noms) - len(nouveaux)
+    print(f"{len(crees)} utilisateur(s) ajouté(s), {deja_existants} déjà existant(s), {len(echecs)} erreur(s).")
+    log_execution("add", f"{len(crees)} user(s) added from '{chemin}', {deja_existants} already existed, {len(echecs)} error(s).",
+                  success=not echecs)
 
 def supprimer_utilisateur(nom_utilisateur):
     log_execution("delete")
@@ -62,19 +178,13 @@ def supprimer_utilisateur(nom_utilisateur):
         print(f"L'utilisateur {nom_utilisateur} n'existe pas.")
 
 def supprimer_utilisateur_fichier(nom_utilisateur):
-    # Charger les utilisateurs existants depuis le fichier users.json s'il existe
-    utilisateurs = {}
-    if os.path.exists(USERS_FILE):
-        with open(USERS_FILE, "r") as file:
-            utilisateurs = json.load(file)
-
-        # Supprimer l'utilisateur du fichier users.json
+    # Supprimer l'utilisateur du fichier users.json s'il y figure, avec la même écriture atomique
+    with open(USERS_FILE + ".lock", "a") as verrou:
+        fcntl.flock(verrou, fcntl.LOCK_EX)
+        utilisateurs = charger_utilisateurs()
         if nom_utilisateur in utilisateurs:
             del utilisateurs[nom_utilisateur]
-
-            # Écrire la liste mise à jour dans le fichier users.json
-            with open(USERS_FILE, "w") as file:
-                json.dump(utilisateurs, file)
+            ecrire_utilisateurs(utilisateurs)
 
 def changer_utilisateur(nom_utilisateur):
     log_execution("switch")
@@ -83,23 +193,15 @@ def changer_utilisateur(nom_utilisateur):
     except subprocess.CalledProcessError:
         print(f"L'utilisateur {nom_utilisateur} n'existe pas.")
 
-def check_login_status():
-    # Check the login status from the login_status.json file
-    if os.path.exists(LOGIN_STATUS_FILE):
-        with open(LOGIN_STATUS_FILE, "r") as status_file:
-            login_status = json.load(status_file)
-            return login_status.get("status", False)
-    return False
-
 def login():
     if check_user_credentials():
         print("Login successful!")
         save_login_status(True)
-        log_execution("Login", True)
+        log_execution("Login", success=True)
     else:
         print("Login failed. Exiting.")
         save_login_status(False)
-        log_execution("Login", False)
+        log_execution("Login", success=False)
 
 def check_user_credentials():
     # Simulate successful credential verification
@@ -108,30 +210,26 @@ def check_user_credentials():
 def logout():
     print("Logout successful.")
     save_login_status(False)
-    log_execution("Logout", True)
+    log_execution("Logout", success=True)
 
 def save_login_status(status):
-    # Save the login status to the login_status.json file
-    with open(LOGIN_STATUS_FILE, "w") as status_file:
-        json.dump({"status": status}, status_file)
-
-def log_execution(action, success=None):
-    log_file_path = os.path.join(LOG_PATH, LOG_FILE_NAME)
-
-    with open(log_file_path, "a") as log_file:
-        log_file.write(f"Action: {action}\n")
-        log_file.write(f"Timestamp: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-        if success is not None:
-            log_file.write(f"Success: {success}\n")
-        log_file.write("\n")
+    # Ouvre ou ferme la session de l'utilisateur courant
+    if status:
+        open_session()
+    else:
+        close_session()
 
-def main():
+def build_parser():
     parser = argparse.ArgumentParser(description="Gérer les utilisateurs.")
     parser.add_argument("action", choices=["add", "delete", "switch"], help="Action à effectuer (add, delete, switch).")
-    parser.add_argument("nom_utilisateur", help="Nom de l'utilisateur.")
-
-    args = parser.parse_args()
+    parser.add_argument("nom_utilisateur", nargs="?", help="Nom de l'utilisateur.")
+    parser.add_argument("--from-file", metavar="FICHIER", help="Avec add : ajouter tous les utilisateurs d'un fichier CSV (nom,mot_de_passe)")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default=DEFAULT_BACKEND,
+                        help=f"Création des comptes avec --from-file : comptes système ou fichier local (défaut: {DEFAULT_BACKEND})")
+    parser.add_argument("-j", "--jobs", type=int, help="Nombre de processus de hachage (défaut: nombre de CPU)")
+    return parser
 
+def run(args):
     if args.action == "switch":
         changer_utilisateur(args.nom_utilisateur)
     else:
@@ -140,12 +238,22 @@ def main():
             print("You need to login first.")
             return
 
-        if args.action == "add":
+        if args.action == "add" and args.from_file:
+            ajouter_utilisateurs_depuis_fichier(args.from_file, args.backend, args.jobs)
+
+        elif args.action == "add":
             ajouter_utilisateur_systeme(args.nom_utilisateur)
 
         elif args.action == "delete":
             supprimer_utilisateur(args.nom_utilisateur)
 
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.nom_utilisateur is None and not (args.action == "add" and args.from_file):
+        parser.error("le nom de l'utilisateur est obligatoire (ou --from-file avec add)")
+    run(args)
+
 if __name__ == "__main__":
     main()
 
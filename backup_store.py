@@ -0,0 +1,452 @@
+#!/usr/bin/env python3
+import argparse
+import fcntl
+import hashlib
+import json
+import os
+import re
+import stat
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from status import check_login_status
+from execution_log import log_execution, span
+
+BACKUP_PATH = os.path.expanduser("~/ID1FS/backup")
+OBJECTS_PATH = os.path.join(BACKUP_PATH, "objects")
+SNAPSHOTS_PATH = os.path.join(BACKUP_PATH, "snapshots")
+PACKS_PATH = os.path.join(BACKUP_PATH, "packs")
+# Backups hold this lock shared while they write objects then their snapshot; maintenance holds it exclusive,
+# so garbage collection never sees the objects of a snapshot that is not written yet
+LOCK_PATH = os.path.join(BACKUP_PATH, ".lock")
+BASE_PATH = os.path.expanduser("~/ID1FS/home")
+# Files are cut into fixed-size chunks; identical chunks are stored once whatever file they come from
+CHUNK_SIZE = 1 << 20
+# Politique de rétention par défaut (par élément sauvegardé)
+KEEP_LAST = 5
+KEEP_DAILY = 7
+KEEP_WEEKLY = 4
+# Loose objects older than this are moved into compressed pack files
+PACK_AFTER_DAYS = 7
+# Pack compression codecs; their module is only imported when a pack is written or read
+CODECS = ("zlib", "lzma")
+# Copies "<nom>_<AAAAMMJJHHMMSS>" written by the old delete.create_backup
+LEGACY_BACKUP = re.compile(r"^(?P<name>.+)_(?P<timestamp>\d{14})$")
+
+_pack_index = None
+
+@contextmanager
+def _locked(operation):
+    os.makedirs(BACKUP_PATH, exist_ok=True)
+    with open(LOCK_PATH, "a") as lock_file:
+        fcntl.flock(lock_file, operation)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def compress(codec, data):
+    if codec == "lzma":
+        import lzma
+        return lzma.compress(data)
+    import zlib
+    return zlib.compress(data, 9)
+
+def decompress(codec, data):
+    if codec == "lzma":
+        import lzma
+        return lzma.decompress(data)
+    import zlib
+    return zlib.decompress(data)
+
+def object_path(object_hash):
+    return os.path.join(OBJECTS_PATH, object_hash[:2], object_hash[2:])
+
+def has_object(object_hash):
+    return os.path.exists(object_path(object_hash)) or object_hash in load_pack_index()
+
+def store_object(data):
+    object_hash = hashlib.sha256(data).hexdigest()
+    path = object_path(object_hash)
+    if os.path.exists(path):
+        # A reused object is as recent as the backup that reuses it
+        os.utime(path)
+    elif object_hash not in load_pack_index():
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as object_file:
+            object_file.write(data)
+        os.replace(temp_path, path)
+    return object_hash
+
+def read_object(object_hash):
+    try:
+        with open(object_path(object_hash), "rb") as object_file:
+            return object_file.read()
+    except FileNotFoundError:
+        if object_hash not in load_pack_index():
+            raise
+    # Packed object: only its own compressed slice of the pack is read
+    pack_name, offset, length, codec = load_pack_index()[object_hash]
+    with open(os.path.join(PACKS_PATH, pack_name), "rb") as pack_file:
+        pack_file.seek(offset)
+        return decompress(codec, pack_file.read(length))
+
+def load_pack_index():
+    global _pack_index
+    if _pack_index is None:
+        _pack_index = {}
+        if os.path.isdir(PACKS_PATH):
+            for file_name in sorted(os.listdir(PACKS_PATH)):
+                if file_name.endswith(".idx"):
+                    with open(os.path.join(PACKS_PATH, file_name), "r") as index_file:
+                        for object_hash, entry in json.load(index_file).items():
+                            _pack_index[object_hash] = tuple(entry)
+    return _pack_index
+
+def write_pack(objects, codec):
+    # objects: (hash, data) pairs. The .idx file is written last, so a pack without an index is ignored
+    global _pack_index
+    os.makedirs(PACKS_PATH, exist_ok=True)
+    pack_hash = hashlib.sha256()
+    temp_path = os.path.join(PACKS_PATH, f"pack.{os.getpid()}.tmp")
+    index = {}
+    with open(temp_path, "wb") as pack_file:
+        for object_hash, data in objects:
+            compressed = compress(codec, data)
+            index[object_hash] = [None, pack_file.tell(), len(compressed), codec]
+            pack_file.write(compressed)
+            pack_hash.update(object_hash.encode())
+
+    pack_name = f"pack-{pack_hash.hexdigest()[:16]}.pack"
+    os.replace(temp_path, os.path.join(PACKS_PATH, pack_name))
+    for entry in index.values():
+        entry[0] = pack_name
+    index_path = os.path.join(PACKS_PATH, pack_name[:-5] + ".idx")
+    with open(index_path + ".tmp", "w") as index_file:
+        json.dump(index, index_file)
+    os.replace(index_path + ".tmp", index_path)
+    _pack_index = None
+    return pack_name
+
+def store_manifest(manifest):
+    return store_object(json.dumps(manifest, sort_keys=True).encode())
+
+def read_manifest(object_hash):
+    return json.loads(read_object(object_hash))
+
+def store_file(path, stat_info):
+    chunks = []
+    with span("backup_copy", bytes=stat_info.st_size, entries=1), open(path, "rb") as source:
+        for chunk in iter(lambda: source.read(CHUNK_SIZE), b""):
+            chunks.append(store_object(chunk))
+    return store_manifest({
+        "type": "file",
+        "size": stat_info.st_size,
+        "mode": stat.S_IMODE(stat_info.st_mode),
+        "mtime": stat_info.st_mtime,
+        "chunks": chunks
+    })
+
+def store_tree(path):
+    # Directory trees are stored as manifests mapping each entry name to its own manifest
+    stat_info = os.lstat(path)
+    if stat.S_ISLNK(stat_info.st_mode):
+        return store_manifest({"type": "symlink", "target": os.readlink(path)})
+    if not stat.S_ISDIR(stat_info.st_mode):
+        return store_file(path, stat_info)
+
+    entries = {}
+    with os.scandir(path) as directory:
+        for entry in directory:
+            entries[entry.name] = store_tree(entry.path)
+    return store_manifest({
+        "type": "dir",
+        "mode": stat.S_IMODE(stat_info.st_mode),
+        "mtime": stat_info.st_mtime,
+        "entries": entries
+    })
+
+def backup(name, source_path, created_at=None):
+    with _locked(fcntl.LOCK_SH):
+        return _backup(name, source_path, created_at)
+
+def _backup(name, source_path, created_at=None):
+    root = store_tree(source_path)
+    manifest = read_manifest(root)
+    created_at = created_at or datetime.now()
+
+    snapshot_id = f"{name.replace(os.sep, '_')}_{created_at.strftime('%Y%m%d%H%M%S%f')}"
+    snapshot = {
+        "id": snapshot_id,
+        "name": name,
+        "source": source_path,
+        "created_at": created_at.strftime('%Y-%m-%d %H:%M:%S'),
+        "type": manifest["type"],
+        "root": root
+    }
+
+    os.makedirs(SNAPSHOTS_PATH, exist_ok=True)
+    with open(os.path.join(SNAPSHOTS_PATH, snapshot_id + ".json"), "w") as snapshot_file:
+        json.dump(snapshot, snapshot_file, indent=2)
+    return snapshot
+
+def load_snapshot(snapshot_id):
+    with open(os.path.join(SNAPSHOTS_PATH, snapshot_id + ".json"), "r") as snapshot_file:
+        return json.load(snapshot_file)
+
+def list_snapshots(name=None):
+    if not os.path.isdir(SNAPSHOTS_PATH):
+        return []
+    snapshots = []
+    for file_name in sorted(os.listdir(SNAPSHOTS_PATH)):
+        if file_name.endswith(".json"):
+            snapshot = load_snapshot(file_name[:-5])
+            if name is None or snapshot["name"] == name:
+                snapshots.append(snapshot)
+    return snapshots
+
+def delete_snapshot(snapshot_id):
+    os.remove(os.path.join(SNAPSHOTS_PATH, snapshot_id + ".json"))
+
+def select_expired(snapshots, keep_last=KEEP_LAST, keep_daily=KEEP_DAILY, keep_weekly=KEEP_WEEKLY):
+    # Per item: the newest keep_last snapshots, plus the newest one of each of the last keep_daily days
+    # and keep_weekly ISO weeks that have a snapshot. Everything else is expired.
+    by_name = {}
+    for snapshot in snapshots:
+        by_name.setdefault(snapshot["name"], []).append(snapshot)
+
+    expired = []
+    for name_snapshots in by_name.values():
+        name_snapshots.sort(key=lambda snapshot: (snapshot["created_at"], snapshot["id"]), reverse=True)
+        kept = set()
+        days = []
+        weeks = []
+        for position, snapshot in enumerate(name_snapshots):
+            created_at = datetime.strptime(snapshot["created_at"], '%Y-%m-%d %H:%M:%S')
+            day = created_at.date()
+            week = created_at.isocalendar()[:2]
+            if position < keep_last:
+                kept.add(snapshot["id"])
+            if day not in days and len(days) < keep_daily:
+                days.append(day)
+                kept.add(snapshot["id"])
+            if week not in weeks and len(weeks) < keep_weekly:
+                weeks.append(week)
+                kept.add(snapshot["id"])
+        expired.extend(snapshot for snapshot in name_snapshots if snapshot["id"] not in kept)
+    return expired
+
+def reachable_objects():
+    # Every object referenced by a remaining snapshot: manifests and file chunks
+    reachable = set()
+    stack = [snapshot["root"] for snapshot in list_snapshots()]
+    while stack:
+        object_hash = stack.pop()
+        if object_hash in reachable:
+            continue
+        reachable.add(object_hash)
+        manifest = read_manifest(object_hash)
+        if manifest["type"] == "dir":
+            stack.extend(manifest["entries"].values())
+        elif manifest["type"] == "file":
+            reachable.update(manifest["chunks"])
+    return reachable
+
+def iter_loose_objects():
+    if not os.path.isdir(OBJECTS_PATH):
+        return
+    for prefix in sorted(os.listdir(OBJECTS_PATH)):
+        prefix_path = os.path.join(OBJECTS_PATH, prefix)
+        for file_name in sorted(os.listdir(prefix_path)):
+            if not file_name.endswith(".tmp"):
+                yield prefix + file_name, os.path.join(prefix_path, file_name)
+
+def collect_garbage(reachable):
+    global _pack_index
+    # Unreachable loose objects are deleted; packs holding unreachable objects are rewritten without them
+    removed = 0
+    for object_hash, path in list(iter_loose_objects()):
+        if object_hash not in reachable:
+            os.remove(path)
+            removed += 1
+
+    packs = {}
+    for object_hash, (pack_name, offset, length, codec) in load_pack_index().items():
+        packs.setdefault(pack_name, []).append(object_hash)
+    for pack_name, object_hashes in packs.items():
+        live = [object_hash for object_hash in object_hashes if object_hash in reachable]
+        if len(live) == len(object_hashes):
+            continue
+        if live:
+            codec = load_pack_index()[live[0]][3]
+            write_pack(((object_hash, read_object(object_hash)) for object_hash in live), codec)
+        os.remove(os.path.join(PACKS_PATH, pack_name[:-5] + ".idx"))
+        os.remove(os.path.join(PACKS_PATH, pack_name))
+        _pack_index = None
+        removed += len(object_hashes) - len(live)
+    return removed
+
+def pack_objects(pack_after_days=PACK_AFTER_DAYS, codec="zlib"):
+    limit = time.time() - pack_after_days * 86400
+    old = [(object_hash, path) for object_hash, path in iter_loose_objects() if os.stat(path).st_mtime < limit]
+    if not old:
+        return 0
+
+    def contents():
+        for object_hash, path in old:
+            with open(path, "rb") as object_file:
+                yield object_hash, object_file.read()
+
+    write_pack(contents(), codec)
+    for _, path in old:
+        os.remove(path)
+    return len(old)
+
+def import_legacy_backups():
+    # Les anciennes copies complètes deviennent des instantanés dédupliqués, puis sont supprimées
+    imported = 0
+    if not os.path.isdir(BACKUP_PATH):
+        return imported
+    for file_name in sorted(os.listdir(BACKUP_PATH)):
+        match = LEGACY_BACKUP.match(file_name)
+        path = os.path.join(BACKUP_PATH, file_name)
+        if not match or file_name in ("objects", "snapshots", "packs"):
+            continue
+        created_at = datetime.strptime(match.group("timestamp"), '%Y%m%d%H%M%S')
+        _backup(match.group("name"), path, created_at)
+        if os.path.isdir(path) and not os.path.islink(path):
+            # shutil charge lui-même zlib, bz2 et lzma : importé seulement pour cette migration
+            import shutil
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+        imported += 1
+    return imported
+
+def disk_usage(path):
+    total = 0
+    for current, directories, files in os.walk(path):
+        for file_name in files:
+            try:
+                total += os.lstat(os.path.join(current, file_name)).st_size
+            except FileNotFoundError:
+                pass
+    return total
+
+def maintain(keep_last=KEEP_LAST, keep_daily=KEEP_DAILY, keep_weekly=KEEP_WEEKLY, pack_after_days=PACK_AFTER_DAYS, codec="zlib"):
+    with _locked(fcntl.LOCK_EX):
+        return _maintain(keep_last, keep_daily, keep_weekly, pack_after_days, codec)
+
+def _maintain(keep_last, keep_daily, keep_weekly, pack_after_days, codec):
+    size_before = disk_usage(BACKUP_PATH)
+    report = {"imported": import_legacy_backups()}
+
+    expired = select_expired(list_snapshots(), keep_last, keep_daily, keep_weekly)
+    for snapshot in expired:
+        delete_snapshot(snapshot["id"])
+    report["expired"] = len(expired)
+
+    report["collected"] = collect_garbage(reachable_objects())
+    report["packed"] = pack_objects(pack_after_days, codec)
+    report["reclaimed"] = size_before - disk_usage(BACKUP_PATH)
+    return report
+
+def restore_tree(object_hash, destination):
+    manifest = read_manifest(object_hash)
+    if manifest["type"] == "symlink":
+        os.symlink(manifest["target"], destination)
+    elif manifest["type"] == "dir":
+        os.makedirs(destination, exist_ok=True)
+        for entry_name, entry_hash in manifest["entries"].items():
+            restore_tree(entry_hash, os.path.join(destination, entry_name))
+        os.chmod(destination, manifest["mode"])
+        os.utime(destination, (manifest["mtime"], manifest["mtime"]))
+    else:
+        with open(destination, "wb") as target:
+            for chunk_hash in manifest["chunks"]:
+                target.write(read_object(chunk_hash))
+        os.chmod(destination, manifest["mode"])
+        os.utime(destination, (manifest["mtime"], manifest["mtime"]))
+
+def restore(snapshot_id, destination=None):
+    snapshot = load_snapshot(snapshot_id)
+    destination = destination or os.path.join(BASE_PATH, snapshot["name"])
+    if os.path.lexists(destination):
+        raise FileExistsError(f"'{destination}' existe déjà")
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    restore_tree(snapshot["root"], destination)
+    return destination
+
+def record_restored(destination):
+    # Comme create : métadonnées (et totaux d'occupation), index des noms et index plein texte pour tout ce qui
+    # a été restauré sous ~/ID1FS/home
+    import metadata_store
+    import name_index
+    import text_index
+    destination = os.path.normpath(destination)
+    if not destination.startswith(BASE_PATH + os.sep):
+        return
+    parent = os.path.dirname(destination)
+    restored = [destination]
+    if os.path.isdir(destination) and not os.path.islink(destination):
+        for current, directories, files in os.walk(destination):
+            restored.extend(os.path.join(current, child) for child in directories + files)
+    names = [os.path.relpath(path, BASE_PATH) for path in restored]
+    with metadata_store.batch():
+        for name, path in zip(names, restored):
+            metadata_store.put_metadata(name, metadata_store.make_record(path, os.lstat(path)))
+        metadata_store.invalidate_directory_state(parent)
+    name_index.add_paths(names)
+    text_index.index_file(names[0])
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Consulter et restaurer les sauvegardes de ~/ID1FS/backup.")
+    parser.add_argument('-l', '--list', nargs='?', const='', metavar='NOM', help='Lister les sauvegardes (éventuellement celles d\'un seul élément)')
+    parser.add_argument('-r', '--restore', metavar='SAUVEGARDE', help='Restaurer une sauvegarde à son emplacement d\'origine')
+    parser.add_argument('--to', metavar='CHEMIN', help='Restaurer vers ce chemin (relatif à ~/ID1FS/home) au lieu de l\'emplacement d\'origine')
+    parser.add_argument('-m', '--maintain', action='store_true', help='Appliquer la rétention, compacter les anciens objets et libérer l\'espace inutilisé')
+    parser.add_argument('--keep-last', type=int, default=KEEP_LAST, metavar='N', help=f'Garder les N dernières sauvegardes de chaque élément (défaut: {KEEP_LAST})')
+    parser.add_argument('--keep-daily', type=int, default=KEEP_DAILY, metavar='N', help=f'Garder une sauvegarde par jour sur N jours (défaut: {KEEP_DAILY})')
+    parser.add_argument('--keep-weekly', type=int, default=KEEP_WEEKLY, metavar='N', help=f'Garder une sauvegarde par semaine sur N semaines (défaut: {KEEP_WEEKLY})')
+    parser.add_argument('--pack-after', type=float, default=PACK_AFTER_DAYS, metavar='JOURS', help=f'Compacter les objets plus anciens que JOURS (défaut: {PACK_AFTER_DAYS})')
+    parser.add_argument('--compression', choices=sorted(CODECS), default='zlib', help='Compression des fichiers pack (défaut: zlib)')
+    return parser
+
+def run(args):
+    if args.restore:
+        destination = os.path.join(BASE_PATH, args.to) if args.to else None
+        try:
+            destination = restore(args.restore, destination)
+        except (FileNotFoundError, FileExistsError) as e:
+            print(f"Erreur lors de la restauration de '{args.restore}': {e}")
+            log_execution("Restore Error", f"Error restoring backup '{args.restore}': {str(e)}")
+            return 1
+        record_restored(destination)
+        print(f"Sauvegarde '{args.restore}' restaurée vers '{destination}'.")
+        log_execution("Restore", f"Backup '{args.restore}' restored to '{destination}'.")
+    elif args.maintain:
+        report = maintain(args.keep_last, args.keep_daily, args.keep_weekly, args.pack_after, args.compression)
+        print(f"{report['imported']} ancienne(s) copie(s) importée(s), {report['expired']} sauvegarde(s) expirée(s), "
+              f"{report['collected']} objet(s) supprimé(s), {report['packed']} objet(s) compacté(s).")
+        print(f"Espace libéré: {report['reclaimed']} octets.")
+        log_execution("Backup Maintenance", f"Backup maintenance done: {json.dumps(report)}.")
+    elif args.list is not None:
+        for snapshot in list_snapshots(args.list or None):
+            print(f"{snapshot['id']}  {snapshot['type']}  {snapshot['created_at']}  {snapshot['name']}")
+    else:
+        build_parser().print_help()
+    return 0
+
+def main(argv=None):
+    if not check_login_status():
+        print("Le statut de connexion est désactivé. Veuillez activer le système.")
+        log_execution("Error", "Script execution failed: Login status is inactive.")
+        return 1
+
+    args = build_parser().parse_args(argv)
+    return run(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+import argparse
+import importlib
+import json
+import os
+import shlex
+import sys
+import time
+import execution_log
+import metadata_store
+from status import check_login_status
+from execution_log import log_execution
+
+# Commands accepted in a batch file, with or without their ".py" suffix
+COMMANDS = {
+    "create": "create",
+    "delete": "delete",
+    "modifier": "modifier",
+    "cmpt": "cmpt",
+    "content": "content",
+    "trouver": "trouver",
+    "lst": "lst",
+    "status": "status",
+    "sync": "sync",
+    "search": "search",
+    "stats": "stats",
+    "logquery": "logquery",
+    "du": "du",
+}
+
+# Exit code of a run() that failed after changing the disk (create --from-manifest with some entries in error):
+# its metadata writes describe what was really created and are kept instead of being rolled back
+PARTIAL_EXIT_CODE = 3
+
+_parsers = {}
+
+def parse_line(line):
+    tokens = shlex.split(line, comments=True)
+    if not tokens:
+        return None, []
+
+    command = os.path.basename(tokens[0])
+    if command.endswith(".py"):
+        command = command[:-3]
+    return command, tokens[1:]
+
+def get_command(command):
+    # Modules and their parsers are built once and reused for every line of the batch
+    if command not in _parsers:
+        module = importlib.import_module(COMMANDS[command])
+        parser = module.build_parser()
+        parser.prog = command
+        _parsers[command] = (module, parser)
+    return _parsers[command]
+
+def run_command(command, argv):
+    if command not in COMMANDS:
+        return "error", f"Unknown command '{command}'"
+
+    module, parser = get_command(command)
+    try:
+        args = parser.parse_args(argv)
+    except SystemExit as e:
+        return "error", f"Invalid arguments (exit code {e.code})"
+
+    # run() returns a non-zero exit code when the command failed after reporting the error itself
+    try:
+        code = module.run(args)
+    except SystemExit as e:
+        code = e.code
+    except Exception as e:
+        return "error", str(e)
+    if code == PARTIAL_EXIT_CODE:
+        return "partial", f"Exited with code {code}, changes kept"
+    if code not in (None, 0):
+        return "error", f"Exited with code {code}"
+    return "ok", ""
+
+def run_batch(lines, commit_every=0, stop_on_error=False):
+    results = []
+    executed = 0
+
+    execution_log.keep_open(True)
+    try:
+        with metadata_store.batch():
+            for line_number, line in enumerate(lines, start=1):
+                try:
+                    command, argv = parse_line(line)
+                except ValueError as e:
+                    results.append({"line": line_number, "command": line.strip(), "status": "error", "error": str(e), "elapsed_ms": 0.0})
+                    if stop_on_error:
+                        break
+                    continue
+                if command is None:
+                    continue
+
+                # The metadata writes of a failed command are undone, those of the other commands are kept; a
+                # partial failure keeps them too, since its files are on disk
+                started = time.perf_counter()
+                metadata_store.savepoint("command")
+                status, error = run_command(command, argv)
+                if status in ("ok", "partial"):
+                    metadata_store.release_savepoint("command")
+                else:
+                    metadata_store.rollback_savepoint("command")
+                elapsed = (time.perf_counter() - started) * 1000
+                execution_log.emit_timings(command)
+                results.append({"line": line_number, "command": line.strip(), "status": status, "error": error, "elapsed_ms": round(elapsed, 3)})
+
+                executed += 1
+                if commit_every and executed % commit_every == 0:
+                    metadata_store.commit()
+                    execution_log.flush()
+
+                if status != "ok" and stop_on_error:
+                    break
+    finally:
+        execution_log.flush()
+        execution_log.keep_open(False)
+
+    return results
+
+def print_results(results, as_json):
+    for result in results:
+        if as_json:
+            print(json.dumps(result, ensure_ascii=False))
+        elif result["status"] == "ok":
+            print(f"[ok] {result['line']}: {result['command']} ({result['elapsed_ms']:.1f} ms)")
+        else:
+            print(f"[{result['status']}] {result['line']}: {result['command']} - {result['error']}")
+
+    failed = sum(1 for result in results if result["status"] != "ok")
+    if not as_json:
+        print(f"{len(results)} command(s) executed, {failed} failed.")
+    return failed
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Exécuter une liste de commandes ID1FS dans un seul processus.")
+    parser.add_argument('fichier', nargs='?', default='-', help='Fichier de commandes, une par ligne (par défaut, entrée standard)')
+    parser.add_argument('--commit-every', type=int, default=0, metavar='N', help='Valider les métadonnées toutes les N commandes (par défaut, une seule fois à la fin)')
+    parser.add_argument('--stop-on-error', action='store_true', help="Arrêter le lot à la première commande en erreur")
+    parser.add_argument('--json', action='store_true', help='Afficher les résultats au format JSON, une ligne par commande')
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    # Le statut de connexion n'est vérifié qu'une seule fois pour tout le lot
+    if not check_login_status():
+        print("Le statut de connexion est désactivé. Veuillez activer le système.")
+        log_execution("Error", "Batch execution failed: Login status is inactive.")
+        return 1
+
+    if args.fichier == '-':
+        results = run_batch(sys.stdin, args.commit_every, args.stop_on_error)
+    else:
+        with open(args.fichier, 'r') as batch_file:
+            results = run_batch(batch_file, args.commit_every, args.stop_on_error)
+
+    failed = print_results(results, args.json)
+    log_execution("Batch", f"{len(results)} command(s) executed, {failed} failed.")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
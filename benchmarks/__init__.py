@@ -0,0 +1 @@
+# Benchmarks des commandes ID1FS sur des arborescences synthétiques (voir generate.py et run.py) et de leur temps de démarrage (startup.py)
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+import atexit
+import json
+import os
+import runpy
+import sys
+
+# Lanceur des mesures en sous-processus : exécute SCRIPT comme "python SCRIPT ARGS" puis écrit son pic de RSS
+# et ses compteurs d'appels read/write dans $ID1FS_BENCH_REPORT. Le ru_maxrss vu par le parent hérite du pic
+# du processus qui a fait le fork ; VmHWM (/proc/self/status) ne compte que l'image de ce processus.
+
+
+def report():
+    counters = {}
+    for path in ("/proc/self/status", "/proc/self/io"):
+        try:
+            with open(path) as proc_file:
+                counters.update(line.split(":", 1) for line in proc_file.read().splitlines() if ":" in line)
+        except OSError:
+            pass
+    result = {"rss_kb": None, "syscalls": None}
+    if "VmHWM" in counters:
+        result["rss_kb"] = int(counters["VmHWM"].split()[0])
+    if "syscr" in counters and "syscw" in counters:
+        result["syscalls"] = int(counters["syscr"]) + int(counters["syscw"])
+    with open(os.environ["ID1FS_BENCH_REPORT"], "w") as report_file:
+        json.dump(result, report_file)
+
+
+def main():
+    script = sys.argv[1]
+    sys.argv = sys.argv[1:]
+    sys.path[0] = os.path.dirname(os.path.abspath(script))
+    atexit.register(report)
+    runpy.run_path(script, run_name="__main__")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+import argparse
+import importlib
+import json
+import os
+import random
+import sys
+import tempfile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORDS = ("lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor incididunt "
+         "ut labore et dolore magna aliqua fichier répertoire données métadonnées").split()
+# Tirage des tailles : fixed:N, uniform:MIN:MAX ou lognormal:MU:SIGMA (en octets)
+DEFAULT_SIZES = "lognormal:7:1.5"
+
+
+def size_sampler(spec, rng):
+    kind, *values = spec.split(":")
+    if kind == "fixed":
+        size = int(values[0])
+        return lambda: size
+    if kind == "uniform":
+        low, high = int(values[0]), int(values[1])
+        return lambda: rng.randint(low, high)
+    if kind == "lognormal":
+        mu, sigma = float(values[0]), float(values[1])
+        return lambda: int(rng.lognormvariate(mu, sigma))
+    raise ValueError(f"Distribution de tailles inconnue : '{spec}'")
+
+
+def make_text(size, rng):
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(WORDS)
+        words.append(word + ("\n" if rng.random() < 0.1 else " "))
+        length += len(word) + 1
+    return "".join(words).encode()[:size]
+
+
+def directory_paths(depth, fanout):
+    # d0/d1/... : fanout sous-répertoires par niveau, depth niveaux
+    paths = [""]
+    level = [""]
+    for _ in range(depth):
+        level = [os.path.join(parent, f"d{index}") for parent in level for index in range(fanout)]
+        paths.extend(level)
+    return paths
+
+
+def use_home(root):
+    # Les modules du dépôt lisent ~ à l'import : HOME doit pointer sur la racine synthétique avant de les importer
+    os.environ["HOME"] = root
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT)
+
+
+def generate(root, files=1000, depth=3, fanout=4, sizes=DEFAULT_SIZES, seed=0, metadata="db"):
+    rng = random.Random(seed)
+    sample_size = size_sampler(sizes, rng)
+    home = os.path.join(root, "ID1FS", "home")
+    directories = directory_paths(depth, fanout)
+    for directory in directories:
+        os.makedirs(os.path.join(home, directory), exist_ok=True)
+
+    items = [directory for directory in directories if directory]
+    for index in range(files):
+        relative_path = os.path.join(rng.choice(directories), f"f{index}.txt")
+        with open(os.path.join(home, relative_path), "wb") as file:
+            file.write(make_text(sample_size(), rng))
+        items.append(relative_path)
+
+    use_home(root)
+    metadata_store = importlib.import_module("metadata_store")
+    session = importlib.import_module("session")
+    records = ((name, metadata_store.make_record(os.path.join(home, name), os.stat(os.path.join(home, name)))) for name in items)
+    if metadata == "json":
+        # Ancien format : metadata.json, importé dans metadata.db au premier accès
+        os.makedirs(metadata_store.METADATA_DIR, exist_ok=True)
+        with open(metadata_store.METADATA_JSON_PATH, "w") as metadata_file:
+            json.dump(dict(records), metadata_file)
+    else:
+        with metadata_store.batch():
+            for name, record in records:
+                metadata_store.put_metadata(name, record)
+    session.open_session()
+    os.makedirs(os.path.join(root, "ID1FS", "log"), exist_ok=True)
+    return {"root": root, "files": files, "directories": len(directories), "depth": depth, "fanout": fanout,
+            "sizes": sizes, "seed": seed, "metadata": metadata}
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Générer une racine ID1FS synthétique et reproductible pour les benchmarks.")
+    parser.add_argument('root', nargs='?', help='Répertoire à remplir (par défaut, un répertoire temporaire)')
+    parser.add_argument('--files', type=int, default=1000, help='Nombre de fichiers (défaut: 1000)')
+    parser.add_argument('--depth', type=int, default=3, help='Profondeur de l\'arborescence (défaut: 3)')
+    parser.add_argument('--fanout', type=int, default=4, help='Sous-répertoires par répertoire (défaut: 4)')
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help=f'Distribution des tailles (défaut: {DEFAULT_SIZES})')
+    parser.add_argument('--seed', type=int, default=0, help='Graine du générateur aléatoire (défaut: 0)')
+    parser.add_argument('--metadata', choices=('db', 'json'), default='db', help='Écrire les métadonnées dans metadata.db ou dans l\'ancien metadata.json')
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    root = args.root or tempfile.mkdtemp(prefix="id1fs-bench-")
+    print(json.dumps(generate(root, args.files, args.depth, args.fanout, args.sizes, args.seed, args.metadata), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+import argparse
+import contextlib
+import importlib
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+from benchmarks.generate import REPO_ROOT, DEFAULT_SIZES, generate, use_home
+
+# (nom, module, argv(mode, itération)) ; create puis delete, pour que delete trouve les fichiers créés
+SCENARIOS = [
+    ("lst", "lst", lambda mode, i: ["home", "-l"]),
+    ("lst-recursive", "lst", lambda mode, i: ["home", "-R", "-n"]),
+    ("trouver", "trouver", lambda mode, i: ["f0.txt", "-type"]),
+    ("trouver-glob", "trouver", lambda mode, i: ["f1*.txt", "--glob", "--all", "-type"]),
+    ("cmpt", "cmpt", lambda mode, i: ["-l", "-w", "d0"]),
+    ("create", "create", lambda mode, i: ["-f", f"bench_{mode}_{i}.txt"]),
+    ("delete", "delete", lambda mode, i: ["-f", f"bench_{mode}_{i}.txt"]),
+]
+MODES = ("inprocess", "subprocess")
+CHILD_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "child.py")
+REGRESSION_THRESHOLD = 0.10
+
+
+def io_syscalls():
+    # Compteurs read/write du noyau pour ce processus (Linux) : approximation sans strace
+    try:
+        with open("/proc/self/io") as io_file:
+            counters = dict(line.split(": ") for line in io_file.read().splitlines())
+        return int(counters["syscr"]) + int(counters["syscw"])
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def strace_calls(summary_path):
+    with open(summary_path) as summary_file:
+        lines = summary_file.read().splitlines()
+    header = next(line.split() for line in lines if "calls" in line.split())
+    total = next(line.split() for line in lines if line.split()[-1:] == ["total"])
+    return int(total[header.index("calls") - 1])
+
+
+def run_inprocess(module_name, argv, trace_memory=False):
+    # ru_maxrss serait le pic de tout le processus de mesure depuis son lancement : en processus, la mémoire est
+    # le pic des allocations Python de cette exécution (tracemalloc), mesuré dans une passe à part car il ralentit
+    module = importlib.import_module(module_name)
+    if trace_memory:
+        tracemalloc.start()
+    syscalls_before = io_syscalls()
+    start = time.perf_counter()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        module.main(argv)
+    wall = time.perf_counter() - start
+    syscalls_after = io_syscalls()
+    heap_peak_kb = None
+    if trace_memory:
+        heap_peak_kb = tracemalloc.get_traced_memory()[1] // 1024
+        tracemalloc.stop()
+    return {
+        "wall": wall,
+        "rss_kb": None,
+        "heap_peak_kb": heap_peak_kb,
+        "syscalls": syscalls_after - syscalls_before if syscalls_before is not None else None,
+    }
+
+
+def run_subprocess(module_name, argv, strace=False):
+    # Le script est lancé par child.py, qui rapporte le pic de RSS et les appels read/write de ce seul processus
+    report_fd, report_path = tempfile.mkstemp(prefix="id1fs-bench-")
+    os.close(report_fd)
+    command = [sys.executable, CHILD_PATH, os.path.join(REPO_ROOT, module_name + ".py")] + argv
+    summary_path = None
+    if strace:
+        summary_path = report_path + ".strace"
+        command = ["strace", "-f", "-c", "-o", summary_path] + command
+
+    try:
+        start = time.perf_counter()
+        subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, cwd=REPO_ROOT,
+                       env=dict(os.environ, ID1FS_BENCH_REPORT=report_path))
+        wall = time.perf_counter() - start
+        with open(report_path) as report_file:
+            result = {"rss_kb": None, "syscalls": None}
+            result.update(json.loads(report_file.read() or "{}"))
+        result["wall"] = wall
+        if summary_path:
+            try:
+                result["syscalls"] = strace_calls(summary_path)
+            except (OSError, StopIteration, ValueError, IndexError):
+                pass
+    finally:
+        for path in (report_path, summary_path):
+            if path and os.path.exists(path):
+                os.remove(path)
+    return result
+
+
+def summarize(runs, syscalls, syscalls_counted, heap_peak_kb=None):
+    walls = [run["wall"] for run in runs]
+    return {
+        "runs": len(runs),
+        "wall_min": min(walls),
+        "wall_median": statistics.median(walls),
+        "wall_mean": statistics.mean(walls),
+        "wall_max": max(walls),
+        "rss_kb": max((run["rss_kb"] for run in runs if run["rss_kb"] is not None), default=None),
+        "heap_peak_kb": heap_peak_kb,
+        "syscalls": syscalls,
+        # "read/write" : compteurs syscr + syscw de /proc/self/io ; "all" : tous les appels, comptés par strace
+        "syscalls_counted": syscalls_counted,
+    }
+
+
+def run_benchmarks(scenarios, modes, repeat, use_strace):
+    results = {}
+    for name, module_name, make_argv in scenarios:
+        results[name] = {}
+        for mode in modes:
+            runs = []
+            for iteration in range(repeat):
+                argv = make_argv(mode, iteration)
+                if mode == "inprocess":
+                    runs.append(run_inprocess(module_name, argv))
+                else:
+                    runs.append(run_subprocess(module_name, argv))
+            syscalls = runs[0]["syscalls"]
+            syscalls_counted = "read/write"
+            heap_peak_kb = None
+            if mode == "inprocess":
+                # Passe séparée sous tracemalloc, pour la même raison que strace ci-dessous
+                if module_name == "delete":
+                    run_inprocess("create", ["-f", f"bench_{mode}_{repeat}.txt"])
+                heap_peak_kb = run_inprocess(module_name, make_argv(mode, repeat), trace_memory=True)["heap_peak_kb"]
+                if module_name == "create":
+                    run_inprocess("delete", ["-f", f"bench_{mode}_{repeat}.txt"])
+            elif use_strace:
+                # Passe séparée sous strace : son surcoût ne doit pas fausser les temps mesurés
+                if module_name == "delete":
+                    run_subprocess("create", ["-f", f"bench_{mode}_{repeat}.txt"])
+                syscalls = run_subprocess(module_name, make_argv(mode, repeat), strace=True)["syscalls"]
+                syscalls_counted = "all"
+                if module_name == "create":
+                    run_subprocess("delete", ["-f", f"bench_{mode}_{repeat}.txt"])
+            summary = results[name][mode] = summarize(runs, syscalls, syscalls_counted, heap_peak_kb)
+            memory = f"rss {summary['rss_kb']:7} KB" if mode == "subprocess" else f"heap {summary['heap_peak_kb']:6} KB"
+            print(f"{name:15} {mode:10} median {summary['wall_median'] * 1000:8.1f} ms  "
+                  f"{memory}  syscalls ({syscalls_counted}) {summary['syscalls']}", file=sys.stderr)
+    return results
+
+
+def compare(results, baseline, threshold=REGRESSION_THRESHOLD):
+    # Compare les temps médians ; retourne la liste des régressions au-delà du seuil
+    if baseline["tree"] != results["tree"]:
+        print("Attention : la ligne de base a été mesurée sur une autre arborescence.", file=sys.stderr)
+    regressions = []
+    print(f"{'scénario':15} {'mode':10} {'actuel':>10} {'base':>10} {'ratio':>7}")
+    for name, modes in results["results"].items():
+        for mode, summary in modes.items():
+            reference = baseline["results"].get(name, {}).get(mode)
+            if reference is None:
+                continue
+            ratio = summary["wall_median"] / reference["wall_median"] if reference["wall_median"] else float("inf")
+            flag = "  RÉGRESSION" if ratio > 1 + threshold else ""
+            if flag:
+                regressions.append((name, mode, ratio))
+            print(f"{name:15} {mode:10} {summary['wall_median'] * 1000:8.1f}ms {reference['wall_median'] * 1000:8.1f}ms {ratio:7.2f}{flag}")
+    return regressions
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Mesurer les commandes ID1FS sur une arborescence synthétique.")
+    parser.add_argument('--root', help='Racine ID1FS déjà générée (par défaut, une racine temporaire est générée puis supprimée)')
+    parser.add_argument('--files', type=int, default=1000, help='Nombre de fichiers générés (défaut: 1000)')
+    parser.add_argument('--depth', type=int, default=3, help='Profondeur de l\'arborescence générée (défaut: 3)')
+    parser.add_argument('--fanout', type=int, default=4, help='Sous-répertoires par répertoire (défaut: 4)')
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help=f'Distribution des tailles (défaut: {DEFAULT_SIZES})')
+    parser.add_argument('--seed', type=int, default=0, help='Graine du générateur (défaut: 0)')
+    parser.add_argument('--scenario', action='append', choices=[name for name, _, _ in SCENARIOS], help='Scénario à exécuter (répétable ; par défaut, tous)')
+    parser.add_argument('--mode', choices=MODES, help='Seulement en processus ou seulement en sous-processus')
+    parser.add_argument('-r', '--repeat', type=int, default=5, help='Nombre d\'exécutions par scénario (défaut: 5)')
+    parser.add_argument('--strace', action='store_true', help='Compter les appels système des sous-processus avec strace')
+    parser.add_argument('-o', '--output', help='Écrire les résultats JSON dans ce fichier')
+    parser.add_argument('--baseline', help='Comparer avec ces résultats JSON de référence')
+    parser.add_argument('--save-baseline', help='Enregistrer aussi les résultats comme nouvelle référence')
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD, help='Ralentissement toléré avant de signaler une régression (défaut: 0.10)')
+    parser.add_argument('--keep', action='store_true', help='Ne pas supprimer la racine temporaire générée')
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.strace and not shutil.which("strace"):
+        print("strace est introuvable : les appels système des sous-processus ne seront pas comptés.", file=sys.stderr)
+        args.strace = False
+
+    root = args.root
+    if root:
+        use_home(root)
+        importlib.import_module("session").open_session()
+        tree = {"root": root}
+    else:
+        root = tempfile.mkdtemp(prefix="id1fs-bench-")
+        tree = generate(root, args.files, args.depth, args.fanout, args.sizes, args.seed)
+    tree = {key: value for key, value in tree.items() if key != "root"}
+
+    try:
+        scenarios = [scenario for scenario in SCENARIOS if not args.scenario or scenario[0] in args.scenario]
+        modes = [args.mode] if args.mode else list(MODES)
+        results = {
+            "created_at": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "tree": tree,
+            "repeat": args.repeat,
+            "results": run_benchmarks(scenarios, modes, args.repeat, args.strace),
+        }
+    finally:
+        if not args.root and not args.keep:
+            shutil.rmtree(root, ignore_errors=True)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            output_file.write(output + "\n")
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as baseline_file:
+            baseline_file.write(output + "\n")
+    if not args.output and not args.save_baseline:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.threshold)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.generate import REPO_ROOT
+
+sys.path.insert(0, REPO_ROOT)
+import id1fs
+
+# Budget de démarrage de "id1fs <commande> -h" (imports + construction de l'analyseur),
+# au-delà du démarrage de l'interpréteur seul, mesuré de la même façon
+STARTUP_BUDGET_MS = 40.0
+ID1FS_PATH = os.path.join(REPO_ROOT, "id1fs.py")
+
+
+def child_env(home):
+    # HOME temporaire pour ne pas écrire dans le vrai journal ; les .pyc sont autorisés, comme en usage normal
+    env = dict(os.environ, HOME=home)
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    return env
+
+
+def open_session(env):
+    # Sans session, les commandes qui vérifient la connexion avant d'analyser leurs arguments s'arrêtent
+    # avant de construire l'analyseur : une session est ouverte dans le HOME temporaire
+    subprocess.run([sys.executable, "-c", "import session; session.open_session()"], env=env, cwd=REPO_ROOT, check=True)
+
+
+def parse_importtime(stderr):
+    # Lignes "import time: self | cumulative | module" ; seuls les imports de premier niveau s'additionnent
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not name.startswith("  "):
+            imports.append((name.strip(), int(cumulative) / 1000))
+    return imports
+
+
+def measure(argv, env, repeat):
+    walls = []
+    imports = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, "-X", "importtime"] + argv, env=env, cwd=REPO_ROOT,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        walls.append((time.perf_counter() - start) * 1000)
+        imports = parse_importtime(result.stderr)
+    return statistics.median(walls), imports
+
+
+def run_startup(commands, repeat, top):
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="id1fs-startup-") as home:
+        env = child_env(home)
+        open_session(env)
+        subprocess.run([sys.executable, "-c", "pass"], env=env)
+        interpreter_ms, _ = measure(["-c", "pass"], env, repeat)
+        for command in commands:
+            # Premier lancement à part : il écrit les .pyc
+            subprocess.run([sys.executable, ID1FS_PATH, command, "-h"], env=env, cwd=REPO_ROOT, stdout=subprocess.DEVNULL)
+            wall_ms, imports = measure([ID1FS_PATH, command, "-h"], env, repeat)
+            results[command] = {
+                "wall_ms": round(wall_ms, 2),
+                "overhead_ms": round(wall_ms - interpreter_ms, 2),
+                "import_ms": round(sum(ms for _, ms in imports), 2),
+                "top_imports": [[name, round(ms, 2)] for name, ms in sorted(imports, key=lambda item: -item[1])[:top]],
+            }
+    return {"interpreter_ms": round(interpreter_ms, 2), "commands": results}
+
+
+def print_results(report, budget):
+    print(f"Interpréteur seul : {report['interpreter_ms']:.1f} ms")
+    print(f"{'commande':<10} {'total':>8} {'surcoût':>8} {'imports':>8}  principaux imports")
+    for command, result in report["commands"].items():
+        marker = " !" if result["overhead_ms"] > budget else ""
+        top_imports = ", ".join(f"{name} {ms:.1f}" for name, ms in result["top_imports"])
+        print(f"{command:<10} {result['wall_ms']:>6.1f}ms {result['overhead_ms']:>6.1f}ms {result['import_ms']:>6.1f}ms  {top_imports}{marker}")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Mesurer le temps de démarrage des commandes id1fs (python -X importtime).")
+    parser.add_argument('command', nargs='*', help='Commandes à mesurer (par défaut, toutes)')
+    parser.add_argument('-r', '--repeat', type=int, default=5, help='Lancements par commande, la médiane est retenue (défaut: 5)')
+    parser.add_argument('--top', type=int, default=3, help='Nombre d\'imports les plus coûteux affichés (défaut: 3)')
+    parser.add_argument('--budget', type=float, default=STARTUP_BUDGET_MS,
+                        help=f'Surcoût maximal en ms par rapport à l\'interpréteur seul (défaut: {STARTUP_BUDGET_MS:g})')
+    parser.add_argument('--json', action='store_true', help='Afficher les résultats au format JSON')
+    parser.add_argument('-o', '--output', help='Écrire aussi les résultats JSON dans ce fichier')
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    unknown = [command for command in args.command if command not in id1fs.COMMANDS]
+    if unknown:
+        parser.error(f"commande(s) inconnue(s) : {', '.join(unknown)}")
+
+    report = run_startup(args.command or list(id1fs.COMMANDS), args.repeat, args.top)
+    report["budget_ms"] = args.budget
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(report, output_file, indent=2)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_results(report, args.budget)
+
+    over = [command for command, result in report["commands"].items() if result["overhead_ms"] > args.budget]
+    if over:
+        print(f"Budget de démarrage ({args.budget:g} ms) dépassé : {', '.join(over)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,18 @@
+#!/usr/bin/env python3
+import unittest
+
+from benchmarks.startup import STARTUP_BUDGET_MS, run_startup
+import id1fs
+
+
+class StartupBudgetTest(unittest.TestCase):
+    # "id1fs <commande> -h" (imports et analyseur, session ouverte) doit rester dans le budget de démarrage
+    def test_commands_within_budget(self):
+        report = run_startup(list(id1fs.COMMANDS), repeat=3, top=3)
+        over = {command: result["overhead_ms"] for command, result in report["commands"].items()
+                if result["overhead_ms"] > STARTUP_BUDGET_MS}
+        self.assertEqual(over, {}, f"budget de {STARTUP_BUDGET_MS:g} ms dépassé")
+
+
+if __name__ == "__main__":
+    unittest.main()
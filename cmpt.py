@@ -1,65 +1,192 @@
 #!/usr/bin/env python3
 
 import argparse
+import sys
+import glob
 import os
 from status import check_login_status
-from datetime import datetime
+from execution_log import log_execution, span
 
-LOG_PATH = os.path.join(os.path.expanduser("~"), "ID1FS/log")
-LOG_FILE_NAME = "execution_log.txt"
+BASE_PATH = os.path.expanduser("~/ID1FS/home")
+CHUNK_SIZE = 1 << 20
+# Files larger than this are split into byte ranges counted in parallel
+SPLIT_SIZE = 64 << 20
+WHITESPACE = b" \t\n\r\x0b\x0c"
+# UTF-8 continuation bytes (10xxxxxx) do not start a new character
+UTF8_CONTINUATION = bytes(range(0x80, 0xC0))
+COUNT_NAMES = ('lines', 'words', 'characters', 'bytes')
 
-def log_command(command, details):
-    log_file_path = os.path.join(LOG_PATH, LOG_FILE_NAME)
+def count_stream(stream, length=None):
+    # Single pass over fixed-size binary chunks: memory stays flat whatever the file size
+    lines = words = characters = size = 0
+    in_word = False
+    first_byte = last_byte = b""
 
-    with open(log_file_path, "a") as log_file:
-        log_file.write(f"Command: {command}\n")
-        log_file.write(f"Timestamp: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-        log_file.write(f"Details: {details}\n")
-        log_file.write("\n")  # Add a separator for better readability between log entries
+    while length is None or size < length:
+        to_read = CHUNK_SIZE if length is None else min(CHUNK_SIZE, length - size)
+        chunk = stream.read(to_read)
+        if not chunk:
+            break
+
+        size += len(chunk)
+        lines += chunk.count(b"\n")
+        characters += len(chunk.translate(None, UTF8_CONTINUATION))
+
+        chunk_words = len(chunk.split())
+        # A word cut by the chunk boundary was already counted in the previous chunk
+        if chunk_words and in_word and chunk[0] not in WHITESPACE:
+            chunk_words -= 1
+        words += chunk_words
+
+        if not first_byte:
+            first_byte = chunk[:1]
+        last_byte = chunk[-1:]
+        in_word = last_byte not in WHITESPACE
+
+    return {'lines': lines, 'words': words, 'characters': characters, 'bytes': size,
+            'first_byte': first_byte, 'last_byte': last_byte}
+
+def count_range(task):
+    file_path, start, length = task
+    with open(file_path, 'rb') as file:
+        file.seek(start)
+        return count_stream(file, length)
+
+def merge_counts(parts):
+    # Parts must be given in file order so that boundary words and the last line are handled once
+    counts = dict.fromkeys(COUNT_NAMES, 0)
+    last_byte = b""
+    for part in parts:
+        for name in COUNT_NAMES:
+            counts[name] += part[name]
+        if part['words'] and last_byte and last_byte not in WHITESPACE and part['first_byte'] not in WHITESPACE:
+            counts['words'] -= 1
+        if part['last_byte']:
+            last_byte = part['last_byte']
+
+    # Like readlines(), a last line without a trailing newline still counts
+    if last_byte and last_byte != b"\n":
+        counts['lines'] += 1
+    return counts
+
+def count_file(file_path):
+    return merge_counts([count_range((file_path, 0, None))])
 
 def count_lines(file_path):
-    with open(file_path, 'r') as file:
-        lines = file.readlines()
-        return len(lines)
+    return count_file(file_path)['lines']
 
-def main():
-    # Check status before running the script
-    if not check_login_status():
-        print("Login status is disabled. Please enable the system.")
-        return
+def walk_files(directory):
+    stack = [directory]
+    while stack:
+        current = stack.pop()
+        with os.scandir(current) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file():
+                    yield entry.path, entry.stat().st_size
+
+def expand_targets(targets):
+    # Each target is a file, a directory walked recursively, or a glob pattern, all relative to ~/ID1FS/home
+    files = []
+    for target in targets:
+        path = os.path.join(BASE_PATH, target)
+        if glob.has_magic(target):
+            matches = sorted(glob.glob(path, recursive=True))
+        else:
+            matches = [path]
+
+        for match in matches:
+            if os.path.isdir(match):
+                files.extend(sorted(walk_files(match)))
+            else:
+                files.append((match, os.path.getsize(match)))
+    return files
+
+def split_tasks(files):
+    tasks = []
+    for index, (file_path, size) in enumerate(files):
+        if size <= SPLIT_SIZE:
+            tasks.append((index, (file_path, 0, None)))
+        else:
+            for start in range(0, size, SPLIT_SIZE):
+                tasks.append((index, (file_path, start, min(SPLIT_SIZE, size - start))))
+    return tasks
+
+def count_files(files, jobs=None):
+    with span("file_read", bytes=sum(size for _, size in files), entries=len(files)):
+        return _count_files(files, jobs)
+
+def _count_files(files, jobs):
+    tasks = split_tasks(files)
+    ranges = [task for _, task in tasks]
 
+    if jobs == 1 or len(ranges) <= 1:
+        parts = list(map(count_range, ranges))
+    else:
+        # Le pool (et multiprocessing) n'est chargé que lorsqu'il y a plusieurs tranches à compter
+        from concurrent.futures import ProcessPoolExecutor
+        workers = jobs or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            parts = list(executor.map(count_range, ranges, chunksize=max(1, len(ranges) // (4 * workers))))
+
+    per_file = [[] for _ in files]
+    for (index, _), part in zip(tasks, parts):
+        per_file[index].append(part)
+
+    return [merge_counts(parts) for parts in per_file]
+
+def format_row(counts, selected, label):
+    return " ".join(str(counts[name]) for name in selected) + f" {label}"
+
+def build_parser():
     # Setup command line argument parser
-    parser = argparse.ArgumentParser(description="Count the number of lines, characters, or words in a file.")
-    parser.add_argument('file', metavar='FILE', type=str, help='The path to the file to analyze')
-    parser.add_argument('-c', '--characters', action='store_true', help='Count the number of characters instead of lines')
-    parser.add_argument('-w', '--words', action='store_true', help='Count the number of words instead of lines')
+    parser = argparse.ArgumentParser(description="Count the number of lines, words, characters or bytes in files, directories or glob patterns. Several options can be combined.")
+    parser.add_argument('file', metavar='FILE', type=str, nargs='+', help='Files, directories or glob patterns to analyze, relative to ~/ID1FS/home')
+    parser.add_argument('-c', '--characters', action='store_true', help='Count the number of characters')
+    parser.add_argument('-w', '--words', action='store_true', help='Count the number of words')
     parser.add_argument('-l', '--lines', action='store_true', help='Count the number of lines (default)')
+    parser.add_argument('-b', '--bytes', action='store_true', help='Count the number of bytes')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='Number of worker processes (default: number of CPUs)')
+    return parser
+
+def run(args):
+    # Default, or if -l is specified, count the number of lines
+    selected = [name for name in COUNT_NAMES if getattr(args, name)]
+    if not selected:
+        selected = ['lines']
+
+    # A single plain file keeps the historical output
+    single_path = os.path.join(BASE_PATH, args.file[0])
+    if len(args.file) == 1 and not glob.has_magic(args.file[0]) and not os.path.isdir(single_path):
+        log_execution("count_lines", f"File: {single_path}, Characters: {args.characters}, Words: {args.words}, Lines: {args.lines}, Bytes: {args.bytes}", label="Command")
+        counts = count_file(single_path)
+        if len(selected) == 1:
+            print(f"Number of {selected[0]} in {single_path}: {counts[selected[0]]}")
+        else:
+            # Several counts requested: one row like wc
+            print(format_row(counts, selected, single_path))
+        return
+
+    files = expand_targets(args.file)
+    log_execution("count_lines", f"Targets: {', '.join(args.file)}, Files: {len(files)}, Counts: {', '.join(selected)}, Jobs: {args.jobs}", label="Command")
+
+    total = dict.fromkeys(COUNT_NAMES, 0)
+    for (file_path, _), counts in zip(files, count_files(files, args.jobs)):
+        print(format_row(counts, selected, os.path.relpath(file_path, BASE_PATH)))
+        for name in COUNT_NAMES:
+            total[name] += counts[name]
+    print(format_row(total, selected, "total"))
+
+def main(argv=None):
+    # Check status before running the script
+    if not check_login_status():
+        print("Login status is disabled. Please enable the system.")
+        return 1
 
     # Parse command line arguments
-    args = parser.parse_args()
-
-    # Construct the full path to the file in the '~/ID1FS/home' directory
-    file_path = os.path.join(os.path.expanduser("~/ID1FS/home"), args.file)
-
-    # Log the command
-    log_command("count_lines", f"File: {file_path}, Characters: {args.characters}, Words: {args.words}, Lines: {args.lines}")
-
-    if args.characters:
-        with open(file_path, 'r') as file:
-            content = file.read()
-            count = len(content)
-            print(f"Number of characters in {file_path}: {count}")
-    elif args.words:
-        with open(file_path, 'r') as file:
-            content = file.read()
-            words = content.split()
-            count = len(words)
-            print(f"Number of words in {file_path}: {count}")
-    else:
-        # Default, or if -l is specified, count the number of lines
-        count = count_lines(file_path)
-        print(f"Number of lines in {file_path}: {count}")
+    args = build_parser().parse_args(argv)
+    return run(args)
 
 if __name__ == "__main__":
-    main()
-
+    sys.exit(main())
@@ -1,86 +1,179 @@
 #!/usr/bin/env python3
 import argparse
-import json
+import itertools
 import os
-from datetime import datetime
+import sys
+import line_index
+from execution_log import log_execution, span
+from session import check_login_status
 
 # Use os.path.expanduser("~") to dynamically obtain the home directory
 
-LOG_PATH = os.path.join(os.path.expanduser("~"), "ID1FS/log")
-LOG_FILE_NAME = "execution_log.txt"
-LOGIN_STATUS_PATH = os.path.join(os.path.expanduser("~"), "ID1FS/metadata/login_status.json")
 TARGET_DIRECTORY = os.path.join(os.path.expanduser("~"), "ID1FS/home")
-
-def check_login_status():
-    try:
-        with open(LOGIN_STATUS_PATH, "r") as status_file:
-            status_data = json.load(status_file)
-            return status_data["status"]
-    except FileNotFoundError:
-        return False
+CHUNK_SIZE = 1 << 20
 
 def display_file_content(filename, options):
     if check_login_status():
-        # Prepend the default directory if no path is specified
-        if not os.path.isabs(filename):
-            filename = os.path.join(TARGET_DIRECTORY, filename)
-
-        # Check if the file is in the target directory
-        if os.path.abspath(filename).startswith(os.path.abspath(TARGET_DIRECTORY)):
-            try:
-                with open(filename, "r") as file:
-                    content = file.read()
-
-                    if options.a:
-                        # Display numbered lines
-                        content = [f"{i+1}: {line}" for i, line in enumerate(content.splitlines())]
-                        content = "\n".join(content)
-                        print(f"File content:\n{content}")
-                    elif options.b:
-                        # Display the number of lines
-                        line_count = len(content.splitlines())
-                        print(f"Number of lines in '{filename}': {line_count}")
-                    elif options.r:
-                        # Display the number of characters
-                        char_count = len(content)
-                        print(f"Number of characters in '{filename}': {char_count}")
-                    else:
-                        print(f"File content:\n{content}")
-
-                    # Log the display content action
-                    log_execution("Display Content", f"Content of file '{filename}' displayed.")
-            except FileNotFoundError:
-                # Log the file not found error
-                log_execution("Error", f"File '{filename}' not found.")
-                print(f"Error: File '{filename}' not found.")
-        else:
-            # Log the unauthorized file error
-            log_execution("Error", f"File '{filename}' is not allowed. It must be in the directory '{TARGET_DIRECTORY}'.")
-            print(f"Error: File '{filename}' is not allowed. It must be in the directory '{TARGET_DIRECTORY}'.")
-    else:
-        # Log the connection status off error
-        log_execution("Error", "Connection status is off. Please login first.")
-        print("Error: Connection status is off. Please login first.")
+        return show_file_content(filename, options)
+    # Log the connection status off error
+    log_execution("Error", "Connection status is off. Please login first.")
+    print("Error: Connection status is off. Please login first.")
+    return False
+
+def parse_range(value):
+    # "START:END", either bound may be omitted (":END", "START:")
+    start, separator, end = value.partition(":")
+    if not separator:
+        raise argparse.ArgumentTypeError(f"invalid range '{value}', expected START:END")
+    try:
+        start = int(start) if start else 0
+        end = int(end) if end else None
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid range '{value}', expected START:END")
+    if start < 0 or (end is not None and end < start):
+        raise argparse.ArgumentTypeError(f"invalid range '{value}'")
+    return start, end
+
+def write_lines(lines, numbered, first_number=1):
+    # Lines are written one by one as they are read, never accumulated
+    last = "\n"
+    for number, line in enumerate(lines, start=first_number):
+        if numbered:
+            line = f"{number}: {line}"
+        sys.stdout.write(line)
+        last = line
+    if not last.endswith("\n"):
+        sys.stdout.write("\n")
+
+def tail_offset(file, count):
+    # Walk backwards from EOF by blocks until enough newlines are seen, without reading the start of the file
+    end = file.seek(0, os.SEEK_END)
+    position = end
+    newlines = 0
+    if count <= 0:
+        return end
+
+    # A trailing newline terminates the last line, it does not start a new one
+    if end > 0:
+        file.seek(end - 1)
+        if file.read(1) == b"\n":
+            newlines = -1
 
-def log_execution(action, details):
-    log_file_path = os.path.join(LOG_PATH, LOG_FILE_NAME)
+    while position > 0:
+        size = min(CHUNK_SIZE, position)
+        position -= size
+        file.seek(position)
+        block = file.read(size)
+        index = len(block)
+        while True:
+            index = block.rfind(b"\n", 0, index)
+            if index < 0:
+                break
+            newlines += 1
+            if newlines == count:
+                return position + index + 1
+    return 0
 
-    with open(log_file_path, "a") as log_file:
-        log_file.write(f"Action: {action}\n")
-        log_file.write(f"Timestamp: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-        log_file.write(f"Details: {details}\n")
-        log_file.write("\n")  # Add a separator for better readability between log entries
+def stream_bytes(file, start, end):
+    file.seek(start)
+    remaining = None if end is None else end - start
+    output = sys.stdout.buffer
+    while remaining is None or remaining > 0:
+        chunk = file.read(CHUNK_SIZE if remaining is None else min(CHUNK_SIZE, remaining))
+        if not chunk:
+            break
+        output.write(chunk)
+        if remaining is not None:
+            remaining -= len(chunk)
+    output.flush()
 
-def main():
+def show_file_content(filename, options):
+    # Prepend the default directory if no path is specified
+    if not os.path.isabs(filename):
+        filename = os.path.join(TARGET_DIRECTORY, filename)
+
+    # Check if the file is in the target directory
+    if os.path.abspath(filename).startswith(os.path.abspath(TARGET_DIRECTORY)):
+        try:
+            with span("file_read", bytes=os.path.getsize(filename), entries=1):
+                display_window(filename, options)
+
+            # Log the display content action
+            log_execution("Display Content", f"Content of file '{filename}' displayed.")
+            return True
+        except FileNotFoundError:
+            # Log the file not found error
+            log_execution("Error", f"File '{filename}' not found.")
+            print(f"Error: File '{filename}' not found.")
+            return False
+    # Log the unauthorized file error
+    log_execution("Error", f"File '{filename}' is not allowed. It must be in the directory '{TARGET_DIRECTORY}'.")
+    print(f"Error: File '{filename}' is not allowed. It must be in the directory '{TARGET_DIRECTORY}'.")
+    return False
+
+def display_window(filename, options):
+    if options.b:
+        # Display the number of lines
+        line_count = line_index.count_lines(filename)
+        print(f"Number of lines in '{filename}': {line_count}")
+    elif options.r:
+        # Display the number of characters
+        with open(filename, "r", errors="replace") as file:
+            char_count = sum(len(chunk) for chunk in iter(lambda: file.read(CHUNK_SIZE), ""))
+        print(f"Number of characters in '{filename}': {char_count}")
+    elif options.range is not None:
+        # Display a byte window of the file
+        start, end = options.range
+        print(f"File content (bytes {start}:{'' if end is None else end}):", flush=True)
+        with open(filename, "rb") as file:
+            stream_bytes(file, start, end)
+    elif options.lines is not None:
+        # Display a window of lines: for large files, the sidecar index turns the skip into a seek
+        start, end = options.lines
+        start = max(start, 1)
+        print("File content:")
+        with open(filename, "rb") as file:
+            line_index.seek_line(file, line_index.find_index(filename), start)
+            lines = (line.decode(errors="replace") for line in file)
+            if end is not None:
+                lines = itertools.islice(lines, max(end - start + 1, 0))
+            write_lines(lines, options.a, start)
+    elif options.tail is not None:
+        print("File content:", flush=True)
+        with open(filename, "rb") as file:
+            offset = tail_offset(file, options.tail)
+            file.seek(offset)
+            lines = (line.decode(errors="replace") for line in file)
+            write_lines(lines, False)
+    else:
+        # Display the content, with numbered lines for -a
+        print("File content:")
+        with open(filename, "r", errors="replace") as file:
+            lines = file if options.head is None else itertools.islice(file, options.head)
+            write_lines(lines, options.a)
+
+def build_parser():
     parser = argparse.ArgumentParser(description="Display file content with specific options if connection status is on")
     parser.add_argument("filename", help="Name of the file to display")
     parser.add_argument("-a", action="store_true", help="Display lines with line numbers")
     parser.add_argument("-b", action="store_true", help="Display the number of lines in the file")
     parser.add_argument("-r", action="store_true", help="Display the number of characters in the file")
+    window = parser.add_mutually_exclusive_group()
+    window.add_argument("--head", type=int, metavar="N", help="Display only the first N lines")
+    window.add_argument("--tail", type=int, metavar="N", help="Display only the last N lines")
+    window.add_argument("--range", type=parse_range, metavar="START:END", help="Display the bytes from START (included) to END (excluded)")
+    window.add_argument("--lines", type=parse_range, metavar="START:END", help="Display lines START to END (included, numbered from 1)")
+
+    return parser
+
+def run(args):
+    # Exit code: 1 when the file could not be displayed
+    return 0 if show_file_content(args.filename, args) else 1
 
-    args = parser.parse_args()
-    display_file_content(args.filename, args)
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return 0 if display_file_content(args.filename, args) else 1
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
 
@@ -1,98 +1,216 @@
 #!/usr/bin/env python3
 import argparse
+import csv
 import os
-import json
+import stat
+import sys
+import metadata_store
+import name_index
+import text_index
 from status import check_login_status
-from datetime import datetime
+from execution_log import log_execution
 
-LOG_PATH = os.path.join(os.path.expanduser("~"), "ID1FS/log")
-LOG_FILE_NAME = "execution_log.txt"
 base_path = os.path.join(os.path.expanduser("~"), "ID1FS/home")
-metadata_path = os.path.join(os.path.expanduser("~"), "ID1FS/metadata/metadata.json")
-
-def format_timestamp(timestamp):
-    return datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S')
+# Code de sortie quand une partie du manifeste a été créée malgré des erreurs (voir batch.PARTIAL_EXIT_CODE)
+EXIT_PARTIAL = 3
+# Création en masse : le travail sur le système de fichiers est réparti sur des threads
+MANIFEST_WORKERS = 8
+DIRECTORY_TYPES = ('d', 'dir', 'directory')
+FILE_TYPES = ('f', 'file')
+
+def default_content(item_name):
+    return f"Contenu du fichier créé : {item_name}\n"
+
+def quota_exceeded(changes):
+    # changes : (chemin complet, octets ajoutés, fichiers ajoutés) ; vérifié sur les totaux, sans parcourir l'arborescence
+    quota = metadata_store.check_quota(changes)
+    if quota is None:
+        return False
+    print(f"Quota dépassé pour {metadata_store.describe_quota(quota)}.")
+    log_execution("Erreur de Quota", f"Création refusée : quota dépassé pour {metadata_store.describe_quota(quota)}.")
+    return True
 
 def add_metadata(item_name, item_path):
-    metadata = {}
-    if os.path.exists(metadata_path):
-        with open(metadata_path, 'r') as metadata_file:
-            try:
-                metadata = json.load(metadata_file)
-            except json.decoder.JSONDecodeError:
-                print("Le fichier de métadonnées est vide ou mal formé. Il sera recréé.")
-
     full_path = os.path.join(base_path, item_path)
 
     stat_info = os.stat(full_path)
 
-    metadata[item_name] = {
-        'path': full_path,
-        'created_at': format_timestamp(stat_info.st_ctime),
-        'last_modified_at': format_timestamp(stat_info.st_mtime),
-        'size': stat_info.st_size,
-        'permissions': oct(stat_info.st_mode & 0o777),
-        'owner': stat_info.st_uid,
-        'group': stat_info.st_gid
-    }
-
-    with open(metadata_path, 'w') as metadata_file:
-        json.dump(metadata, metadata_file, indent=2)
+    metadata_store.put_metadata(item_name, metadata_store.make_record(full_path, stat_info))
+    name_index.add_path(item_path)
+    text_index.index_file(item_path)
 
     print(f"Metadata added for '{item_name}' at '{full_path}'.")
     log_execution("Metadata", f"Metadata added for '{item_name}' at '{full_path}'.")
 
 def create_item(item_name, is_directory):
-    full_path = os.path.join(base_path, item_name)
+    full_path = os.path.normpath(os.path.join(base_path, item_name))
+    parent = os.path.dirname(full_path)
 
     try:
+        parent_mtime_ns = os.stat(parent).st_mtime_ns if os.path.isdir(parent) else None
         if is_directory:
             os.makedirs(full_path, exist_ok=True)
             print(f"Répertoire '{item_name}' créé avec succès.")
             add_metadata(item_name, item_name)
+            metadata_store.refresh_directory_state(parent, parent_mtime_ns)
             log_execution("Création de Répertoire", f"Répertoire créé : '{full_path}'")
         else:
+            content = default_content(item_name)
+            previous = metadata_store.get_metadata(item_name)
+            if quota_exceeded([(full_path, len(content.encode()) - (previous or {}).get('size', 0), 0 if previous else 1)]):
+                return False
             with open(full_path, 'w') as file:
-                file.write(f"Contenu du fichier créé : {item_name}\n")
+                file.write(content)
             print(f"Fichier '{item_name}' créé avec succès.")
             add_metadata(item_name, item_name)
+            metadata_store.refresh_directory_state(parent, parent_mtime_ns)
             log_execution("Création de Fichier", f"Fichier créé : '{full_path}'")
+        return True
 
     except Exception as e:
         print(f"Erreur lors de la création de '{item_name}': {e}")
         action_type = "Répertoire" if is_directory else "Fichier"
         log_execution(f"Erreur lors de la Création de {action_type}", f"Erreur lors de la création de '{item_name}': {str(e)}")
-
-def log_execution(action, details):
-    log_file_path = os.path.join(LOG_PATH, LOG_FILE_NAME)
-
-    with open(log_file_path, "a") as log_file:
-        log_file.write(f"Action: {action}\n")
-        log_file.write(f"Timestamp: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-        log_file.write(f"Details: {details}\n")
-        log_file.write("\n")
-
-def main():
-    if not check_login_status():
-        print("Le statut de connexion est inactif. Veuillez activer le système.")
-        log_execution("Erreur", "L'exécution du script a échoué : Le statut de connexion est inactif.")
-        return
-
+        return False
+
+def read_manifest(manifest_path):
+    # Lignes CSV : chemin,type[,contenu][,taille] ; les lignes vides et les commentaires (#) sont ignorés
+    items = []
+    with open(manifest_path, 'r', newline='') as manifest_file:
+        for line_number, row in enumerate(csv.reader(manifest_file), 1):
+            if not row or not row[0].strip() or row[0].startswith('#'):
+                continue
+            item_type = row[1].strip().lower() if len(row) > 1 else 'f'
+            if item_type not in DIRECTORY_TYPES + FILE_TYPES:
+                raise ValueError(f"ligne {line_number}: type inconnu '{row[1]}'")
+            content = row[2] if len(row) > 2 and row[2] != '' else None
+            size = int(row[3]) if len(row) > 3 and row[3].strip() else None
+            item_name = os.path.normpath(row[0].strip())
+            if os.path.isabs(item_name) or item_name.split(os.sep)[0] == '..':
+                raise ValueError(f"ligne {line_number}: '{row[0]}' sort de ~/ID1FS/home")
+            items.append((item_name, item_type in DIRECTORY_TYPES, content, size))
+    return items
+
+def make_manifest_item(item_name, is_directory, content, size):
+    full_path = os.path.join(base_path, item_name)
+    try:
+        if is_directory:
+            os.makedirs(full_path, exist_ok=True)
+        else:
+            with open(full_path, 'w') as file:
+                if content is not None:
+                    file.write(content)
+                elif size is None:
+                    file.write(default_content(item_name))
+                if size is not None:
+                    file.truncate(size)
+        return item_name, full_path, os.stat(full_path), None
+    except OSError as e:
+        return item_name, full_path, None, e
+
+def manifest_item_size(item_name, content, size):
+    if size is not None:
+        return size
+    return len((content if content is not None else default_content(item_name)).encode())
+
+def manifest_quota_change(item_name, content, size):
+    # Un fichier déjà présent est réécrit : seule la différence de taille compte, comme dans create_item
+    previous = metadata_store.get_metadata(item_name)
+    return (os.path.join(base_path, item_name),
+            manifest_item_size(item_name, content, size) - (previous or {}).get('size', 0),
+            0 if previous else 1)
+
+def missing_parents(items):
+    # Répertoires que makedirs créera implicitement : ancêtres absents du disque et non listés dans le manifeste
+    listed = {name for name, is_directory, _, _ in items if is_directory}
+    missing = set()
+    for name, _, _, _ in items:
+        parent = os.path.dirname(name)
+        while parent and parent not in missing and not os.path.isdir(os.path.join(base_path, parent)):
+            missing.add(parent)
+            parent = os.path.dirname(parent)
+    return sorted(missing - listed)
+
+def create_from_manifest(manifest_path, workers=MANIFEST_WORKERS):
+    try:
+        items = read_manifest(manifest_path)
+    except (OSError, ValueError) as e:
+        print(f"Erreur lors de la lecture du manifeste '{manifest_path}': {e}")
+        log_execution("Erreur", f"Erreur lors de la lecture du manifeste '{manifest_path}': {str(e)}")
+        return False
+
+    # Le manifeste est refusé en entier s'il ferait dépasser un quota
+    if quota_exceeded([manifest_quota_change(name, content, size)
+                       for name, is_directory, content, size in items if not is_directory]):
+        return False
+
+    # Les parents implicites d'abord, puis les répertoires listés, puis les fichiers ; les parents créés ont
+    # leurs métadonnées comme les autres répertoires
+    results = [make_manifest_item(parent, True, None, None) for parent in missing_parents(items)]
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results += executor.map(lambda item: make_manifest_item(*item),
+                                [item for item in items if item[1]])
+        results += executor.map(lambda item: make_manifest_item(*item),
+                                [item for item in items if not item[1]])
+
+    created = [(name, full_path, stat_info) for name, full_path, stat_info, error in results if error is None]
+    errors = [(name, error) for name, _, _, error in results if error is not None]
+
+    # Une seule transaction pour toutes les métadonnées ; seuls les répertoires touchés seront relus au prochain
+    # listage, pas leurs sous-répertoires
+    with metadata_store.batch():
+        for name, full_path, stat_info in created:
+            metadata_store.put_metadata(name, metadata_store.make_record(full_path, stat_info))
+        for directory in {os.path.dirname(full_path) for _, full_path, _ in created}:
+            metadata_store.invalidate_directory_state(directory)
+    name_index.add_paths([name for name, _, _ in created])
+    text_index.index_files([name for name, _, stat_info in created if not stat.S_ISDIR(stat_info.st_mode)])
+
+    for name, error in errors:
+        print(f"Erreur lors de la création de '{name}': {error}")
+    print(f"{len(created)} élément(s) créé(s) depuis '{manifest_path}', {len(errors)} erreur(s).")
+    log_execution("Création depuis un Manifeste",
+                  f"{len(created)} élément(s) créé(s) depuis '{manifest_path}', {len(errors)} erreur(s).",
+                  success=not errors)
+    if errors and created:
+        return None
+    return not errors
+
+def build_parser():
     parser = argparse.ArgumentParser(description="Commande pour créer des fichiers et des répertoires")
 
     parser.add_argument('-f', '--create-file', metavar='NOM_FICHIER', help='Créer un fichier')
     parser.add_argument('-d', '--create-dir', metavar='NOM_REPERTOIRE', help='Créer un répertoire')
+    parser.add_argument('--from-manifest', metavar='FICHIER', help='Créer tous les éléments listés dans un fichier CSV (chemin,type[,contenu][,taille])')
+    parser.add_argument('-j', '--jobs', type=int, default=MANIFEST_WORKERS, help=f'Nombre de threads pour --from-manifest (défaut: {MANIFEST_WORKERS})')
+    return parser
 
-    args = parser.parse_args()
-
+def run(args):
+    # Code de sortie : 1 si l'opération a échoué
     if args.create_file:
-        create_item(args.create_file, False)
+        succes = create_item(args.create_file, False)
     elif args.create_dir:
-        create_item(args.create_dir, True)
+        succes = create_item(args.create_dir, True)
+    elif args.from_manifest:
+        # None : création partielle, les éléments créés sont sur le disque et dans les métadonnées
+        succes = create_from_manifest(args.from_manifest, args.jobs)
+        if succes is None:
+            return EXIT_PARTIAL
     else:
-        parser.print_help()
+        build_parser().print_help()
         log_execution("Erreur", "Aucune opération spécifiée.")
+        succes = False
+    return 0 if succes else 1
 
-if __name__ == "__main__":
-    main()
+def main(argv=None):
+    if not check_login_status():
+        print("Le statut de connexion est inactif. Veuillez activer le système.")
+        log_execution("Erreur", "L'exécution du script a échoué : Le statut de connexion est inactif.")
+        return 1
+
+    args = build_parser().parse_args(argv)
+    return run(args)
 
+if __name__ == "__main__":
+    sys.exit(main())
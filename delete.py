@@ -2,144 +2,281 @@
 import argparse
 import os
 import shutil
-import json
+import subprocess
 import sys
+import time
+import backup_store
+import line_index
+import metadata_store
+import name_index
+import text_index
 from status import check_login_status
 from datetime import datetime
+from execution_log import log_execution
 
 BASE_PATH = os.path.expanduser("~/ID1FS/home")
-METADATA_PATH = os.path.expanduser("~/ID1FS/metadata/metadata.json")
-BACKUP_PATH = os.path.expanduser("~/ID1FS/backup")
-LOG_PATH = os.path.expanduser("~/ID1FS/log")
-LOG_FILE_NAME = "execution_log.txt"
+TRASH_PATH = os.path.expanduser("~/ID1FS/trash")
+PURGE_STAMP_PATH = os.path.join(TRASH_PATH, ".last_purge")
+# Politique de purge par défaut de la corbeille
+TRASH_MAX_AGE_DAYS = 30
+TRASH_MAX_BYTES = 1 << 30
+PURGE_INTERVAL = 3600
 
 def get_full_path(name):
     return os.path.join(BASE_PATH, name)
 
 def create_backup(name):
-    if not os.path.exists(BACKUP_PATH):
-        os.makedirs(BACKUP_PATH)
-
     source_path = get_full_path(name)
-    backup_path = os.path.join(BACKUP_PATH, f"{name}_{datetime.now().strftime('%Y%m%d%H%M%S')}")
-
-    shutil.copy2(source_path, backup_path)
-    log_execution("Backup", f"Item '{name}' backed up to '{backup_path}'.")
-
-def log_execution(action, details):
-    log_file_path = os.path.join(LOG_PATH, LOG_FILE_NAME)
-
-    with open(log_file_path, "a") as log_file:
-        log_file.write(f"Action: {action}\n")
-        log_file.write(f"Timestamp: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-        log_file.write(f"Details: {details}\n")
-        log_file.write("\n")
-
-def create_metadata(name, is_directory):
-    metadata = {}
-
-    if os.path.exists(METADATA_PATH):
-        with open(METADATA_PATH, 'r') as metadata_file:
-            metadata = json.load(metadata_file)
+    snapshot = backup_store.backup(name, source_path)
+    log_execution("Backup", f"Item '{name}' backed up as snapshot '{snapshot['id']}'.")
 
+def create_metadata(name):
     full_path = get_full_path(name)
     stat_info = os.stat(full_path)
 
-    metadata[name] = {
-        'path': full_path,
-        'created_at': format_timestamp(stat_info.st_ctime),
-        'last_modified_at': format_timestamp(stat_info.st_mtime),
-        'size': stat_info.st_size,
-        'permissions': oct(stat_info.st_mode & 0o777),  # Convert to octal
-        'owner': stat_info.st_uid,
-        'group': stat_info.st_gid,
-        'is_directory': is_directory
-    }
-
-    with open(METADATA_PATH, 'w') as metadata_file:
-        json.dump(metadata, metadata_file, indent=2)
-        print(f"Metadata added for '{name}'.")
-        log_execution("Metadata Creation", f"Metadata added for '{name}'.")
+    metadata_store.put_metadata(name, metadata_store.make_record(full_path, stat_info))
+    print(f"Metadata added for '{name}'.")
+    log_execution("Metadata Creation", f"Metadata added for '{name}'.")
 
 def delete_item(name, is_directory):
     full_path = get_full_path(name)
+    parent = os.path.dirname(os.path.normpath(full_path))
 
     try:
+        parent_mtime_ns = os.stat(parent).st_mtime_ns
         create_backup(name)
 
         if is_directory:
             try:
                 # Supprimez le dossier et ses sous-dossiers
+                line_index.remove_tree_indexes(full_path)
                 shutil.rmtree(full_path)
                 print(f"Le dossier {full_path} et ses sous-dossiers ont été supprimés avec succès.")
                 log_execution("Directory Deletion", f"Directory '{full_path}' deleted successfully.")
             except Exception as e:
                 print(f"Erreur lors de la suppression du dossier {full_path}: {e}")
                 log_execution("Directory Deletion Error", f"Error deleting directory '{full_path}': {str(e)}")
+                return False
         else:
             os.remove(full_path)
+            line_index.remove_index(full_path)
             print(f"File '{full_path}' deleted successfully.")
             log_execution("File Deletion", f"File '{full_path}' deleted successfully.")
 
         remove_metadata(name)
+        metadata_store.refresh_directory_state(parent, parent_mtime_ns)
+        if is_directory:
+            metadata_store.remove_metadata_tree(os.path.normpath(full_path))
+            metadata_store.forget_directory_state(os.path.normpath(full_path))
+        return True
 
     except Exception as e:
         item_type = "Directory" if is_directory else "File"
         log_execution(f"{item_type} Deletion Error", f"Error deleting {item_type.lower()} '{full_path}': {str(e)}")
         print(f"Error deleting {item_type.lower()} '{full_path}': {str(e)}")
+        return False
 
-def remove_metadata(name):
-    metadata = {}
-
-    if os.path.exists(METADATA_PATH):
-        with open(METADATA_PATH, 'r') as metadata_file:
-            metadata = json.load(metadata_file)
-
-    if name in metadata:
-        del metadata[name]
-
-        with open(METADATA_PATH, 'w') as metadata_file:
-            json.dump(metadata, metadata_file, indent=2)
-            print(f"Metadata removed for '{name}'.")
-            log_execution("Metadata Removal", f"Metadata removed for '{name}'.")
-
-def delete_directory(directory_name):
-    base_path = os.path.expanduser("~/ID1FS/home")
-    target_directory = os.path.join(base_path, directory_name)
-
-    if os.path.exists(target_directory) and os.path.isdir(target_directory):
-        try:
-            shutil.rmtree(target_directory)
-            print(f"Le dossier {target_directory} et ses sous-dossiers ont été supprimés avec succès.")
-        except Exception as e:
-            print(f"Erreur lors de la suppression du dossier {target_directory}: {e}")
+def trash_item(name):
+    # Mise à la corbeille : un simple rename sur le même système de fichiers, quelle que soit la taille
+    full_path = os.path.normpath(get_full_path(name))
+    parent = os.path.dirname(full_path)
+
+    try:
+        parent_mtime_ns = os.stat(parent).st_mtime_ns
+        is_directory = os.path.isdir(full_path)
+        record = metadata_store.get_metadata(name)
+        import secrets
+        trash_id = f"{datetime.now().strftime('%Y%m%d%H%M%S')}_{secrets.token_hex(4)}"
+
+        os.makedirs(TRASH_PATH, exist_ok=True)
+        if is_directory:
+            line_index.remove_tree_indexes(full_path)
+        os.rename(full_path, os.path.join(TRASH_PATH, trash_id))
+        if not is_directory:
+            line_index.remove_index(full_path)
+
+        with metadata_store.batch():
+            metadata_store.add_trash_entry(trash_id, name, time.time(), record)
+            remove_metadata(name)
+            metadata_store.refresh_directory_state(parent, parent_mtime_ns)
+            if is_directory:
+                metadata_store.remove_metadata_tree(full_path)
+                metadata_store.forget_directory_state(full_path)
+
+        print(f"'{full_path}' moved to the trash as '{trash_id}'.")
+        log_execution("Trash", f"Item '{full_path}' moved to the trash as '{trash_id}'.")
+        schedule_purge()
+        return True
+    except Exception as e:
+        log_execution("Trash Error", f"Error moving '{full_path}' to the trash: {str(e)}")
+        print(f"Error moving '{full_path}' to the trash: {str(e)}")
+        return False
+
+def restore_item(trash_id_or_name):
+    entry = metadata_store.get_trash_entry(trash_id_or_name)
+    if entry is None:
+        print(f"Nothing named '{trash_id_or_name}' in the trash.")
+        log_execution("Restore Error", f"Nothing named '{trash_id_or_name}' in the trash.")
+        return False
+
+    full_path = os.path.normpath(get_full_path(entry['name']))
+    parent = os.path.dirname(full_path)
+    if os.path.lexists(full_path):
+        print(f"Cannot restore '{entry['id']}': '{full_path}' already exists.")
+        log_execution("Restore Error", f"Cannot restore '{entry['id']}': '{full_path}' already exists.")
+        return False
+
+    try:
+        os.makedirs(parent, exist_ok=True)
+        parent_mtime_ns = os.stat(parent).st_mtime_ns
+        os.rename(os.path.join(TRASH_PATH, entry['id']), full_path)
+
+        # Un répertoire revient avec son contenu, dont les enregistrements (et donc les totaux d'occupation) sont refaits
+        restored = [(entry['name'], full_path)]
+        if os.path.isdir(full_path) and not os.path.islink(full_path):
+            for current, directories, files in os.walk(full_path):
+                for child in directories + files:
+                    child_path = os.path.join(current, child)
+                    restored.append((os.path.join(entry['name'], os.path.relpath(child_path, full_path)), child_path))
+
+        with metadata_store.batch():
+            for name, path in restored:
+                metadata_store.put_metadata(name, metadata_store.make_record(path, os.stat(path)))
+            metadata_store.remove_trash_entry(entry['id'])
+            metadata_store.refresh_directory_state(parent, parent_mtime_ns)
+        name_index.add_paths([name for name, _ in restored])
+        text_index.index_file(entry['name'])
+
+        print(f"'{entry['id']}' restored to '{full_path}'.")
+        log_execution("Restore", f"Trash item '{entry['id']}' restored to '{full_path}'.")
+        return True
+    except Exception as e:
+        log_execution("Restore Error", f"Error restoring '{entry['id']}': {str(e)}")
+        print(f"Error restoring '{entry['id']}': {str(e)}")
+        return False
+
+def tree_size(path):
+    if not os.path.isdir(path) or os.path.islink(path):
+        return os.lstat(path).st_size
+    total = 0
+    for current, directories, files in os.walk(path):
+        for file_name in files:
+            try:
+                total += os.lstat(os.path.join(current, file_name)).st_size
+            except FileNotFoundError:
+                pass
+    return total
+
+def remove_tree(path):
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path)
     else:
-        print(f"Le dossier {target_directory} n'existe pas ou n'est pas un répertoire.")
+        os.remove(path)
 
-def main():
-    if not check_login_status():
-        log_execution("Error", "Script execution failed: Login status is inactive.")
-        return
+def purge_trash(max_age_days=TRASH_MAX_AGE_DAYS, max_bytes=TRASH_MAX_BYTES):
+    # D'abord les éléments trop anciens, puis les plus anciens tant que le budget de taille est dépassé
+    now = time.time()
+    purged = reclaimed = 0
+    remaining = []
+
+    for entry in metadata_store.iter_trash():
+        path = os.path.join(TRASH_PATH, entry['id'])
+        if not os.path.lexists(path):
+            metadata_store.remove_trash_entry(entry['id'])
+            continue
+        size = tree_size(path)
+        if max_age_days is not None and now - entry['trashed_at'] > max_age_days * 86400:
+            remove_tree(path)
+            metadata_store.remove_trash_entry(entry['id'])
+            purged += 1
+            reclaimed += size
+        else:
+            remaining.append((entry, path, size))
+
+    total = sum(size for _, _, size in remaining)
+    for entry, path, size in remaining:
+        if max_bytes is None or total <= max_bytes:
+            break
+        remove_tree(path)
+        metadata_store.remove_trash_entry(entry['id'])
+        purged += 1
+        reclaimed += size
+        total -= size
+
+    os.makedirs(TRASH_PATH, exist_ok=True)
+    with open(PURGE_STAMP_PATH, "w"):
+        pass
+    return purged, reclaimed
+
+def schedule_purge():
+    # Purge en arrière-plan dans un processus détaché, au plus une fois par PURGE_INTERVAL
+    try:
+        if time.time() - os.stat(PURGE_STAMP_PATH).st_mtime < PURGE_INTERVAL:
+            return
+    except FileNotFoundError:
+        pass
+
+    with open(PURGE_STAMP_PATH, "w"):
+        pass
+    subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "--purge", "--quiet"],
+        stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        start_new_session=True
+    )
+
+def remove_metadata(name):
+    name_index.remove_path(name)
+    text_index.remove_path(name)
+    if metadata_store.remove_metadata(name):
+        print(f"Metadata removed for '{name}'.")
+        log_execution("Metadata Removal", f"Metadata removed for '{name}'.")
 
+def build_parser():
     parser = argparse.ArgumentParser(description="Command for deleting files and directories")
 
     parser.add_argument('-f', '--delete-file', metavar='FILENAME', help='Delete a file')
     parser.add_argument('-d', '--delete-dir', metavar='DIRNAME', help='Delete a directory')
+    parser.add_argument('-t', '--trash', action='store_true', help='Move the item to ~/ID1FS/trash instead of backing it up and deleting it')
+    parser.add_argument('--restore', metavar='ID_OR_NAME', help='Restore an item from the trash')
+    parser.add_argument('--list-trash', action='store_true', help='List the items in the trash')
+    parser.add_argument('--purge', action='store_true', help='Empty the trash according to the age and size limits')
+    parser.add_argument('--max-age', type=float, default=TRASH_MAX_AGE_DAYS, metavar='DAYS', help=f'Purge items older than DAYS (default: {TRASH_MAX_AGE_DAYS})')
+    parser.add_argument('--max-size', type=float, default=TRASH_MAX_BYTES / (1 << 20), metavar='MB', help=f'Keep the trash under MB megabytes (default: {TRASH_MAX_BYTES >> 20})')
+    parser.add_argument('--quiet', action='store_true', help=argparse.SUPPRESS)
+    return parser
 
-    args = parser.parse_args()
-
-    if args.delete_file:
-        delete_item(args.delete_file, False)
+def run(args):
+    # Exit code: 1 when the operation failed
+    if args.trash and (args.delete_file or args.delete_dir):
+        return 0 if trash_item(args.delete_file or args.delete_dir) else 1
+    elif args.delete_file:
+        return 0 if delete_item(args.delete_file, False) else 1
     elif args.delete_dir:
-        delete_item(args.delete_dir, True)
+        return 0 if delete_item(args.delete_dir, True) else 1
+    elif args.restore:
+        return 0 if restore_item(args.restore) else 1
+    elif args.list_trash:
+        for entry in metadata_store.iter_trash():
+            trashed_at = datetime.fromtimestamp(entry['trashed_at']).strftime('%Y-%m-%d %H:%M:%S')
+            print(f"{entry['id']}  {trashed_at}  {entry['name']}")
+    elif args.purge:
+        purged, reclaimed = purge_trash(args.max_age, int(args.max_size * (1 << 20)))
+        if not args.quiet:
+            print(f"{purged} item(s) purged from the trash, {reclaimed} bytes reclaimed.")
+        log_execution("Trash Purge", f"{purged} item(s) purged, {reclaimed} bytes reclaimed.")
     else:
         log_execution("Error", "Script execution failed: Missing options or filename.")
-        parser.print_help()
+        build_parser().print_help()
+        return 1
+    return 0
 
-if __name__ == "__main__":
-    if len(sys.argv) == 3 and sys.argv[1] == "-d":
-        directory_name = sys.argv[2]
-        delete_directory(directory_name)
-    else:
-        main()
+def main(argv=None):
+    if not check_login_status():
+        log_execution("Error", "Script execution failed: Login status is inactive.")
+        return 1
 
+    args = build_parser().parse_args(argv)
+    return run(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
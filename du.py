@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+import argparse
+import sys
+import json
+import os
+import metadata_store
+from status import check_login_status
+from execution_log import log_execution
+
+BASE_PATH = os.path.expanduser("~/ID1FS/home")
+SIZE_UNITS = {'': 1, 'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30, 'T': 1 << 40}
+
+
+def parse_size(value):
+    # 512, 10K, 1.5M, 2G (puissances de 1024)
+    number = value.strip().upper().rstrip('O').rstrip('B')
+    unit = number[-1:] if number[-1:] in SIZE_UNITS else ''
+    try:
+        return int(float(number[:len(number) - len(unit)]) * SIZE_UNITS[unit])
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"taille invalide '{value}', attendu par exemple 512, 10K, 1.5M ou 2G")
+
+
+def format_size(size, human):
+    if not human:
+        return str(size)
+    for unit in ('', 'K', 'M', 'G'):
+        if abs(size) < 1024:
+            return f"{size:.1f}{unit}" if unit else str(size)
+        size /= 1024
+    return f"{size:.1f}T"
+
+
+def directory_usage(full_path, max_depth, depth=0):
+    # Sous-répertoires d'abord, comme du ; chaque total est une seule lecture, quel que soit le volume en dessous
+    if depth < max_depth:
+        for _, record in metadata_store.iter_children(full_path):
+            if record.get('is_directory'):
+                yield from directory_usage(record['path'], max_depth, depth + 1)
+    yield full_path, metadata_store.get_usage(full_path)
+
+
+def relative_name(full_path):
+    return os.path.relpath(full_path, BASE_PATH)
+
+
+def print_usage(rows, human, as_json):
+    for full_path, usage in rows:
+        if as_json:
+            print(json.dumps(dict(usage, path=relative_name(full_path)), ensure_ascii=False))
+        else:
+            print(f"{format_size(usage['bytes'], human):>10}  {usage['files']:>8} fichier(s)  {relative_name(full_path)}")
+
+
+def print_quotas(human, as_json):
+    for quota in metadata_store.iter_quotas():
+        if as_json:
+            print(json.dumps(dict(quota, path=relative_name(quota['path'])), ensure_ascii=False))
+            continue
+        limits = []
+        if quota['max_bytes'] is not None:
+            limits.append(f"{format_size(quota['bytes'], human)}/{format_size(quota['max_bytes'], human)}")
+        if quota['max_files'] is not None:
+            limits.append(f"{quota['files']}/{quota['max_files']} fichier(s)")
+        print(f"{relative_name(quota['path'])}  {', '.join(limits)}")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Occupation et quotas des répertoires de ~/ID1FS/home, d'après les totaux tenus à jour dans les métadonnées.")
+    parser.add_argument('chemin', nargs='?', default='', help='Répertoire relatif à ~/ID1FS/home (par défaut, la racine)')
+    parser.add_argument('-d', '--max-depth', type=int, default=0, metavar='N', help='Afficher aussi les sous-répertoires jusqu\'à N niveaux')
+    parser.add_argument('-H', '--human-readable', action='store_true', help='Tailles en K, M, G')
+    parser.add_argument('--json', action='store_true', help='Un objet JSON par ligne')
+    parser.add_argument('--rebuild', action='store_true', help='Recalculer tous les totaux depuis les métadonnées (après sync.py si le disque a changé hors ID1FS)')
+    parser.add_argument('--set-quota', action='store_true', help='Fixer le quota du répertoire avec --max-size et/ou --max-files')
+    parser.add_argument('--max-size', type=parse_size, metavar='TAILLE', help='Taille maximale sous le répertoire (ex. 500M)')
+    parser.add_argument('--max-files', type=int, metavar='N', help='Nombre maximal de fichiers sous le répertoire')
+    parser.add_argument('--remove-quota', action='store_true', help='Supprimer le quota du répertoire')
+    parser.add_argument('--quotas', action='store_true', help='Lister les quotas et leur occupation')
+    return parser
+
+
+def run(args):
+    full_path = os.path.normpath(os.path.join(BASE_PATH, args.chemin))
+    if full_path != BASE_PATH and not full_path.startswith(BASE_PATH + os.sep):
+        print(f"'{args.chemin}' n'est pas dans ~/ID1FS/home.")
+        log_execution("Usage Error", f"'{args.chemin}' is outside ~/ID1FS/home.")
+        return 1
+
+    if args.rebuild:
+        directories = metadata_store.rebuild_usage()
+        print(f"Totaux d'occupation recalculés pour {directories} répertoire(s).")
+        log_execution("Usage", f"Usage totals rebuilt for {directories} directories.")
+
+    if args.set_quota:
+        if args.max_size is None and args.max_files is None:
+            print("--set-quota demande --max-size et/ou --max-files.")
+            log_execution("Quota Error", "--set-quota without --max-size or --max-files.")
+            return 1
+        metadata_store.set_quota(full_path, args.max_size, args.max_files)
+        print(f"Quota fixé pour '{relative_name(full_path)}'.")
+        log_execution("Quota", f"Quota set for '{full_path}': max_bytes={args.max_size}, max_files={args.max_files}.")
+    elif args.remove_quota:
+        removed = metadata_store.remove_quota(full_path)
+        print(f"Quota supprimé pour '{relative_name(full_path)}'." if removed else f"Aucun quota pour '{relative_name(full_path)}'.")
+        log_execution("Quota", f"Quota removed for '{full_path}'.", success=removed)
+
+    if args.quotas:
+        print_quotas(args.human_readable, args.json)
+        log_execution("Quota", "Quotas listed.")
+        return
+
+    print_usage(directory_usage(full_path, args.max_depth), args.human_readable, args.json)
+    log_execution("Usage", f"Usage of '{full_path}' read from the metadata totals.")
+
+
+def main(argv=None):
+    if not check_login_status():
+        print("Le statut de connexion est désactivé. Veuillez activer le système.")
+        log_execution("Error", "Script execution failed: Login status is inactive.")
+        return 1
+
+    args = build_parser().parse_args(argv)
+    return run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
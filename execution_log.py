@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+import atexit
+import fcntl
+import importlib
+import io
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+LOG_PATH = os.path.join(os.path.expanduser("~"), "ID1FS/log")
+LOG_FILE_NAME = "execution_log.txt"
+JSON_LOG_FILE_NAME = "execution_log.jsonl"
+
+# "text" keeps the historical Action/Timestamp/Details blocks, "json" writes JSON lines, "both" writes both
+LOG_FORMAT = os.environ.get("ID1FS_LOG_FORMAT", "text")
+# The buffer is written as soon as one of these thresholds is reached, and in any case at exit
+FLUSH_RECORDS = 256
+FLUSH_INTERVAL = 2.0
+# Rotation: the active file becomes the numbered segment <name>.<N> (the highest N is the newest) when it would
+# grow past ROTATE_BYTES or was last written on another day. Closed segments are compressed by a detached
+# process, which also drops the oldest segments once all of them together exceed RETENTION_BYTES.
+ROTATE_BYTES = int(os.environ.get("ID1FS_LOG_MAX_BYTES", 16 << 20))
+ROTATE_DAILY = os.environ.get("ID1FS_LOG_ROTATE_DAILY", "1") != "0"
+COMPRESSION = os.environ.get("ID1FS_LOG_COMPRESSION", "gz")
+RETENTION_BYTES = int(os.environ.get("ID1FS_LOG_RETENTION_BYTES", 256 << 20))
+ROTATE_LOCK_NAME = ".rotate.lock"
+COMPRESS_LOCK_NAME = ".compress.lock"
+# Suffix -> compression module, imported only when a segment is actually compressed or read back
+COMPRESSORS = {"gz": "gzip", "xz": "lzma"}
+
+_buffer = []
+_buffer_lock = threading.Lock()
+_write_lock = threading.Lock()
+_last_flush = time.monotonic()
+_handles = {}
+_keep_open = False
+_writer = None
+_writer_stop = threading.Event()
+# Phase durations and byte/entry counters of this process, written as one "Timing" record per command
+_spans = {}
+_spans_lock = threading.Lock()
+# Command the Timing records are attributed to when none is given; set by the id1fs dispatcher,
+# otherwise taken from the script name
+COMMAND_NAME = None
+
+# total_ms is measured with perf_counter from the import of this module (right at the start of the id1fs
+# dispatcher, after the standard library imports in the scripts).
+# Interpreter startup is left out: the process start time in /proc is too coarse and, in containers, not on
+# the same clock as /proc/uptime; benchmarks/startup.py measures it from outside the process
+_IMPORTED_AT = time.perf_counter()
+
+def log_execution(action, details=None, success=None, label="Action"):
+    global _last_flush
+    record = {
+        'label': label,
+        'action': action,
+        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    }
+    if details is not None:
+        record['details'] = details
+    if success is not None:
+        record['success'] = success
+
+    with _buffer_lock:
+        _buffer.append(record)
+        full = len(_buffer) >= FLUSH_RECORDS
+        late = _writer is None and time.monotonic() - _last_flush >= FLUSH_INTERVAL
+
+    if full or late:
+        flush()
+
+def record_span(phase, seconds, **counters):
+    with _spans_lock:
+        totals = _spans.setdefault(phase, {'calls': 0, 'ms': 0.0})
+        totals['calls'] += 1
+        totals['ms'] += seconds * 1000
+        for name, value in counters.items():
+            totals[name] = totals.get(name, 0) + value
+
+@contextmanager
+def span(phase, **counters):
+    # with span("walk") as counters: counters['entries'] = n
+    start = time.perf_counter()
+    try:
+        yield counters
+    finally:
+        record_span(phase, time.perf_counter() - start, **counters)
+
+def emit_timings(command=None, total=False):
+    # One "Timing" record with the spans recorded since the previous one; batch mode calls it after each command
+    global _spans
+    with _spans_lock:
+        spans = _spans
+        _spans = {}
+    if not spans:
+        return
+    timings = {'phases': {phase: {name: round(value, 3) if isinstance(value, float) else value for name, value in totals.items()}
+                          for phase, totals in spans.items()}}
+    if total:
+        timings['total_ms'] = round((time.perf_counter() - _IMPORTED_AT) * 1000, 3)
+    command = command or COMMAND_NAME or os.path.splitext(os.path.basename(sys.argv[0]))[0] or "python"
+    log_execution(command, json.dumps(timings), label="Timing")
+
+def format_text(record):
+    lines = [f"{record['label']}: {record['action']}\n", f"Timestamp: {record['timestamp']}\n"]
+    if 'details' in record:
+        lines.append(f"Details: {record['details']}\n")
+    if 'success' in record:
+        lines.append(f"Success: {record['success']}\n")
+    lines.append("\n")  # Separator between log entries
+    return "".join(lines)
+
+def format_json(record):
+    return json.dumps(record, ensure_ascii=False) + "\n"
+
+def parse_text(lines):
+    # Reads back the Action/Timestamp/Details blocks written by format_text
+    record = {}
+    for line in lines:
+        line = line.rstrip("\n")
+        if not line:
+            if record:
+                yield record
+                record = {}
+            continue
+        key, separator, value = line.partition(": ")
+        if not record:
+            record = {'label': key, 'action': value}
+        elif key == "Timestamp" and separator:
+            record['timestamp'] = value
+        elif key == "Details" and separator:
+            record['details'] = value
+        elif key == "Success" and separator:
+            record['success'] = value == "True"
+        elif 'details' in record:
+            # Details spanning several lines in old records
+            record['details'] += "\n" + line
+    if record:
+        yield record
+
+def active_log_name():
+    # The JSON lines log when it is being written, the text log otherwise
+    if LOG_FORMAT in ("json", "both") and segment_paths(JSON_LOG_FILE_NAME):
+        return JSON_LOG_FILE_NAME
+    return LOG_FILE_NAME
+
+def read_records():
+    # Every record, oldest first, across the closed (possibly compressed) segments and the active file
+    file_name = active_log_name()
+    for path in segment_paths(file_name):
+        with io.TextIOWrapper(open_segment(path), errors="replace") as log_file:
+            if file_name == JSON_LOG_FILE_NAME:
+                for line in log_file:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue
+            else:
+                yield from parse_text(log_file)
+
+def segment_number(file_name, name):
+    # "<file_name>.<N>", "<file_name>.<N>.gz" or "<file_name>.<N>.xz" -> N
+    if not name.startswith(file_name + "."):
+        return None
+    number, _, suffix = name[len(file_name) + 1:].partition(".")
+    if not number.isdigit() or suffix not in ("", *COMPRESSORS):
+        return None
+    return int(number)
+
+def segment_paths(file_name=LOG_FILE_NAME, include_active=True):
+    # Closed segments from the oldest to the newest, then the active file
+    segments = []
+    if os.path.isdir(LOG_PATH):
+        for name in os.listdir(LOG_PATH):
+            number = segment_number(file_name, name)
+            if number is not None:
+                segments.append((number, name.endswith(tuple(COMPRESSORS)), os.path.join(LOG_PATH, name)))
+    # While a segment is being compressed both copies exist: the plain one is complete, the other may not be
+    paths = []
+    for number, compressed, path in sorted(segments):
+        if not paths or segment_number(file_name, os.path.basename(paths[-1])) != number:
+            paths.append(path)
+    active = os.path.join(LOG_PATH, file_name)
+    if include_active and os.path.exists(active):
+        paths.append(active)
+    return paths
+
+def open_segment(path):
+    suffix = path.rsplit(".", 1)[-1]
+    if suffix in COMPRESSORS:
+        return _compressor(suffix)(path, "rb")
+    return open(path, "rb")
+
+@contextmanager
+def _locked(lock_name, blocking=True):
+    os.makedirs(LOG_PATH, exist_ok=True)
+    with open(os.path.join(LOG_PATH, lock_name), "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def _move_segment(source, destination):
+    # The logquery index of a segment follows it
+    os.replace(source, destination)
+    if os.path.exists(source + ".idx"):
+        os.replace(source + ".idx", destination + ".idx")
+
+def _needs_rotation(path, incoming):
+    try:
+        stat_info = os.stat(path)
+    except FileNotFoundError:
+        return False
+    if stat_info.st_size == 0:
+        return False
+    if ROTATE_BYTES and stat_info.st_size + incoming > ROTATE_BYTES:
+        return True
+    return ROTATE_DAILY and datetime.fromtimestamp(stat_info.st_mtime).date() != datetime.now().date()
+
+def _rotate(file_name):
+    numbers = [segment_number(file_name, name) for name in os.listdir(LOG_PATH)]
+    number = max((number for number in numbers if number is not None), default=0) + 1
+    path = os.path.join(LOG_PATH, file_name)
+    _move_segment(path, f"{path}.{number}")
+
+def _compressor(suffix):
+    return importlib.import_module(COMPRESSORS[suffix]).open
+
+def _start_maintenance():
+    import subprocess
+    subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "--maintain"],
+        stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        start_new_session=True
+    )
+
+def compress_segment(path):
+    import shutil
+    compressed_path = f"{path}.{COMPRESSION}"
+    with open(path, "rb") as source, _compressor(COMPRESSION)(compressed_path + ".tmp", "wb") as target:
+        shutil.copyfileobj(source, target)
+    os.replace(compressed_path + ".tmp", compressed_path)
+    if os.path.exists(path + ".idx"):
+        os.replace(path + ".idx", compressed_path + ".idx")
+    os.remove(path)
+
+def maintain_segments():
+    # Compress the closed segments, then drop the oldest ones beyond the retention budget.
+    # A single maintainer runs at a time; the others give up immediately.
+    try:
+        with _locked(COMPRESS_LOCK_NAME, blocking=False):
+            closed = []
+            for file_name in (LOG_FILE_NAME, JSON_LOG_FILE_NAME):
+                for path in segment_paths(file_name, include_active=False):
+                    if COMPRESSION in COMPRESSORS and not path.endswith(tuple(COMPRESSORS)):
+                        compress_segment(path)
+                        path = f"{path}.{COMPRESSION}"
+                    closed.append(path)
+
+            active_size = sum(os.path.getsize(os.path.join(LOG_PATH, name)) for name in (LOG_FILE_NAME, JSON_LOG_FILE_NAME)
+                              if os.path.exists(os.path.join(LOG_PATH, name)))
+            total = active_size + sum(os.path.getsize(path) for path in closed)
+            for path in sorted(closed, key=os.path.getmtime):
+                if total <= RETENTION_BYTES:
+                    break
+                total -= os.path.getsize(path)
+                os.remove(path)
+                if os.path.exists(path + ".idx"):
+                    os.remove(path + ".idx")
+    except BlockingIOError:
+        pass
+
+def _get_handle(file_name):
+    handle = _handles.get(file_name)
+    if handle is None:
+        os.makedirs(LOG_PATH, exist_ok=True)
+        handle = open(os.path.join(LOG_PATH, file_name), "a")
+        _handles[file_name] = handle
+    return handle
+
+def _close_handle(file_name):
+    handle = _handles.pop(file_name, None)
+    if handle is not None:
+        handle.close()
+
+def _write(file_name, data):
+    # Writers and the rotation share one lock, so nothing is appended to a segment once it has been closed
+    path = os.path.join(LOG_PATH, file_name)
+    with _locked(ROTATE_LOCK_NAME):
+        rotated = _needs_rotation(path, len(data))
+        if rotated:
+            _close_handle(file_name)
+            _rotate(file_name)
+        handle = _get_handle(file_name)
+        if os.fstat(handle.fileno()).st_ino != os.stat(path).st_ino:
+            # Kept open across a rotation done by another process
+            _close_handle(file_name)
+            handle = _get_handle(file_name)
+        handle.write(data)
+        handle.flush()
+        if not _keep_open:
+            _close_handle(file_name)
+    if rotated:
+        _start_maintenance()
+
+def flush():
+    global _last_flush
+    with _buffer_lock:
+        records = _buffer[:]
+        _buffer.clear()
+        _last_flush = time.monotonic()
+
+    if not records:
+        return
+
+    with _write_lock:
+        if LOG_FORMAT in ("text", "both"):
+            _write(LOG_FILE_NAME, "".join(format_text(record) for record in records))
+        if LOG_FORMAT in ("json", "both"):
+            _write(JSON_LOG_FILE_NAME, "".join(format_json(record) for record in records))
+
+def keep_open(enabled=True):
+    # Long-running callers keep the log files open between flushes instead of reopening them
+    global _keep_open
+    with _write_lock:
+        _keep_open = enabled
+        if not enabled:
+            for handle in _handles.values():
+                handle.close()
+            _handles.clear()
+
+def _writer_loop(interval):
+    while not _writer_stop.wait(interval):
+        flush()
+
+def start_background_writer(interval=FLUSH_INTERVAL):
+    global _writer
+    if _writer is not None:
+        return
+    keep_open(True)
+    _writer_stop.clear()
+    _writer = threading.Thread(target=_writer_loop, args=(interval,), name="execution-log-writer", daemon=True)
+    _writer.start()
+
+def stop_background_writer():
+    global _writer
+    if _writer is None:
+        return
+    _writer_stop.set()
+    _writer.join()
+    _writer = None
+    flush()
+    keep_open(False)
+
+def _shutdown():
+    emit_timings(total=True)
+    stop_background_writer()
+    flush()
+    keep_open(False)
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["--maintain"]:
+        maintain_segments()
+else:
+    atexit.register(_shutdown)
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+import importlib
+import os
+import sys
+
+# Sous-commande -> (module, description). Seul le module de la commande choisie est importé,
+# avec ses propres dépendances : "id1fs status" ne charge ni sqlite3 ni crypt
+COMMANDS = {
+    "create": ("create", "Créer des fichiers et des répertoires"),
+    "delete": ("delete", "Supprimer, mettre à la corbeille ou restaurer"),
+    "modifier": ("modifier", "Modifier un fichier dans l'éditeur"),
+    "content": ("content", "Afficher le contenu d'un fichier"),
+    "lst": ("lst", "Lister un répertoire"),
+    "trouver": ("trouver", "Chercher des fichiers par nom"),
+    "search": ("search", "Chercher des fichiers par contenu"),
+    "cmpt": ("cmpt", "Compter lignes, mots et caractères"),
+    "du": ("du", "Occupation et quotas des répertoires"),
+    "sync": ("sync", "Resynchroniser les métadonnées"),
+    "backup": ("backup_store", "Maintenance des sauvegardes"),
+    "stats": ("stats", "Statistiques des temps d'exécution"),
+    "logquery": ("logquery", "Interroger le journal d'exécution"),
+    "batch": ("batch", "Exécuter une liste de commandes"),
+    "status": ("status", "Statut de la session"),
+    "login": ("login", "Ouvrir ou fermer la session"),
+    "user": ("USER", "Gérer les utilisateurs"),
+}
+
+
+def usage():
+    width = max(len(command) for command in COMMANDS)
+    lines = ["usage: id1fs <commande> [arguments...]", "", "commandes :"]
+    lines += [f"  {command:<{width}}  {description}" for command, (_, description) in COMMANDS.items()]
+    lines += ["", "id1fs <commande> -h affiche l'aide de la commande."]
+    return "\n".join(lines) + "\n"
+
+
+def resolve(command):
+    # Les noms de scripts sont aussi acceptés : "lst.py", "USER", "backup_store"
+    if command.endswith(".py"):
+        command = command[:-3]
+    if command in COMMANDS:
+        return COMMANDS[command][0]
+    modules = {module: module for module, _ in COMMANDS.values()}
+    return modules.get(command)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if not argv or argv[0] in ("-h", "--help"):
+        sys.stdout.write(usage())
+        return 0 if argv else 2
+
+    module_name = resolve(argv[0])
+    if module_name is None:
+        sys.stderr.write(f"id1fs: commande inconnue '{argv[0]}'\n\n" + usage())
+        return 2
+
+    # Les analyseurs des commandes prennent leur nom de programme dans sys.argv[0] ; le journal, lui,
+    # attribue les mesures au module, comme quand le script est lancé directement
+    sys.argv[0] = f"{os.path.basename(sys.argv[0])} {argv[0]}"
+    import execution_log
+    execution_log.COMMAND_NAME = module_name
+    module = importlib.import_module(module_name)
+    result = module.main(argv[1:])
+    return result if isinstance(result, int) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+import hashlib
+import os
+import struct
+from array import array
+
+INDEX_DIR = os.path.expanduser("~/ID1FS/metadata/line_index")
+# One offset is kept every STEP lines: 8 bytes per STEP lines of the indexed file
+STEP = 1000
+CHUNK_SIZE = 1 << 20
+# Below this size a plain streaming pass is as fast as reading the index
+INDEX_MIN_SIZE = 1 << 20
+
+HEADER = struct.Struct("<8sQqQIQ")
+MAGIC = b"ID1LIDX1"
+
+def index_path(file_path):
+    key = hashlib.sha1(os.path.realpath(file_path).encode()).hexdigest()
+    return os.path.join(INDEX_DIR, key + ".idx")
+
+def scan(file_path, step=STEP):
+    # offsets[k] is the byte offset where line k * step + 1 starts
+    offsets = array("Q", [0])
+    line_count = 0
+    position = 0
+    next_mark = step
+    last_byte = b""
+
+    with open(file_path, "rb") as file:
+        for chunk in iter(lambda: file.read(CHUNK_SIZE), b""):
+            newlines = chunk.count(b"\n")
+            # Only the newlines up to the last mark of the chunk are located; the rest are just counted
+            index = -1
+            seen = line_count
+            while line_count + newlines >= next_mark:
+                for _ in range(next_mark - seen):
+                    index = chunk.find(b"\n", index + 1)
+                seen = next_mark
+                offsets.append(position + index + 1)
+                next_mark += step
+            line_count += newlines
+            position += len(chunk)
+            last_byte = chunk[-1:]
+
+    # A last line without a trailing newline still counts, like splitlines()
+    if last_byte and last_byte != b"\n":
+        line_count += 1
+    return offsets, line_count
+
+def save_index(file_path, stat_info, step, line_count, offsets):
+    os.makedirs(INDEX_DIR, exist_ok=True)
+    path = index_path(file_path)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as index_file:
+        index_file.write(HEADER.pack(MAGIC, stat_info.st_size, stat_info.st_mtime_ns, stat_info.st_ino, step, line_count))
+        offsets.tofile(index_file)
+    os.replace(temp_path, path)
+
+def load_index(file_path, stat_info=None):
+    # Returns (step, line_count, offsets), or None when there is no index or the file changed since
+    stat_info = stat_info or os.stat(file_path)
+    try:
+        with open(index_path(file_path), "rb") as index_file:
+            header = index_file.read(HEADER.size)
+            if len(header) != HEADER.size:
+                return None
+            magic, size, mtime_ns, inode, step, line_count = HEADER.unpack(header)
+            if magic != MAGIC or (size, mtime_ns, inode) != (stat_info.st_size, stat_info.st_mtime_ns, stat_info.st_ino):
+                return None
+            offsets = array("Q")
+            offsets.frombytes(index_file.read())
+    except FileNotFoundError:
+        return None
+    return step, line_count, offsets
+
+def get_index(file_path):
+    stat_info = os.stat(file_path)
+    index = load_index(file_path, stat_info)
+    if index is None:
+        offsets, line_count = scan(file_path)
+        save_index(file_path, stat_info, STEP, line_count, offsets)
+        index = (STEP, line_count, offsets)
+    return index
+
+def seek_line(file, index, line_number):
+    # Position a binary file at the start of line_number (1-based): one seek plus at most step - 1 readline.
+    # Without an index (small files), the lines are skipped from the start
+    step, line_count, offsets = index or (1, 0, array("Q", [0]))
+    block = min((line_number - 1) // step, len(offsets) - 1)
+    file.seek(offsets[block])
+    for _ in range(line_number - 1 - block * step):
+        if not file.readline():
+            break
+
+def find_index(file_path):
+    # An existing up to date index, or a new one for files of at least INDEX_MIN_SIZE; None for smaller files
+    stat_info = os.stat(file_path)
+    index = load_index(file_path, stat_info)
+    if index is None and stat_info.st_size >= INDEX_MIN_SIZE:
+        index = get_index(file_path)
+    return index
+
+def count_lines(file_path):
+    # O(1) for unchanged files that were already indexed
+    index = find_index(file_path)
+    if index is not None:
+        return index[1]
+    return scan(file_path)[1]
+
+def remove_index(file_path):
+    try:
+        os.remove(index_path(file_path))
+    except FileNotFoundError:
+        pass
+
+def remove_tree_indexes(directory):
+    # Before a directory is deleted or trashed: the indexes of the files under it. Nothing is walked when no
+    # file is indexed at all
+    try:
+        indexed = set(os.listdir(INDEX_DIR))
+    except FileNotFoundError:
+        return
+    if not indexed:
+        return
+    for root, _, files in os.walk(directory):
+        for name in files:
+            path = index_path(os.path.join(root, name))
+            if os.path.basename(path) in indexed:
+                remove_index(os.path.join(root, name))
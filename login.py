@@ -1,21 +1,17 @@
 #!/usr/bin/env python3
 import argparse
-import json
-import os
-from datetime import datetime
-
-LOG_PATH = os.path.join(os.path.expanduser("~"), "ID1FS/log")
-LOG_FILE_NAME = "execution_log.txt"
+from execution_log import log_execution
+from session import open_session, close_session
 
 def login():
     if check_user_credentials():
         print("Login successful!")
         save_login_status(True)
-        log_execution("Login", True)
+        log_execution("Login", success=True)
     else:
         print("Login failed. Exiting.")
         save_login_status(False)
-        log_execution("Login", False)
+        log_execution("Login", success=False)
 
 def check_user_credentials():
     # Simulate successful credential verification
@@ -24,29 +20,22 @@ def check_user_credentials():
 def logout():
     print("Logout successful.")
     save_login_status(False)
-    log_execution("Logout", True)
+    log_execution("Logout", success=True)
 
 def save_login_status(status):
-    file_path = os.path.join(os.path.expanduser("~"), "ID1FS/metadata/login_status.json")
-    with open(file_path, "w") as status_file:
-        json.dump({"status": status}, status_file)
-
-def log_execution(action, success):
-    log_file_path = os.path.join(LOG_PATH, LOG_FILE_NAME)
-
-    with open(log_file_path, "a") as log_file:
-        log_file.write(f"Action: {action}\n")
-        log_file.write(f"Timestamp: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-        log_file.write(f"Success: {success}\n")
-        log_file.write("\n")
+    # Ouvre ou ferme la session de l'utilisateur courant
+    if status:
+        open_session()
+    else:
+        close_session()
 
-def main():
+def build_parser():
     parser = argparse.ArgumentParser(description="Login script")
     parser.add_argument("-s", "--login", action="store_true", help="Login")
     parser.add_argument("-q", "--logout", action="store_true", help="Logout")
+    return parser
 
-    args = parser.parse_args()
-
+def run(args):
     if args.login:
         login()
     elif args.logout:
@@ -54,6 +43,10 @@ def main():
     else:
         print("Invalid option. Use -s to login or -q to logout.")
 
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    run(args)
+
 if __name__ == "__main__":
     main()
 
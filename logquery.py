@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+import argparse
+import fnmatch
+import json
+import os
+import sqlite3
+import sys
+import time
+import execution_log
+from status import check_login_status
+from execution_log import log_execution
+from stats import TIMESTAMP_FORMAT, parse_time, parse_until
+
+# Index creux : un bloc tous les BLOCK_RECORDS enregistrements, avec son intervalle de dates et ses actions
+BLOCK_RECORDS = 512
+FOLLOW_INTERVAL = 0.5
+
+
+def parse_records(log_file, offset, is_json):
+    # Lecture en flux depuis offset : (début, fin, enregistrement) pour chaque enregistrement complet.
+    # Les positions sont celles du contenu décompressé pour les segments .gz/.xz
+    log_file.seek(offset)
+    start = offset
+    lines = []
+    for line in log_file:
+        end = offset + len(line)
+        if is_json:
+            if line.endswith(b"\n"):
+                try:
+                    yield offset, end, json.loads(line)
+                except ValueError:
+                    pass
+            offset = start = end
+            continue
+
+        offset = end
+        if line.strip():
+            lines.append(line.decode("utf-8", errors="replace"))
+            continue
+        if lines and line.endswith(b"\n"):
+            for record in execution_log.parse_text(lines):
+                yield start, end, record
+        lines = []
+        start = end
+
+
+def get_index(log_path):
+    connection = sqlite3.connect(log_path + ".idx", isolation_level=None)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value)")
+    connection.execute(
+        "CREATE TABLE IF NOT EXISTS blocks (id INTEGER PRIMARY KEY, start INTEGER NOT NULL, end INTEGER NOT NULL, "
+        "min_ts TEXT, max_ts TEXT, records INTEGER NOT NULL)"
+    )
+    connection.execute("CREATE TABLE IF NOT EXISTS block_actions (action TEXT NOT NULL, block_id INTEGER NOT NULL, PRIMARY KEY (action, block_id)) WITHOUT ROWID")
+    return connection
+
+
+def _get_state(connection, key):
+    row = connection.execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else None
+
+
+def update_index(connection, log_path, is_json, closed=False):
+    # Reprend au début du dernier bloc (incomplet). Le fichier actif est réindexé s'il a été remplacé ou tronqué ;
+    # un segment fermé ne change plus (sa compression garde les positions), son index est seulement complété une fois
+    if closed and _get_state(connection, "complete"):
+        return _get_state(connection, "indexed_offset")
+    try:
+        stat_info = os.stat(log_path)
+    except FileNotFoundError:
+        stat_info = None
+
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        identity = f"{stat_info.st_dev}:{stat_info.st_ino}" if stat_info else None
+        indexed = _get_state(connection, "indexed_offset") or 0
+        if not closed and (identity != _get_state(connection, "identity") or stat_info is None or stat_info.st_size < indexed):
+            connection.execute("DELETE FROM blocks")
+            connection.execute("DELETE FROM block_actions")
+            indexed = 0
+
+        offset = indexed
+        last = connection.execute("SELECT id, start, records FROM blocks ORDER BY id DESC LIMIT 1").fetchone()
+        if last and last[2] < BLOCK_RECORDS:
+            connection.execute("DELETE FROM block_actions WHERE block_id = ?", (last[0],))
+            connection.execute("DELETE FROM blocks WHERE id = ?", (last[0],))
+            offset = last[1]
+
+        if stat_info is not None and (closed or offset < stat_info.st_size):
+            with execution_log.open_segment(log_path) as log_file:
+                block = None
+                for start, end, record in parse_records(log_file, offset, is_json):
+                    if block is None:
+                        block = {'start': start, 'min_ts': None, 'max_ts': None, 'records': 0, 'actions': set()}
+                    timestamp = record.get('timestamp')
+                    if timestamp:
+                        block['min_ts'] = min(block['min_ts'] or timestamp, timestamp)
+                        block['max_ts'] = max(block['max_ts'] or timestamp, timestamp)
+                    block['actions'].add(record.get('action', ''))
+                    block['records'] += 1
+                    block['end'] = offset = end
+                    if block['records'] >= BLOCK_RECORDS:
+                        _store_block(connection, block)
+                        block = None
+                if block is not None:
+                    _store_block(connection, block)
+
+        connection.execute("INSERT OR REPLACE INTO state (key, value) VALUES ('identity', ?)", (identity,))
+        connection.execute("INSERT OR REPLACE INTO state (key, value) VALUES ('indexed_offset', ?)", (offset,))
+        if closed:
+            connection.execute("INSERT OR REPLACE INTO state (key, value) VALUES ('complete', 1)")
+        connection.execute("COMMIT")
+    except Exception:
+        connection.execute("ROLLBACK")
+        raise
+    return offset
+
+
+def _store_block(connection, block):
+    block_id = connection.execute(
+        "INSERT INTO blocks (start, end, min_ts, max_ts, records) VALUES (?, ?, ?, ?, ?)",
+        (block['start'], block['end'], block['min_ts'], block['max_ts'], block['records'])
+    ).lastrowid
+    connection.executemany("INSERT OR IGNORE INTO block_actions (action, block_id) VALUES (?, ?)",
+                           ((action, block_id) for action in block['actions']))
+
+
+def matching_actions(connection, pattern):
+    # Motif glob insensible à la casse, résolu sur les noms d'actions connus de l'index
+    names = [action for (action,) in connection.execute("SELECT DISTINCT action FROM block_actions")]
+    return [name for name in names if fnmatch.fnmatchcase(name.lower(), pattern.lower())]
+
+
+def candidate_blocks(connection, since, until, actions):
+    query = "SELECT id, start, end FROM blocks WHERE 1"
+    parameters = []
+    if since:
+        query += " AND (max_ts IS NULL OR max_ts >= ?)"
+        parameters.append(since)
+    if until:
+        query += " AND (min_ts IS NULL OR min_ts <= ?)"
+        parameters.append(until)
+    if actions is not None:
+        query += f" AND id IN (SELECT block_id FROM block_actions WHERE action IN ({','.join('?' * len(actions))}))"
+        parameters.extend(actions)
+    return connection.execute(query + " ORDER BY start", parameters).fetchall()
+
+
+def record_matches(record, filters):
+    timestamp = record.get('timestamp', '')
+    if filters['since'] and timestamp < filters['since']:
+        return False
+    if filters['until'] and timestamp > filters['until']:
+        return False
+    if filters['action'] and not fnmatch.fnmatchcase(record.get('action', '').lower(), filters['action'].lower()):
+        return False
+    if filters['label'] and record.get('label', '').lower() != filters['label'].lower():
+        return False
+    if filters['grep'] and filters['grep'].lower() not in str(record.get('details', '')).lower():
+        return False
+    return True
+
+
+def plan(log_path, filters, is_json, closed):
+    # Met l'index à jour et retourne (blocs à relire, position de fin de la partie indexée)
+    connection = get_index(log_path)
+    try:
+        indexed = update_index(connection, log_path, is_json, closed)
+        actions = None
+        if filters['action']:
+            actions = matching_actions(connection, filters['action'])
+            if not actions:
+                return [], indexed
+        return candidate_blocks(connection, filters['since'], filters['until'], actions), indexed
+    finally:
+        connection.close()
+
+
+def scan_blocks(log_path, blocks, filters, is_json):
+    # Seuls les blocs dont l'intervalle de dates et les actions peuvent correspondre sont relus, par seek
+    # (toujours vers l'avant, ce qui reste peu coûteux dans un segment compressé)
+    if not blocks:
+        return
+    with execution_log.open_segment(log_path) as log_file:
+        for _, start, end in blocks:
+            for _, record_end, record in parse_records(log_file, start, is_json):
+                if record_end > end:
+                    break
+                if record_matches(record, filters):
+                    yield record
+
+
+def query(file_name, filters, limit=None):
+    # Segments du plus ancien au plus récent, puis le fichier actif
+    is_json = file_name == execution_log.JSON_LOG_FILE_NAME
+    active = os.path.join(execution_log.LOG_PATH, file_name)
+    found = 0
+    for path in execution_log.segment_paths(file_name):
+        blocks, _ = plan(path, filters, is_json, path != active)
+        for record in scan_blocks(path, blocks, filters, is_json):
+            if limit is not None and found >= limit:
+                return
+            yield record
+            found += 1
+
+
+def indexed_offset(log_path):
+    connection = get_index(log_path)
+    try:
+        return _get_state(connection, "indexed_offset") or 0
+    finally:
+        connection.close()
+
+
+def follow(log_path, filters, offset, is_json):
+    # Suivi de la fin du journal : on ne relit que ce qui a été ajouté depuis offset.
+    # Après une rotation, la fin de l'ancien fichier est lue avant de passer au nouveau
+    log_file = None
+    try:
+        while True:
+            if log_file is None:
+                try:
+                    log_file = open(log_path, "rb")
+                except FileNotFoundError:
+                    time.sleep(FOLLOW_INTERVAL)
+                    continue
+            try:
+                rotated = os.stat(log_path).st_ino != os.fstat(log_file.fileno()).st_ino
+            except FileNotFoundError:
+                rotated = True
+            if os.fstat(log_file.fileno()).st_size < offset:
+                offset = 0
+            for _, end, record in parse_records(log_file, offset, is_json):
+                offset = end
+                # Les enregistrements "Log Query" de logquery lui-même ne sont pas des nouveautés à suivre
+                if record.get('action') == "Log Query":
+                    continue
+                if record_matches(record, filters):
+                    yield record
+            if rotated:
+                log_file.close()
+                log_file = None
+                offset = 0
+                continue
+            time.sleep(FOLLOW_INTERVAL)
+    finally:
+        if log_file is not None:
+            log_file.close()
+
+
+def print_record(record, as_json):
+    if as_json:
+        print(json.dumps(record, ensure_ascii=False), flush=True)
+    else:
+        sys.stdout.write(execution_log.format_text(dict({'label': "Action"}, **record)))
+        sys.stdout.flush()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Interroger le journal d'exécution à l'aide de son index creux.")
+    parser.add_argument('--since', type=parse_time, metavar='DATE', help='Enregistrements à partir de DATE (AAAA-MM-JJ[ HH:MM[:SS]])')
+    parser.add_argument('--until', type=parse_until, metavar='DATE', help='Enregistrements jusqu\'à DATE incluse')
+    parser.add_argument('--action', metavar='MOTIF', help='Action exacte ou motif glob, sans tenir compte de la casse (ex. "*Deletion Error")')
+    parser.add_argument('--label', metavar='LIBELLÉ', help='Libellé de l\'enregistrement (Action, Timing, ...)')
+    parser.add_argument('--grep', metavar='TEXTE', help='Texte recherché dans les détails')
+    parser.add_argument('-n', '--limit', type=int, metavar='N', help='Afficher au plus N enregistrements')
+    parser.add_argument('-f', '--follow', action='store_true', help='Continuer à afficher les nouveaux enregistrements')
+    parser.add_argument('--json', action='store_true', help='Afficher un enregistrement JSON par ligne')
+    return parser
+
+
+def run(args):
+    file_name = execution_log.active_log_name()
+    log_path = os.path.join(execution_log.LOG_PATH, file_name)
+    # Les horodatages du journal se comparent comme des chaînes au même format
+    since, until = (value.strftime(TIMESTAMP_FORMAT) if value else None for value in (args.since, args.until))
+    filters = {'since': since, 'until': until, 'action': args.action, 'label': args.label, 'grep': args.grep}
+    # Les enregistrements encore en mémoire dans ce processus doivent être sur disque avant d'être cherchés
+    execution_log.flush()
+
+    count = 0
+    for record in query(file_name, filters, args.limit):
+        print_record(record, args.json)
+        count += 1
+    log_execution("Log Query", f"{count} record(s) matched in '{log_path}'.")
+
+    if args.follow:
+        offset = indexed_offset(log_path) if os.path.exists(log_path) else 0
+        execution_log.flush()
+        try:
+            for record in follow(log_path, filters, offset, file_name == execution_log.JSON_LOG_FILE_NAME):
+                print_record(record, args.json)
+        except KeyboardInterrupt:
+            pass
+
+
+def main(argv=None):
+    if not check_login_status():
+        print("Le statut de connexion est désactivé. Veuillez activer le système.")
+        log_execution("Error", "Script execution failed: Login status is inactive.")
+        return 1
+
+    args = build_parser().parse_args(argv)
+    return run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,100 +1,255 @@
 #!/usr/bin/env python3
 import os
 import argparse
+import heapq
+import json
+import shutil
+import sys
+import time
+import metadata_store
 from datetime import datetime
 from status import check_login_status
+from execution_log import log_execution, record_span
 
 ID1FS_PATH = os.path.expanduser("~/ID1FS")
-LOG_PATH = os.path.join(ID1FS_PATH, "log")
-LOG_FILE_NAME = "execution_log.txt"
-
-
-def log_execution(action, details):
-    log_file_path = os.path.join(LOG_PATH, LOG_FILE_NAME)
-
-    with open(log_file_path, "a") as log_file:
-        log_file.write(f"Action: {action}\n")
-        log_file.write(f"Timestamp: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-        log_file.write(f"Details: {details}\n")
-        log_file.write("\n")
-
-
-def list_directory_content(path, include_subdirectories, include_files):
-    for element in os.listdir(path):
-        element_path = os.path.join(path, element)
-        if os.path.isfile(element_path) and include_files:
-            print(element)
-            if include_subdirectories:
-                with open(element_path, 'r') as file_content:
-                    content = file_content.read()
-                    print(f"    Contenu du fichier:\n{content}")
-        elif os.path.isdir(element_path) and include_subdirectories:
-            print(f"{element} (dossier)")
-            if include_files:
-                for sous_element in os.listdir(element_path):
-                    print(f"  {sous_element}")
-
-
-# Vérifiez le statut avant d'exécuter le script principal
-if check_login_status():
-    os.chdir(ID1FS_PATH)  # Changez le répertoire de travail vers ~/ID1FS
-
+HOME_PATH = os.path.join(ID1FS_PATH, "home")
+SORT_KEYS = {
+    'name': lambda item: item['name'],
+    'size': lambda item: item['size'],
+    'mtime': lambda item: item['mtime'],
+}
+
+
+def describe(name, entry, with_stat):
+    item = {'name': name, 'type': 'd' if entry.is_dir() else '-'}
+    if with_stat:
+        # DirEntry met en cache le résultat : un seul stat par entrée
+        stat_info = entry.stat()
+        item.update({
+            'mode': stat_info.st_mode,
+            'nlink': stat_info.st_nlink,
+            'uid': stat_info.st_uid,
+            'gid': stat_info.st_gid,
+            'size': stat_info.st_size,
+            'mtime': stat_info.st_mtime,
+        })
+    return item
+
+
+def describe_record(name, record):
+    return {
+        'name': name,
+        'type': 'd' if record['is_directory'] else '-',
+        'mode': record['mode'],
+        'nlink': record['nlink'],
+        'uid': record['owner'],
+        'gid': record['group'],
+        'size': record['size'],
+        'mtime': record['mtime'],
+    }
+
+
+def live_items(directory, prefix, with_stat, record):
+    # Lecture du disque ; avec record=True, le résultat est enregistré pour les prochains listages
+    try:
+        mtime_ns = os.stat(directory).st_mtime_ns
+        entries = os.scandir(directory)
+    except OSError as e:
+        print(f"Impossible de lire le répertoire {directory}: {e}", file=sys.stderr)
+        return []
+
+    items = []
+    records = []
+    with entries:
+        for entry in entries:
+            item = describe(prefix + entry.name, entry, with_stat or record)
+            items.append((item, entry.path if entry.is_dir(follow_symlinks=False) else None))
+            if record:
+                records.append((os.path.relpath(entry.path, HOME_PATH), metadata_store.make_record(entry.path, entry.stat())))
+
+    if record:
+        with metadata_store.batch():
+            for name, entry_record in records:
+                metadata_store.put_metadata(name, entry_record)
+            # Les enfants enregistrés qui ne sont plus sur le disque sont oubliés avant de déclarer le répertoire à jour
+            seen = {entry_record['path'] for _, entry_record in records}
+            for name, stored in list(metadata_store.iter_children(directory)):
+                if os.path.normpath(stored['path']) not in seen:
+                    metadata_store.remove_metadata(name)
+                    if stored.get('is_directory'):
+                        metadata_store.remove_metadata_tree(os.path.normpath(stored['path']))
+                        metadata_store.forget_directory_state(os.path.normpath(stored['path']))
+            metadata_store.set_directory_state(directory, mtime_ns)
+    return items
+
+
+def metadata_items(directory, prefix):
+    # Un seul stat (celui du répertoire) quand son contenu est connu dans les métadonnées
+    try:
+        mtime_ns = os.stat(directory).st_mtime_ns
+    except OSError:
+        return None
+    if metadata_store.get_directory_state(directory) != mtime_ns:
+        return None
+
+    items = []
+    for _, record in metadata_store.iter_children(directory):
+        if 'mode' not in record:
+            # Ancienne entrée sans les champs bruts : stat réel pour celle-ci seulement
+            try:
+                record = metadata_store.make_record(record['path'], os.stat(record['path']))
+            except OSError:
+                continue
+        item = describe_record(prefix + os.path.basename(record['path']), record)
+        items.append((item, record['path'] if record['is_directory'] else None))
+    return items
+
+
+def iter_items(path, recursive, source, with_stat):
+    # Parcours en profondeur : chaque répertoire est servi par les métadonnées s'il n'a pas changé, sinon par os.scandir.
+    # Ajouter à un fichier ne change pas la date de son répertoire : par défaut, tailles et dates viennent toujours
+    # du disque, les métadonnées ne servent que les noms et les types (--from-metadata les utilise pour tout)
+    path = os.path.normpath(path)
+    use_metadata = source == 'metadata' or (source == 'auto' and not with_stat)
+    stack = [(path, "")]
+    start = time.perf_counter()
+    entries = 0
+    try:
+        while stack:
+            directory, prefix = stack.pop()
+            items = None
+            in_home = directory == HOME_PATH or directory.startswith(HOME_PATH + os.sep)
+            if use_metadata and in_home:
+                items = metadata_items(directory, prefix)
+            if items is None:
+                items = live_items(directory, prefix, with_stat, source == 'metadata' and in_home)
+
+            subdirectories = []
+            for item, subdirectory in items:
+                entries += 1
+                yield item
+                if recursive and subdirectory:
+                    subdirectories.append((subdirectory, item['name'] + "/"))
+            stack.extend(reversed(subdirectories))
+    finally:
+        record_span("list", time.perf_counter() - start, entries=entries)
+
+
+def format_long(item):
+    date_modification = datetime.utcfromtimestamp(item['mtime']).strftime('%Y-%m-%d %H:%M:%S')
+    return f"{item['type']}{item['mode']:04o} {item['nlink']} {item['uid']} {item['gid']} {item['size']} {date_modification} {item['name']}"
+
+
+def select_entries(args, path):
+    with_stat = args.long or args.json or args.sort in ('size', 'mtime') or args.largest is not None or args.newest is not None
+    items = iter_items(path, args.recursive, args.source, with_stat)
+    if args.fichiers:
+        items = (item for item in items if item['type'] == '-')
+    elif args.repertoires:
+        items = (item for item in items if item['type'] == 'd')
+    elif args.caches:
+        items = (item for item in items if os.path.basename(item['name']).startswith('.'))
+
+    # Top-k avec heapq : la mémoire reste bornée à N entrées
+    if args.largest is not None:
+        return heapq.nlargest(args.largest, items, key=SORT_KEYS['size'])
+    if args.newest is not None:
+        return heapq.nlargest(args.newest, items, key=SORT_KEYS['mtime'])
+    if args.sort:
+        return sorted(items, key=SORT_KEYS[args.sort], reverse=args.reverse)
+    return items
+
+
+def print_items(args, path, items):
+    if args.json:
+        # Tableau JSON écrit au fil de l'eau
+        sys.stdout.write("[")
+        for index, item in enumerate(items):
+            sys.stdout.write(("," if index else "") + "\n  " + json.dumps(item, ensure_ascii=False))
+        sys.stdout.write("\n]\n")
+        return
+
+    for item in items:
+        print(format_long(item) if args.long else item['name'])
+        if args.fichiers and args.repertoires and item['type'] == '-':
+            print("    Contenu du fichier:", flush=True)
+            with open(os.path.join(path, item['name']), 'rb') as file_content:
+                shutil.copyfileobj(file_content, sys.stdout.buffer)
+            sys.stdout.flush()
+
+
+def build_parser():
     # Configuration de l'analyseur d'arguments
     parser = argparse.ArgumentParser(description="Liste le contenu du répertoire courant avec différentes options.")
     parser.add_argument('path', nargs='?', default='home', help='Chemin du répertoire à lister (par défaut, ~/ID1FS/home)')
-    parser.add_argument('-f', '--fichiers', action='store_true', help='Afficher uniquement les fichiers')
+    parser.add_argument('-f', '--fichiers', action='store_true', help='Afficher uniquement les fichiers (avec -d, affiche aussi leur contenu)')
     parser.add_argument('-d', '--repertoires', action='store_true', help='Afficher uniquement les répertoires')
     parser.add_argument('-a', '--caches', action='store_true', help='Afficher les fichiers cachés')
     parser.add_argument('-l', '--long', action='store_true', help='Afficher les détails des fichiers')
     parser.add_argument('-n', '--nombre', action='store_true', help='Calculer le nombre de fichiers dans le répertoire')
-
-    # Analyse des arguments de la ligne de commande
-    args = parser.parse_args()
-
-    # Vérifiez si le chemin spécifié existe, sinon utilisez le répertoire courant
+    parser.add_argument('-R', '--recursive', action='store_true', help='Lister récursivement les sous-répertoires')
+    parser.add_argument('--sort', choices=sorted(SORT_KEYS), help='Trier par nom, taille ou date de modification')
+    parser.add_argument('--reverse', action='store_true', help='Inverser l\'ordre du tri')
+    top = parser.add_mutually_exclusive_group()
+    top.add_argument('--largest', type=int, metavar='N', help='Afficher les N entrées les plus volumineuses')
+    top.add_argument('--newest', type=int, metavar='N', help='Afficher les N entrées modifiées le plus récemment')
+    parser.add_argument('--json', action='store_true', help='Afficher le résultat au format JSON')
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--from-metadata', dest='source', action='store_const', const='metadata',
+                        help='Servir le listage depuis les métadonnées, tailles et dates comprises (sans stat des fichiers), et y enregistrer les répertoires modifiés')
+    source.add_argument('--live', dest='source', action='store_const', const='live',
+                        help='Toujours lire le disque, sans utiliser les métadonnées')
+    parser.set_defaults(source='auto')
+    return parser
+
+
+def run(args):
+    # Le chemin est relatif à ~/ID1FS
     path = os.path.join(ID1FS_PATH, args.path) if args.path else ID1FS_PATH
 
-    # Liste les fichiers dans le répertoire spécifié
-    liste_fichiers_courant = os.listdir(path)
-
-    # Filtrer les fichiers et répertoires selon les options
     if args.fichiers:
-        liste_fichiers_courant = [fichier for fichier in liste_fichiers_courant if os.path.isfile(fichier)]
-        print(f"Contenu du répertoire {args.path} (fichiers seulement):")
-        log_execution("List Files", f"Listing files in the directory {args.path}.")
-        for fichier in liste_fichiers_courant:
-            print(fichier)
-            if args.repertoires:
-                with open(fichier, 'r') as file_content:
-                    content = file_content.read()
-                    print(f"    Contenu du fichier:\n{content}")
+        titre, action = "(fichiers seulement)", "List Files"
     elif args.repertoires:
-        liste_fichiers_courant = [fichier for fichier in liste_fichiers_courant if os.path.isdir(fichier)]
-        print(f"les répertoires existants dans le répertoire {args.path}:")
-        log_execution("List Directories", f"Listing directories in the directory {args.path}.")
-        for fichier in liste_fichiers_courant:
-            print(fichier)
+        titre, action = "(répertoires seulement)", "List Directories"
     elif args.caches:
-        liste_fichiers_courant = [fichier for fichier in liste_fichiers_courant if fichier.startswith('.')]
-        print(f"Contenu du répertoire {args.path} (fichiers cachés):")
-        log_execution("List Hidden Files", f"Listing hidden files in the directory {args.path}.")
-        for fichier in liste_fichiers_courant:
-            print(fichier)
+        titre, action = "(fichiers cachés)", "List Hidden Files"
     elif args.long:
-        print(f"Contenu du répertoire {args.path} (détails des fichiers):")
-        log_execution("List File Details", f"Listing file details in the directory {args.path}.")
-        for fichier in liste_fichiers_courant:
-            stat_info = os.stat(fichier)
-            date_modification = datetime.utcfromtimestamp(stat_info.st_mtime).strftime('%Y-%m-%d %H:%M:%S')
-            type_fichier = 'd' if os.path.isdir(fichier) else '-'
-            print(f"{type_fichier}{os.stat(fichier).st_mode:04o} {stat_info.st_nlink} {stat_info.st_uid} {stat_info.st_gid} {stat_info.st_size} {date_modification} {fichier}")
-
-    # Liste les fichiers et répertoires dans le répertoire spécifié
-    print(f"\nContenu du répertoire {args.path}:")
-    log_execution("List All in Directory", f"Listing all files and directories in the directory {args.path}.")
-    list_directory_content(path, args.repertoires, args.fichiers)
-
-else:
-    print("Le statut de connexion est désactivé. Veuillez activer le système.")
-    log_execution("Error", "Connection status is off. Please login first.")
+        titre, action = "(détails des fichiers)", "List File Details"
+    else:
+        titre, action = "", "List All in Directory"
+    if args.recursive:
+        titre = (titre + " (récursif)").strip()
+
+    if not os.path.isdir(path):
+        print(f"Le répertoire {args.path} n'existe pas.")
+        log_execution("Error", f"Directory '{path}' not found.")
+        return 1
+
+    log_execution(action, f"Listing {'recursively ' if args.recursive else ''}the directory {args.path}.")
+    items = select_entries(args, path)
+    suffixe = f" {titre}" if titre else ""
+
+    if args.nombre:
+        nombre = sum(1 for _ in items)
+        print(f"Nombre d'entrées dans le répertoire {args.path}{suffixe}: {nombre}")
+        return
+
+    if not args.json:
+        print(f"Contenu du répertoire {args.path}{suffixe}:")
+    print_items(args, path, items)
+
+
+def main(argv=None):
+    # Vérifiez le statut avant d'exécuter le script principal
+    if not check_login_status():
+        print("Le statut de connexion est désactivé. Veuillez activer le système.")
+        log_execution("Error", "Connection status is off. Please login first.")
+        return 1
+
+    # Analyse des arguments de la ligne de commande
+    args = build_parser().parse_args(argv)
+    return run(args)
+
 
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+import json
+import os
+import sqlite3
+import stat
+from contextlib import contextmanager
+from datetime import datetime
+from execution_log import span
+
+METADATA_DIR = os.path.expanduser("~/ID1FS/metadata")
+METADATA_JSON_PATH = os.path.join(METADATA_DIR, "metadata.json")
+METADATA_DB_PATH = os.path.join(METADATA_DIR, "metadata.db")
+# Usage totals are rolled up for the directories of this tree only
+USAGE_ROOT = os.path.expanduser("~/ID1FS/home")
+
+_connection = None
+_batch_depth = 0
+
+def format_timestamp(timestamp):
+    return datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S')
+
+def make_record(full_path, stat_info):
+    # Raw stat fields are kept next to the formatted ones so listings can be served without a stat
+    return {
+        'path': full_path,
+        'created_at': format_timestamp(stat_info.st_ctime),
+        'last_modified_at': format_timestamp(stat_info.st_mtime),
+        'size': stat_info.st_size,
+        'permissions': oct(stat_info.st_mode & 0o777),
+        'owner': stat_info.st_uid,
+        'group': stat_info.st_gid,
+        'is_directory': stat.S_ISDIR(stat_info.st_mode),
+        'mode': stat_info.st_mode,
+        'nlink': stat_info.st_nlink,
+        'mtime': stat_info.st_mtime,
+        'mtime_ns': stat_info.st_mtime_ns,
+        'inode': stat_info.st_ino
+    }
+
+def parent_of(path):
+    return os.path.dirname(os.path.normpath(path)) if path else ''
+
+def get_connection():
+    global _connection
+    if _connection is None:
+        with span("metadata_open"):
+            _connection = _open_connection()
+    return _connection
+
+def _open_connection():
+    os.makedirs(METADATA_DIR, exist_ok=True)
+    connection = sqlite3.connect(METADATA_DB_PATH, isolation_level=None)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.execute(
+        "CREATE TABLE IF NOT EXISTS metadata ("
+        "name TEXT PRIMARY KEY, path TEXT NOT NULL, parent TEXT, record TEXT NOT NULL)"
+    )
+    connection.execute("CREATE INDEX IF NOT EXISTS metadata_path ON metadata (path)")
+    columns = [row[1] for row in connection.execute("PRAGMA table_info(metadata)")]
+    if 'parent' not in columns:
+        connection.execute("ALTER TABLE metadata ADD COLUMN parent TEXT")
+        connection.executemany(
+            "UPDATE metadata SET parent = ? WHERE name = ?",
+            [(parent_of(path), name) for name, path in connection.execute("SELECT name, path FROM metadata").fetchall()]
+        )
+    connection.execute("CREATE INDEX IF NOT EXISTS metadata_parent ON metadata (parent)")
+    # Directory mtimes at the moment their entries were known to be fully recorded
+    connection.execute("CREATE TABLE IF NOT EXISTS directories (path TEXT PRIMARY KEY, mtime_ns INTEGER NOT NULL)")
+    connection.execute(
+        "CREATE TABLE IF NOT EXISTS trash ("
+        "id TEXT PRIMARY KEY, name TEXT NOT NULL, trashed_at REAL NOT NULL, record TEXT)"
+    )
+    connection.execute("CREATE INDEX IF NOT EXISTS trash_name ON trash (name)")
+    # Recursive totals of the records below each directory (bytes and files, subdirectories), adjusted along the
+    # ancestor path by every metadata write, and optional per-directory limits checked against them
+    usage_missing = connection.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'usage'").fetchone() is None
+    connection.execute(
+        "CREATE TABLE IF NOT EXISTS usage ("
+        "path TEXT PRIMARY KEY, bytes INTEGER NOT NULL, files INTEGER NOT NULL, directories INTEGER NOT NULL)"
+    )
+    connection.execute("CREATE TABLE IF NOT EXISTS quotas (path TEXT PRIMARY KEY, max_bytes INTEGER, max_files INTEGER)")
+    if migrate_json(connection) or usage_missing:
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            _build_usage(connection)
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+    return connection
+
+def migrate_json(connection):
+    # One-shot import of the legacy metadata.json, renamed afterwards so it is not replayed
+    if not os.path.exists(METADATA_JSON_PATH):
+        return False
+
+    metadata = {}
+    with open(METADATA_JSON_PATH, 'r') as metadata_file:
+        try:
+            metadata = json.load(metadata_file)
+        except json.decoder.JSONDecodeError:
+            print("Le fichier de métadonnées est vide ou mal formé. Il sera ignoré.")
+
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        connection.executemany(
+            "INSERT OR IGNORE INTO metadata (name, path, parent, record) VALUES (?, ?, ?, ?)",
+            ((name, record.get('path', ''), parent_of(record.get('path', '')), json.dumps(record)) for name, record in metadata.items())
+        )
+        connection.execute("COMMIT")
+    except Exception:
+        connection.execute("ROLLBACK")
+        raise
+
+    os.replace(METADATA_JSON_PATH, METADATA_JSON_PATH + ".migrated")
+    return True
+
+@contextmanager
+def batch():
+    # Group several mutations into a single transaction; nested batches join the outer one
+    global _batch_depth
+    connection = get_connection()
+    if _batch_depth == 0:
+        connection.execute("BEGIN IMMEDIATE")
+    _batch_depth += 1
+    try:
+        yield connection
+    except Exception:
+        _batch_depth -= 1
+        if _batch_depth == 0:
+            connection.execute("ROLLBACK")
+        raise
+    _batch_depth -= 1
+    if _batch_depth == 0:
+        with span("metadata_commit"):
+            connection.execute("COMMIT")
+
+def commit():
+    # Commit what has been written so far inside a batch and keep the batch open
+    connection = get_connection()
+    if _batch_depth > 0:
+        connection.execute("COMMIT")
+        connection.execute("BEGIN IMMEDIATE")
+
+def savepoint(name):
+    # Inside a batch: mark a point the writes made after it can be rolled back to, without ending the batch
+    get_connection().execute(f"SAVEPOINT {name}")
+
+def release_savepoint(name):
+    get_connection().execute(f"RELEASE {name}")
+
+def rollback_savepoint(name):
+    connection = get_connection()
+    connection.execute(f"ROLLBACK TO {name}")
+    connection.execute(f"RELEASE {name}")
+
+def get_metadata(name):
+    with span("metadata_read", entries=1):
+        row = get_connection().execute("SELECT record FROM metadata WHERE name = ?", (name,)).fetchone()
+    return json.loads(row[0]) if row else None
+
+def put_metadata(name, record):
+    with batch() as connection, span("metadata_write", entries=1):
+        previous = connection.execute("SELECT path, record FROM metadata WHERE name = ?", (name,)).fetchone()
+        if previous:
+            _adjust_usage(connection, previous[0], _usage_of(json.loads(previous[1])), -1)
+        _adjust_usage(connection, record.get('path', ''), _usage_of(record))
+        connection.execute(
+            "INSERT OR REPLACE INTO metadata (name, path, parent, record) VALUES (?, ?, ?, ?)",
+            (name, record.get('path', ''), parent_of(record.get('path', '')), json.dumps(record))
+        )
+
+def update_metadata(name, **fields):
+    with batch() as connection, span("metadata_write", entries=1):
+        record = get_metadata(name)
+        if record is None:
+            return None
+        _adjust_usage(connection, record.get('path', ''), _usage_of(record), -1)
+        record.update(fields)
+        _adjust_usage(connection, record.get('path', ''), _usage_of(record))
+        connection.execute(
+            "UPDATE metadata SET path = ?, parent = ?, record = ? WHERE name = ?",
+            (record.get('path', ''), parent_of(record.get('path', '')), json.dumps(record), name)
+        )
+        return record
+
+def remove_metadata(name):
+    with batch() as connection, span("metadata_write", entries=1):
+        previous = connection.execute("SELECT path, record FROM metadata WHERE name = ?", (name,)).fetchone()
+        if previous is None:
+            return False
+        _adjust_usage(connection, previous[0], _usage_of(json.loads(previous[1])), -1)
+        connection.execute("DELETE FROM metadata WHERE name = ?", (name,))
+        return True
+
+def remove_metadata_tree(directory_path):
+    # Records of everything that lived below a deleted directory; its totals are taken off its ancestors in one go
+    with batch() as connection:
+        totals = get_usage(directory_path)
+        _adjust_usage(connection, directory_path, (totals['bytes'], totals['files'], totals['directories']), -1)
+        connection.execute("DELETE FROM usage WHERE path = ? OR (path >= ? AND path < ?)",
+                           (directory_path, directory_path + "/", directory_path + "0"))
+        cursor = connection.execute("DELETE FROM metadata WHERE path >= ? AND path < ?",
+                                    (directory_path + "/", directory_path + "0"))
+        return cursor.rowcount
+
+def iter_metadata():
+    for name, record in get_connection().execute("SELECT name, record FROM metadata ORDER BY name"):
+        yield name, json.loads(record)
+
+def iter_children(directory_path):
+    # Records whose path is directly inside directory_path, served from the parent index
+    query = "SELECT name, record FROM metadata WHERE parent = ? ORDER BY path"
+    for name, record in get_connection().execute(query, (directory_path,)):
+        yield name, json.loads(record)
+
+def get_directory_state(directory_path):
+    row = get_connection().execute("SELECT mtime_ns FROM directories WHERE path = ?", (directory_path,)).fetchone()
+    return row[0] if row else None
+
+def set_directory_state(directory_path, mtime_ns):
+    with batch() as connection:
+        connection.execute("INSERT OR REPLACE INTO directories (path, mtime_ns) VALUES (?, ?)", (directory_path, mtime_ns))
+
+def refresh_directory_state(directory_path, mtime_ns_before):
+    # After our own change inside a directory: it stays fresh only if nobody else changed it before us
+    with batch() as connection:
+        if get_directory_state(directory_path) == mtime_ns_before:
+            connection.execute("UPDATE directories SET mtime_ns = ? WHERE path = ?",
+                               (os.stat(directory_path).st_mtime_ns, directory_path))
+
+def forget_directory_state(directory_path):
+    with batch() as connection:
+        connection.execute("DELETE FROM directories WHERE path = ? OR (path >= ? AND path < ?)",
+                           (directory_path, directory_path + "/", directory_path + "0"))
+
+def invalidate_directory_state(directory_path):
+    # Only this directory is re-read at the next listing, unlike forget_directory_state which drops the subtree
+    with batch() as connection:
+        connection.execute("DELETE FROM directories WHERE path = ?", (directory_path,))
+
+def usage_ancestors(path):
+    # Directories of USAGE_ROOT that contain path, nearest first, USAGE_ROOT last
+    path = os.path.normpath(path)
+    if not path.startswith(USAGE_ROOT + os.sep):
+        return []
+    ancestors = []
+    while path != USAGE_ROOT:
+        path = os.path.dirname(path)
+        ancestors.append(path)
+    return ancestors
+
+def _usage_of(record):
+    # (bytes, files, directories) that one record adds to each of its ancestors
+    if record.get('is_directory'):
+        return 0, 0, 1
+    return record.get('size') or 0, 1, 0
+
+def _adjust_usage(connection, path, usage, sign=1):
+    if not any(usage):
+        return
+    bytes_delta, files_delta, directories_delta = (sign * value for value in usage)
+    connection.executemany(
+        "INSERT INTO usage (path, bytes, files, directories) VALUES (?, ?, ?, ?) ON CONFLICT (path) DO UPDATE SET "
+        "bytes = bytes + excluded.bytes, files = files + excluded.files, directories = directories + excluded.directories",
+        [(ancestor, bytes_delta, files_delta, directories_delta) for ancestor in usage_ancestors(path)]
+    )
+
+def _build_usage(connection):
+    totals = {}
+    rows = connection.execute("SELECT path, json_extract(record, '$.size'), json_extract(record, '$.is_directory') FROM metadata")
+    for path, size, is_directory in rows:
+        usage = _usage_of({'size': size, 'is_directory': is_directory})
+        for ancestor in usage_ancestors(path):
+            total = totals.setdefault(ancestor, [0, 0, 0])
+            for index, value in enumerate(usage):
+                total[index] += value
+    connection.execute("DELETE FROM usage")
+    connection.executemany("INSERT INTO usage (path, bytes, files, directories) VALUES (?, ?, ?, ?)",
+                           ((path, *total) for path, total in totals.items()))
+    return len(totals)
+
+def rebuild_usage():
+    with batch() as connection:
+        return _build_usage(connection)
+
+def get_usage(directory_path):
+    # One primary key lookup: the totals are maintained on writes, never computed here
+    row = get_connection().execute("SELECT bytes, files, directories FROM usage WHERE path = ?",
+                                   (os.path.normpath(directory_path),)).fetchone()
+    return dict(zip(('bytes', 'files', 'directories'), row or (0, 0, 0)))
+
+def set_quota(directory_path, max_bytes=None, max_files=None):
+    with batch() as connection:
+        connection.execute("INSERT OR REPLACE INTO quotas (path, max_bytes, max_files) VALUES (?, ?, ?)",
+                           (os.path.normpath(directory_path), max_bytes, max_files))
+
+def remove_quota(directory_path):
+    with batch() as connection:
+        return connection.execute("DELETE FROM quotas WHERE path = ?", (os.path.normpath(directory_path),)).rowcount > 0
+
+def iter_quotas():
+    query = ("SELECT quotas.path, max_bytes, max_files, IFNULL(bytes, 0), IFNULL(files, 0) FROM quotas "
+             "LEFT JOIN usage ON usage.path = quotas.path ORDER BY quotas.path")
+    for path, max_bytes, max_files, used_bytes, used_files in get_connection().execute(query):
+        yield {'path': path, 'max_bytes': max_bytes, 'max_files': max_files, 'bytes': used_bytes, 'files': used_files}
+
+def has_quota(path):
+    ancestors = usage_ancestors(path)
+    return bool(ancestors) and get_connection().execute(
+        f"SELECT 1 FROM quotas WHERE path IN ({','.join('?' * len(ancestors))}) LIMIT 1", ancestors).fetchone() is not None
+
+def check_quota(changes):
+    # changes: (path, bytes_delta, files_delta) about to be written. Returns the first quota the changes would
+    # exceed, or None. Only the quotas of the ancestors are looked at, and only growth is refused
+    quotas = {quota['path']: quota for quota in iter_quotas()}
+    if not quotas:
+        return None
+    growth = {}
+    for path, bytes_delta, files_delta in changes:
+        for ancestor in usage_ancestors(path):
+            if ancestor in quotas:
+                total = growth.setdefault(ancestor, [0, 0])
+                total[0] += bytes_delta
+                total[1] += files_delta
+    for ancestor, (bytes_delta, files_delta) in sorted(growth.items(), key=lambda item: -len(item[0])):
+        quota = quotas[ancestor]
+        if (quota['max_bytes'] is not None and bytes_delta > 0 and quota['bytes'] + bytes_delta > quota['max_bytes']) or \
+                (quota['max_files'] is not None and files_delta > 0 and quota['files'] + files_delta > quota['max_files']):
+            return quota
+    return None
+
+def describe_quota(quota):
+    limits = []
+    if quota['max_bytes'] is not None:
+        limits.append(f"{quota['bytes']}/{quota['max_bytes']} octets")
+    if quota['max_files'] is not None:
+        limits.append(f"{quota['files']}/{quota['max_files']} fichiers")
+    return f"'{quota['path']}' ({', '.join(limits)})"
+
+def add_trash_entry(trash_id, name, trashed_at, record):
+    with batch() as connection:
+        connection.execute("INSERT INTO trash (id, name, trashed_at, record) VALUES (?, ?, ?, ?)",
+                           (trash_id, name, trashed_at, json.dumps(record) if record is not None else None))
+
+def get_trash_entry(trash_id_or_name):
+    # By id, or the most recently trashed item with that original name
+    row = get_connection().execute(
+        "SELECT id, name, trashed_at, record FROM trash WHERE id = ? OR name = ? "
+        "ORDER BY id = ? DESC, trashed_at DESC LIMIT 1",
+        (trash_id_or_name, trash_id_or_name, trash_id_or_name)
+    ).fetchone()
+    return _trash_entry(row) if row else None
+
+def remove_trash_entry(trash_id):
+    with batch() as connection:
+        connection.execute("DELETE FROM trash WHERE id = ?", (trash_id,))
+
+def iter_trash():
+    for row in get_connection().execute("SELECT id, name, trashed_at, record FROM trash ORDER BY trashed_at"):
+        yield _trash_entry(row)
+
+def _trash_entry(row):
+    trash_id, name, trashed_at, record = row
+    return {'id': trash_id, 'name': name, 'trashed_at': trashed_at, 'record': json.loads(record) if record else None}
+
+def close():
+    global _connection
+    if _connection is not None:
+        _connection.close()
+        _connection = None
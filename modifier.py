@@ -1,53 +1,46 @@
 #!/usr/bin/python3
 import os
-import json
-from datetime import datetime
 import subprocess
 import argparse
+import sys
+import metadata_store
+import name_index
+import text_index
 from status import check_login_status
+from execution_log import log_execution
 
 # Chemin de base
 base_path = os.path.expanduser('~/ID1FS/home')
-# Chemin du fichier JSON de métadonnées
-metadata_path = os.path.expanduser('~/ID1FS/metadata/metadata.json')
-
-LOG_PATH = os.path.expanduser("~/ID1FS/log")
-LOG_FILE_NAME = "execution_log.txt"
-
-def format_timestamp(timestamp):
-    # Formater le timestamp en une chaîne de date lisible
-    return datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S')
 
 def update_metadata(filename):
-    # Charger les métadonnées existantes depuis le fichier JSON
-    metadata = {}
-    if os.path.exists(metadata_path):
-        with open(metadata_path, 'r') as metadata_file:
-            metadata = json.load(metadata_file)
-
     # Chemin complet du fichier
     full_path = os.path.join(base_path, filename)
 
-    # Vérifier si le fichier est dans les métadonnées
-    if filename in metadata:
-        # Mettre à jour la date de dernière modification
-        stat_info = os.stat(full_path)
-        metadata[filename]['last_modified_at'] = format_timestamp(stat_info.st_mtime)
+    # Mettre à jour la taille, les dates et les droits si le fichier est dans les métadonnées
+    stat_info = os.stat(full_path)
+    fields = metadata_store.make_record(full_path, stat_info)
+    del fields['created_at']
+    record = metadata_store.update_metadata(filename, **fields)
 
-        # Enregistrer les métadonnées mises à jour dans le fichier JSON
-        with open(metadata_path, 'w') as metadata_file:
-            json.dump(metadata, metadata_file, indent=2)
+    name_index.add_path(filename)
+    text_index.index_file(filename)
 
+    if record is not None:
         print(f"Métadonnées mises à jour pour '{full_path}'.")
 
-def log_execution(action, details):
-    log_file_path = os.path.join(LOG_PATH, LOG_FILE_NAME)
-
-    with open(log_file_path, "a") as log_file:
-        log_file.write(f"Action: {action}\n")
-        log_file.write(f"Timestamp: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-        log_file.write(f"Details: {details}\n")
-        log_file.write("\n")  # Add a separator for better readability between log entries
+def revert_if_over_quota(filename, full_path, backup_path):
+    # Le quota est vérifié sur les totaux des répertoires parents ; en cas de dépassement, la version d'avant revient
+    record = metadata_store.get_metadata(filename)
+    if record is None:
+        return False
+    quota = metadata_store.check_quota([(full_path, os.stat(full_path).st_size - record.get('size', 0), 0)])
+    if quota is None:
+        return False
+    import shutil
+    shutil.copyfile(backup_path, full_path)
+    print(f"Quota dépassé pour {metadata_store.describe_quota(quota)} : modifications annulées.")
+    log_execution("Quota Error", f"Edit of '{full_path}' reverted: quota exceeded for {metadata_store.describe_quota(quota)}.")
+    return True
 
 def edit_file_with_nano(filename):
     # Chemin complet du fichier à éditer
@@ -55,26 +48,58 @@ def edit_file_with_nano(filename):
 
     # Vérifier si le fichier existe
     if os.path.exists(full_path):
+        # L'éditeur peut remplacer le fichier, ce qui modifie aussi le répertoire parent
+        parent = os.path.dirname(full_path)
+        parent_mtime_ns = os.stat(parent).st_mtime_ns
+
+        # Sous un quota, la version actuelle est copiée pour pouvoir annuler une édition qui le dépasserait
+        backup_path = None
+        if metadata_store.has_quota(full_path):
+            import shutil
+            import tempfile
+            backup_fd, backup_path = tempfile.mkstemp(prefix="id1fs-edit-")
+            os.close(backup_fd)
+            shutil.copyfile(full_path, backup_path)
+
         # Ouvrir le fichier avec Nano pour modification
         subprocess.run(['nano', full_path])
+        try:
+            reverted = backup_path is not None and revert_if_over_quota(filename, full_path, backup_path)
+        finally:
+            if backup_path is not None:
+                os.remove(backup_path)
+        metadata_store.refresh_directory_state(parent, parent_mtime_ns)
 
         # Mettre à jour les métadonnées après modification
         update_metadata(filename)
 
         # Ajouter une entrée de journal pour l'édition du fichier
-        log_execution("File Edit", f"File '{full_path}' edited with Nano.")
+        if not reverted:
+            log_execution("File Edit", f"File '{full_path}' edited with Nano.")
+        return not reverted
     else:
         log_execution("Error", f"File '{full_path}' not found. Edit operation aborted.")
         print(f"Le fichier '{full_path}' n'existe pas.")
+        return False
 
-if __name__ == "__main__":
+def build_parser():
+    parser = argparse.ArgumentParser(description="Modifier un fichier avec Nano et mettre à jour les métadonnées.")
+    parser.add_argument('fichier', metavar='FICHIER', type=str, help='Le nom du fichier à modifier')
+    return parser
+
+def run(args):
+    # Code de sortie : 1 si le fichier n'existe pas ou si l'édition a été annulée
+    return 0 if edit_file_with_nano(args.fichier) else 1
+
+def main(argv=None):
     # Vérifier le statut avant d'exécuter le script
     if not check_login_status():
         log_execution("Error", "Script execution failed: Login status is inactive.")
         print("Le statut de connexion est désactivé. Veuillez activer le système.")
-    else:
-        parser = argparse.ArgumentParser(description="Modifier un fichier avec Nano et mettre à jour les métadonnées.")
-        parser.add_argument('fichier', metavar='FICHIER', type=str, help='Le nom du fichier à modifier')
-        args = parser.parse_args()
+        return 1
 
-        edit_file_with_nano(args.fichier)
+    args = build_parser().parse_args(argv)
+    return run(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+import fnmatch
+import os
+import re
+import sqlite3
+import time
+from execution_log import span
+
+BASE_PATH = os.path.expanduser("~/ID1FS/home")
+NAME_INDEX_PATH = os.path.expanduser("~/ID1FS/metadata/name_index.db")
+
+_connection = None
+
+def _regexp(pattern, value):
+    return re.search(pattern, value) is not None
+
+def _fnmatch(pattern, value):
+    # Same matching as the walk (fnmatchcase): SQLite GLOB reads "[!...]" as a set containing "!"
+    return fnmatch.fnmatchcase(value, pattern)
+
+def get_connection():
+    global _connection
+    if _connection is None:
+        os.makedirs(os.path.dirname(NAME_INDEX_PATH), exist_ok=True)
+        connection = sqlite3.connect(NAME_INDEX_PATH, isolation_level=None)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute("CREATE TABLE IF NOT EXISTS names (path TEXT PRIMARY KEY, name TEXT NOT NULL)")
+        connection.execute("CREATE INDEX IF NOT EXISTS names_name ON names (name)")
+        # mtime of every indexed directory ("." for the root), to re-list the ones changed by someone else
+        connection.execute("CREATE TABLE IF NOT EXISTS directories (path TEXT PRIMARY KEY, mtime_ns INTEGER)")
+        connection.execute("CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value)")
+        connection.create_function("REGEXP", 2, _regexp, deterministic=True)
+        connection.create_function("FNMATCH", 2, _fnmatch, deterministic=True)
+        _connection = connection
+    return _connection
+
+def _get_state(key):
+    row = get_connection().execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else None
+
+def _set_state(connection, key, value):
+    connection.execute("INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)", (key, value))
+
+def _mtime(relative_path):
+    try:
+        return os.stat(os.path.join(BASE_PATH, relative_path)).st_mtime_ns
+    except OSError:
+        return None
+
+def is_stale():
+    # Never built, or built before the directory mtimes were kept: the caller walks the tree instead.
+    # Changes made by someone else below the root are caught by find(), which re-lists the changed directories
+    return _get_state("built_at") is None or _get_state("directories_tracked") is None
+
+def _subtree_bounds(path):
+    # Every "path/..." string sorts between "path/" and "path0" ('0' follows '/')
+    return path + "/", path + "0"
+
+def _walk(root, directories):
+    # Yields (path, name) for everything under root; the mtime of each directory listed is appended to directories
+    stack = [root]
+    while stack:
+        current = stack.pop()
+        try:
+            # Taken before the listing: a change made during the walk is seen at the next refresh
+            mtime_ns = os.stat(current).st_mtime_ns
+            entries = os.scandir(current)
+        except (FileNotFoundError, NotADirectoryError, PermissionError):
+            continue
+        directories.append((os.path.relpath(current, BASE_PATH), mtime_ns))
+        with entries:
+            for entry in entries:
+                yield os.path.relpath(entry.path, BASE_PATH), entry.name
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+
+def _add_tree(connection, full_path):
+    directories = []
+    connection.executemany("INSERT OR REPLACE INTO names (path, name) VALUES (?, ?)", _walk(full_path, directories))
+    connection.executemany("INSERT OR REPLACE INTO directories (path, mtime_ns) VALUES (?, ?)", directories)
+
+def _forget(connection, relative_path):
+    low, high = _subtree_bounds(relative_path)
+    for table in ("names", "directories"):
+        connection.execute(f"DELETE FROM {table} WHERE path = ? OR (path >= ? AND path < ?)", (relative_path, low, high))
+
+def rebuild():
+    connection = get_connection()
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        connection.execute("DELETE FROM names")
+        connection.execute("DELETE FROM directories")
+        with span("walk"):
+            _add_tree(connection, BASE_PATH)
+        _set_state(connection, "built_at", time.time())
+        _set_state(connection, "directories_tracked", 1)
+        connection.execute("COMMIT")
+    except Exception:
+        connection.execute("ROLLBACK")
+        raise
+    return connection.execute("SELECT COUNT(*) FROM names").fetchone()[0]
+
+def _relist(connection, directory):
+    # Brings the direct children of one changed directory up to date; new subdirectories are walked entirely
+    full_path = os.path.normpath(os.path.join(BASE_PATH, directory))
+    try:
+        mtime_ns = os.stat(full_path).st_mtime_ns
+        with os.scandir(full_path) as entries:
+            on_disk = {os.path.relpath(entry.path, BASE_PATH): entry for entry in entries}
+    except OSError:
+        # Gone: its parent changed as well and forgets it too
+        _forget(connection, directory)
+        return
+    if directory == ".":
+        rows = connection.execute("SELECT path FROM names WHERE instr(path, '/') = 0")
+    else:
+        low, high = _subtree_bounds(directory)
+        rows = connection.execute("SELECT path FROM names WHERE path >= ? AND path < ? AND instr(substr(path, ?), '/') = 0",
+                                  (low, high, len(low) + 1))
+    known = {path for (path,) in rows}
+    for path in known - set(on_disk):
+        _forget(connection, path)
+    for path in set(on_disk) - known:
+        entry = on_disk[path]
+        connection.execute("INSERT OR REPLACE INTO names (path, name) VALUES (?, ?)", (path, entry.name))
+        if entry.is_dir(follow_symlinks=False):
+            _add_tree(connection, entry.path)
+    connection.execute("INSERT OR REPLACE INTO directories (path, mtime_ns) VALUES (?, ?)", (directory, mtime_ns))
+
+def refresh():
+    # One stat per indexed directory: entries are only added or removed in directories whose mtime changed
+    connection = get_connection()
+    changed = [path for path, mtime_ns in connection.execute("SELECT path, mtime_ns FROM directories").fetchall()
+               if _mtime(path) != mtime_ns]
+    if not changed:
+        return 0
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        for directory in changed:
+            _relist(connection, directory)
+        connection.execute("COMMIT")
+    except Exception:
+        connection.execute("ROLLBACK")
+        raise
+    return len(changed)
+
+def _after_change(connection, relative_paths):
+    # Our own changes must not make their parent directories look changed by someone else
+    for parent in {os.path.dirname(relative_path) or "." for relative_path in relative_paths}:
+        connection.execute("UPDATE directories SET mtime_ns = ? WHERE path = ?", (_mtime(parent), parent))
+
+def add_path(relative_path):
+    relative_path = os.path.normpath(relative_path)
+    full_path = os.path.join(BASE_PATH, relative_path)
+    connection = get_connection()
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        connection.execute("INSERT OR REPLACE INTO names (path, name) VALUES (?, ?)",
+                           (relative_path, os.path.basename(relative_path)))
+        if os.path.isdir(full_path):
+            _add_tree(connection, full_path)
+        _after_change(connection, [relative_path])
+        connection.execute("COMMIT")
+    except Exception:
+        connection.execute("ROLLBACK")
+        raise
+
+def add_paths(relative_paths):
+    # Bulk version of add_path for items whose whole content is already known (no walk of directories)
+    relative_paths = [os.path.normpath(relative_path) for relative_path in relative_paths]
+    connection = get_connection()
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        connection.executemany("INSERT OR REPLACE INTO names (path, name) VALUES (?, ?)",
+                               ((relative_path, os.path.basename(relative_path)) for relative_path in relative_paths))
+        connection.executemany("INSERT OR REPLACE INTO directories (path, mtime_ns) VALUES (?, ?)",
+                               ((relative_path, _mtime(relative_path)) for relative_path in relative_paths
+                                if os.path.isdir(os.path.join(BASE_PATH, relative_path))))
+        _after_change(connection, relative_paths)
+        connection.execute("COMMIT")
+    except Exception:
+        connection.execute("ROLLBACK")
+        raise
+
+def remove_path(relative_path):
+    relative_path = os.path.normpath(relative_path)
+    connection = get_connection()
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        _forget(connection, relative_path)
+        _after_change(connection, [relative_path])
+        connection.execute("COMMIT")
+    except Exception:
+        connection.execute("ROLLBACK")
+        raise
+
+def find(pattern, mode="exact", limit=None):
+    if mode == "exact":
+        query, parameters = "SELECT path FROM names WHERE name = ?", (pattern,)
+    elif mode == "prefix":
+        query, parameters = "SELECT path FROM names WHERE name >= ? AND name < ?", (pattern, pattern + "\U0010ffff")
+    elif mode == "glob":
+        # GLOB agrees with fnmatch on "*" and "?" and is evaluated by SQLite itself; sets go through fnmatch
+        operator = "FNMATCH(?, name)" if "[" in pattern else "name GLOB ?"
+        query, parameters = f"SELECT path FROM names WHERE {operator}", (pattern,)
+    elif mode == "regex":
+        query, parameters = "SELECT path FROM names WHERE name REGEXP ?", (pattern,)
+    else:
+        raise ValueError(f"Unknown search mode '{mode}'")
+
+    # Shallowest first, then by path, like the walk of trouver.py
+    query += " ORDER BY length(path) - length(replace(path, '/', '')), path"
+    refresh()
+    results = []
+    vanished = []
+    with span("name_lookup") as counters:
+        for (relative_path,) in get_connection().execute(query, parameters):
+            full_path = os.path.join(BASE_PATH, relative_path)
+            # Entries removed behind our back are dropped from the index as they are found
+            if not os.path.lexists(full_path):
+                vanished.append(relative_path)
+                continue
+            results.append(full_path)
+            if limit is not None and len(results) >= limit:
+                break
+        counters['entries'] = len(results)
+
+    for relative_path in vanished:
+        remove_path(relative_path)
+    return results
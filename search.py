@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+import argparse
+import sys
+import os
+import text_index
+from status import check_login_status
+from execution_log import log_execution
+
+BASE_PATH = os.path.expanduser("~/ID1FS/home")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Rechercher dans le contenu des fichiers de ~/ID1FS/home à l'aide de l'index plein texte.")
+    parser.add_argument('query', nargs='?', help='Termes recherchés : mot, mot* (préfixe) ou "une phrase exacte"')
+    parser.add_argument('-l', '--files-only', action='store_true', help='Afficher seulement les chemins des fichiers trouvés')
+    parser.add_argument('-m', '--max-lines', type=int, default=1, metavar='N', help='Nombre de lignes d\'extrait par fichier (défaut: 1)')
+    parser.add_argument('--limit', type=int, metavar='N', help='Afficher au plus N fichiers')
+    parser.add_argument('--rebuild-index', action='store_true', help='Reconstruire l\'index plein texte')
+    parser.add_argument('-j', '--jobs', type=int, help='Nombre de processus pour --rebuild-index (défaut: nombre de CPU)')
+    return parser
+
+
+def run(args):
+    if args.rebuild_index:
+        indexed = text_index.rebuild(args.jobs)
+        print(f"Index plein texte reconstruit : {indexed} fichier(s) indexé(s).")
+        log_execution("Text Index", f"Full-text index rebuilt with {indexed} files.")
+    if not args.query:
+        if not args.rebuild_index:
+            build_parser().print_help()
+        return
+    if not text_index.is_built():
+        print("L'index plein texte n'a pas encore été construit. Lancez d'abord search.py --rebuild-index.")
+        log_execution("Search Error", "Full-text index has not been built.")
+        return 1
+
+    paths = text_index.search(args.query, args.limit)
+    if not paths:
+        print(f"Aucun fichier ne contient '{args.query}'.")
+        log_execution("Search", f"Query '{args.query}' matched no file.")
+        return 1
+    for relative_path in paths:
+        if args.files_only:
+            print(os.path.join(BASE_PATH, relative_path))
+            continue
+        try:
+            snippets = text_index.snippets(relative_path, args.query, args.max_lines)
+        except OSError:
+            continue
+        for line_number, line in snippets:
+            print(f"{relative_path}:{line_number}: {line}")
+    log_execution("Search", f"Query '{args.query}' matched {len(paths)} file(s).")
+
+
+def main(argv=None):
+    if not check_login_status():
+        print("Le statut de connexion est désactivé. Veuillez activer le système.")
+        log_execution("Error", "Script execution failed: Login status is inactive.")
+        return 1
+
+    args = build_parser().parse_args(argv)
+    return run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+import fcntl
+import getpass
+import json
+import os
+import time
+from contextlib import contextmanager
+from execution_log import span
+
+SESSIONS_PATH = os.path.join(os.path.expanduser("~"), "ID1FS/metadata/sessions.json")
+SESSIONS_LOCK_PATH = SESSIONS_PATH + ".lock"
+# Durée de validité d'une session en secondes
+SESSION_TTL = 8 * 3600
+
+# Sessions parsed from SESSIONS_PATH, reused as long as the file keeps the same inode, size and mtime
+_cache_key = None
+_cache_sessions = {}
+
+def current_user():
+    return getpass.getuser()
+
+def _file_key(stat_info):
+    return (stat_info.st_ino, stat_info.st_size, stat_info.st_mtime_ns)
+
+def load_sessions():
+    global _cache_key, _cache_sessions
+    try:
+        stat_info = os.stat(SESSIONS_PATH)
+    except FileNotFoundError:
+        _cache_key, _cache_sessions = None, {}
+        return _cache_sessions
+
+    key = _file_key(stat_info)
+    if key != _cache_key:
+        with open(SESSIONS_PATH, "r") as sessions_file:
+            try:
+                sessions = json.load(sessions_file)
+            except json.decoder.JSONDecodeError:
+                sessions = {}
+        _cache_key, _cache_sessions = key, sessions
+    return _cache_sessions
+
+@contextmanager
+def _locked():
+    os.makedirs(os.path.dirname(SESSIONS_PATH), exist_ok=True)
+    with open(SESSIONS_LOCK_PATH, "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def _save_sessions(sessions):
+    # Written to a temporary file then renamed so readers never see a partial file
+    temp_path = f"{SESSIONS_PATH}.{os.getpid()}.tmp"
+    with open(temp_path, "w") as sessions_file:
+        json.dump(sessions, sessions_file)
+    os.replace(temp_path, SESSIONS_PATH)
+
+def _prune(sessions, now):
+    return {user: record for user, record in sessions.items() if record.get("expires_at", 0) > now}
+
+def open_session(user=None, ttl=SESSION_TTL):
+    import secrets
+    user = user or current_user()
+    now = time.time()
+    record = {
+        "token": secrets.token_hex(16),
+        "created_at": now,
+        "expires_at": now + ttl
+    }
+    with _locked():
+        sessions = _prune(dict(load_sessions()), now)
+        sessions[user] = record
+        _save_sessions(sessions)
+    return record
+
+def close_session(user=None):
+    user = user or current_user()
+    with _locked():
+        sessions = _prune(dict(load_sessions()), time.time())
+        sessions.pop(user, None)
+        _save_sessions(sessions)
+
+def get_session(user=None):
+    record = load_sessions().get(user or current_user())
+    if record is None or record.get("expires_at", 0) <= time.time():
+        return None
+    return record
+
+def check_login_status(user=None):
+    with span("login_check"):
+        return get_session(user) is not None
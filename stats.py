@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import math
+import re
+import sys
+from datetime import datetime, timedelta
+import execution_log
+from status import check_login_status
+from execution_log import log_execution
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+DURATION_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+PERCENTILES = (50, 95, 99)
+
+
+def parse_time(value):
+    for time_format in (TIMESTAMP_FORMAT, '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d'):
+        try:
+            return datetime.strptime(value, time_format)
+        except ValueError:
+            pass
+    raise argparse.ArgumentTypeError(f"date invalide '{value}', attendu AAAA-MM-JJ[ HH:MM[:SS]]")
+
+
+def parse_until(value):
+    # Borne incluse : une date sans heure couvre toute la journée (les horodatages sont à la seconde)
+    bound = parse_time(value)
+    try:
+        datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        return bound
+    return bound + timedelta(days=1, seconds=-1)
+
+
+def parse_duration(value):
+    match = re.fullmatch(r"(\d+(?:\.\d+)?)([smhd])", value)
+    if not match:
+        raise argparse.ArgumentTypeError(f"durée invalide '{value}', attendu par exemple 30m, 2h ou 7d")
+    return timedelta(seconds=float(match.group(1)) * DURATION_UNITS[match.group(2)])
+
+
+def percentile(values, rank):
+    # Rang le plus proche sur les valeurs triées
+    return values[max(0, math.ceil(rank / 100 * len(values)) - 1)]
+
+
+def iter_timings(since=None, until=None, command=None):
+    for record in execution_log.read_records():
+        if record.get('label') != "Timing" or (command and record.get('action') != command):
+            continue
+        try:
+            timestamp = datetime.strptime(record['timestamp'], TIMESTAMP_FORMAT)
+            timings = json.loads(record.get('details') or "{}")
+        except (KeyError, ValueError):
+            continue
+        if (since and timestamp < since) or (until and timestamp > until):
+            continue
+        yield record['action'], timings
+
+
+def aggregate(timings, phase=None):
+    # (commande, phase) -> durées par exécution et compteurs cumulés ; "total" est une phase comme les autres
+    stats = {}
+    for command, timing in timings:
+        phases = dict(timing.get('phases', {}))
+        if 'total_ms' in timing:
+            phases['total'] = {'calls': 1, 'ms': timing['total_ms']}
+        for name, totals in phases.items():
+            if phase and name != phase:
+                continue
+            entry = stats.setdefault((command, name), {'ms': [], 'calls': 0, 'bytes': 0, 'entries': 0})
+            entry['ms'].append(totals.get('ms', 0.0))
+            entry['calls'] += totals.get('calls', 0)
+            entry['bytes'] += totals.get('bytes', 0)
+            entry['entries'] += totals.get('entries', 0)
+    return stats
+
+
+def summarize(entry):
+    values = sorted(entry['ms'])
+    seconds = sum(values) / 1000
+    summary = {'runs': len(values), 'calls': entry['calls']}
+    summary.update({f"p{rank}_ms": round(percentile(values, rank), 3) for rank in PERCENTILES})
+    if entry['bytes'] and seconds:
+        summary['bytes_per_s'] = round(entry['bytes'] / seconds)
+    if entry['entries'] and seconds:
+        summary['entries_per_s'] = round(entry['entries'] / seconds)
+    return summary
+
+
+def format_throughput(summary):
+    parts = []
+    if 'bytes_per_s' in summary:
+        parts.append(f"{summary['bytes_per_s'] / (1 << 20):.1f} Mo/s")
+    if 'entries_per_s' in summary:
+        parts.append(f"{summary['entries_per_s']} entrées/s")
+    return ", ".join(parts)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Latences p50/p95/p99 et débits par commande et par phase, d'après les enregistrements Timing du journal.")
+    window = parser.add_mutually_exclusive_group()
+    window.add_argument('--since', type=parse_time, metavar='DATE', help='Ne garder que les exécutions à partir de DATE')
+    window.add_argument('--last', type=parse_duration, metavar='DURÉE', help='Ne garder que les exécutions des dernières DURÉE (30m, 2h, 7d)')
+    parser.add_argument('--until', type=parse_until, metavar='DATE', help='Ne garder que les exécutions jusqu\'à DATE')
+    parser.add_argument('--command', metavar='COMMANDE', help='Seulement cette commande (lst, trouver, ...)')
+    parser.add_argument('--phase', metavar='PHASE', help='Seulement cette phase (total, login_check, walk, ...)')
+    parser.add_argument('--json', action='store_true', help='Afficher le résultat au format JSON')
+    return parser
+
+
+def run(args):
+    since = datetime.now() - args.last if args.last else args.since
+    stats = aggregate(iter_timings(since, args.until, args.command), args.phase)
+    summaries = {key: summarize(entry) for key, entry in sorted(stats.items())}
+
+    if args.json:
+        result = {}
+        for (command, phase), summary in summaries.items():
+            result.setdefault(command, {})[phase] = summary
+        json.dump(result, sys.stdout, indent=2)
+        print()
+    elif not summaries:
+        print("Aucune mesure dans le journal pour cette période.")
+    else:
+        print(f"{'commande':12} {'phase':16} {'exéc.':>6} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10}  débit")
+        for (command, phase), summary in summaries.items():
+            print(f"{command:12} {phase:16} {summary['runs']:6} {summary['p50_ms']:10.3f} {summary['p95_ms']:10.3f} "
+                  f"{summary['p99_ms']:10.3f}  {format_throughput(summary)}")
+    log_execution("Stats", f"Timing statistics computed over {sum(entry['runs'] for entry in summaries.values()) if summaries else 0} measurements.")
+
+
+def main(argv=None):
+    if not check_login_status():
+        print("Le statut de connexion est désactivé. Veuillez activer le système.")
+        log_execution("Error", "Script execution failed: Login status is inactive.")
+        return 1
+
+    args = build_parser().parse_args(argv)
+    return run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,37 +1,27 @@
 #!/usr/bin/env python3
-import json
-import os
+import argparse
+import sys
 from datetime import datetime
+from execution_log import log_execution
+from session import check_login_status, get_session, current_user
 
-LOG_PATH = os.path.join(os.path.expanduser("~"), "ID1FS/log")
-LOG_FILE_NAME = "execution_log.txt"
+def build_parser():
+    return argparse.ArgumentParser(description="Afficher le statut de connexion")
 
-def check_login_status():
-    file_path = os.path.join(os.path.expanduser("~"), "ID1FS/metadata/login_status.json")
-    try:
-        with open(file_path, "r") as status_file:
-            status_data = json.load(status_file)
-            return status_data["status"]
-    except FileNotFoundError:
-        return False
-
-def log_execution(action, success):
-    log_file_path = os.path.join(LOG_PATH, LOG_FILE_NAME)
-
-    with open(log_file_path, "a") as log_file:
-        log_file.write(f"Action: {action}\n")
-        log_file.write(f"Timestamp: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-        log_file.write(f"Success: {success}\n")
-        log_file.write("\n")  # Add a separator for better readability between log entries
-
-def main():
-    if check_login_status():
+def run(args):
+    session = get_session()
+    if session is not None:
         print("Status: ON")
-        log_execution("Check Status", True)
+        print(f"Session: {current_user()} (expire le {datetime.fromtimestamp(session['expires_at']).strftime('%Y-%m-%d %H:%M:%S')})")
+        log_execution("Check Status", success=True)
     else:
         print("Status: OFF")
-        log_execution("Check Status", False)
+        log_execution("Check Status", success=False)
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return run(args)
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
 
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+import argparse
+import sys
+import os
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import metadata_store
+import name_index
+import text_index
+from status import check_login_status
+from execution_log import log_execution, span
+
+BASE_PATH = os.path.expanduser("~/ID1FS/home")
+# Les lectures de répertoires se recouvrent sur plusieurs threads (home sur NFS)
+WORKERS = 8
+COMPARED_FIELDS = ('size', 'mtime_ns', 'inode')
+
+
+def scan_directory(directory, stored_mtime_ns, known_files, full):
+    # Côté thread : uniquement le système de fichiers. Quand le répertoire n'a pas bougé depuis le dernier relevé,
+    # seuls ses fichiers connus sont relus (un stat chacun) : écrire dans un fichier ne change pas la date du répertoire
+    try:
+        mtime_ns = os.stat(directory).st_mtime_ns
+    except OSError:
+        return None, None, None
+    if not full and mtime_ns == stored_mtime_ns:
+        file_stats = []
+        for path in known_files:
+            try:
+                file_stats.append((path, os.stat(path), False))
+            except OSError:
+                pass
+        return mtime_ns, None, file_stats
+
+    entries = []
+    try:
+        with os.scandir(directory) as directory_entries:
+            for entry in directory_entries:
+                try:
+                    stat_info = entry.stat()
+                except OSError:
+                    stat_info = entry.stat(follow_symlinks=False)
+                entries.append((entry.path, stat_info, entry.is_dir(follow_symlinks=False)))
+    except OSError:
+        return None, None, None
+    return mtime_ns, entries, None
+
+
+def compare(entries, stored, changes):
+    # stored : chemin -> (nom, enregistrement) des enfants connus de ce répertoire
+    subdirectories = []
+    for path, stat_info, is_dir in entries:
+        known = stored.pop(path, None)
+        if known is None:
+            changes['added'].append((os.path.relpath(path, BASE_PATH), metadata_store.make_record(path, stat_info)))
+        else:
+            name, record = known
+            if any(record.get(field) != value for field, value in
+                   zip(COMPARED_FIELDS, (stat_info.st_size, stat_info.st_mtime_ns, stat_info.st_ino))):
+                changes['updated'].append((name, metadata_store.make_record(path, stat_info)))
+        if is_dir:
+            subdirectories.append(path)
+
+    for path, (name, record) in stored.items():
+        changes['removed'].append((name, path, record.get('is_directory', False)))
+    return subdirectories
+
+
+def collect_changes(root=BASE_PATH, full=False, workers=WORKERS):
+    # Parcours en largeur : les lectures de la base se font dans ce thread, les scandir dans le pool
+    changes = {'added': [], 'updated': [], 'removed': [], 'directories': [], 'scanned': 0, 'pruned': 0}
+    with span("walk") as counters, ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = {}
+
+        def submit(directory):
+            stored_mtime_ns = metadata_store.get_directory_state(directory)
+            stored = {record['path']: (name, record) for name, record in metadata_store.iter_children(directory)}
+            known_files = [path for path, (_, record) in stored.items() if not record.get('is_directory')]
+            future = executor.submit(scan_directory, directory, stored_mtime_ns, known_files, full)
+            pending[future] = (directory, stored)
+
+        submit(root)
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                directory, stored = pending.pop(future)
+                mtime_ns, entries, file_stats = future.result()
+                if mtime_ns is None:
+                    continue
+                if entries is None:
+                    # Répertoire inchangé : ses fichiers connus sont comparés à leur stat, ses sous-répertoires
+                    # connus sont visités quand même
+                    changes['pruned'] += 1
+                    subdirectories = [path for path, (_, record) in stored.items() if record.get('is_directory')]
+                    compare(file_stats, {path: stored[path] for path, _, _ in file_stats}, changes)
+                else:
+                    changes['scanned'] += 1
+                    subdirectories = compare(entries, stored, changes)
+                    changes['directories'].append((directory, mtime_ns))
+                for subdirectory in subdirectories:
+                    submit(subdirectory)
+        counters['entries'] = changes['scanned'] + changes['pruned']
+    return changes
+
+
+def apply_changes(changes):
+    with metadata_store.batch():
+        for name, record in changes['added'] + changes['updated']:
+            metadata_store.put_metadata(name, record)
+        for name, path, is_directory in changes['removed']:
+            metadata_store.remove_metadata(name)
+            if is_directory:
+                metadata_store.remove_metadata_tree(path)
+                metadata_store.forget_directory_state(path)
+        for directory, mtime_ns in changes['directories']:
+            metadata_store.set_directory_state(directory, mtime_ns)
+
+    if changes['added']:
+        name_index.add_paths([name for name, _ in changes['added']])
+    for _, path, _ in changes['removed']:
+        name_index.remove_path(os.path.relpath(path, BASE_PATH))
+        text_index.remove_path(os.path.relpath(path, BASE_PATH))
+    changed_files = [name for name, record in changes['added'] + changes['updated'] if not record['is_directory']]
+    if changed_files:
+        text_index.index_files(changed_files)
+
+
+def print_report(changes, verbose):
+    if verbose:
+        for name, _ in changes['added']:
+            print(f"+ {name}")
+        for name, _ in changes['updated']:
+            print(f"~ {name}")
+        for name, _, _ in changes['removed']:
+            print(f"- {name}")
+    print(f"{len(changes['added'])} ajout(s), {len(changes['updated'])} mise(s) à jour, {len(changes['removed'])} suppression(s) "
+          f"({changes['scanned']} répertoire(s) relu(s), {changes['pruned']} inchangé(s)).")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Resynchroniser les métadonnées avec le contenu de ~/ID1FS/home.")
+    parser.add_argument('-n', '--dry-run', action='store_true', help='Afficher les différences sans modifier les métadonnées')
+    parser.add_argument('--full', action='store_true', help='Relire tous les répertoires, même ceux dont la date de modification n\'a pas changé (sinon, seuls leurs fichiers connus sont relus)')
+    parser.add_argument('-v', '--verbose', action='store_true', help='Afficher chaque élément ajouté, modifié ou supprimé')
+    parser.add_argument('-j', '--jobs', type=int, default=WORKERS, help=f'Nombre de threads de lecture (défaut: {WORKERS})')
+    return parser
+
+
+def run(args):
+    changes = collect_changes(BASE_PATH, args.full, args.jobs)
+    print_report(changes, args.verbose or args.dry_run)
+    summary = (f"{len(changes['added'])} added, {len(changes['updated'])} updated, {len(changes['removed'])} removed, "
+               f"{changes['scanned']} directories scanned, {changes['pruned']} pruned.")
+    if args.dry_run:
+        log_execution("Sync Dry Run", summary)
+        return
+    apply_changes(changes)
+    log_execution("Sync", summary)
+
+
+def main(argv=None):
+    if not check_login_status():
+        print("Le statut de connexion est désactivé. Veuillez activer le système.")
+        log_execution("Error", "Script execution failed: Login status is inactive.")
+        return 1
+
+    args = build_parser().parse_args(argv)
+    return run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+import os
+import re
+import sqlite3
+import time
+from array import array
+
+BASE_PATH = os.path.expanduser("~/ID1FS/home")
+TEXT_INDEX_PATH = os.path.expanduser("~/ID1FS/metadata/text_index.db")
+# Files bigger than this, or that look binary, are not indexed
+MAX_FILE_SIZE = 64 << 20
+BINARY_PROBE = 8192
+TOKEN = re.compile(r"\w+")
+
+_connection = None
+
+def get_connection():
+    global _connection
+    if _connection is None:
+        os.makedirs(os.path.dirname(TEXT_INDEX_PATH), exist_ok=True)
+        connection = sqlite3.connect(TEXT_INDEX_PATH, isolation_level=None)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute("CREATE TABLE IF NOT EXISTS files (id INTEGER PRIMARY KEY, path TEXT UNIQUE NOT NULL, mtime_ns INTEGER, size INTEGER)")
+        # Postings: one row per (term, file) with the token positions packed as an array of uint32
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS postings ("
+            "term TEXT NOT NULL, file_id INTEGER NOT NULL, positions BLOB NOT NULL, PRIMARY KEY (term, file_id)) WITHOUT ROWID"
+        )
+        connection.execute("CREATE INDEX IF NOT EXISTS postings_file ON postings (file_id)")
+        connection.execute("CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value)")
+        _connection = connection
+    return _connection
+
+def is_built():
+    # Set by the commit of rebuild(); without it the index is empty or half built, and is neither updated nor
+    # searched. A missing file is not created by the check
+    if _connection is None and not os.path.exists(TEXT_INDEX_PATH):
+        return False
+    return get_connection().execute("SELECT value FROM state WHERE key = 'built_at'").fetchone() is not None
+
+def tokenize(text):
+    return TOKEN.findall(text.lower())
+
+def tokenize_file(relative_path):
+    # Runs in the pool workers: returns everything needed to store one file, or None if it is not indexable
+    full_path = os.path.join(BASE_PATH, relative_path)
+    try:
+        stat_info = os.stat(full_path)
+        if stat_info.st_size > MAX_FILE_SIZE:
+            return None
+        with open(full_path, "rb") as file:
+            data = file.read()
+    except (OSError, ValueError):
+        return None
+    if b"\0" in data[:BINARY_PROBE]:
+        return None
+
+    positions = {}
+    for position, term in enumerate(tokenize(data.decode("utf-8", errors="replace"))):
+        positions.setdefault(term, array("I")).append(position)
+    return relative_path, stat_info.st_mtime_ns, stat_info.st_size, {term: terms.tobytes() for term, terms in positions.items()}
+
+def _store(connection, tokenized, replace=True):
+    relative_path, mtime_ns, size, postings = tokenized
+    if replace:
+        _forget(connection, relative_path)
+    file_id = connection.execute("INSERT INTO files (path, mtime_ns, size) VALUES (?, ?, ?)",
+                                 (relative_path, mtime_ns, size)).lastrowid
+    connection.executemany("INSERT INTO postings (term, file_id, positions) VALUES (?, ?, ?)",
+                           ((term, file_id, positions) for term, positions in postings.items()))
+
+def _forget(connection, relative_path):
+    row = connection.execute("SELECT id FROM files WHERE path = ?", (relative_path,)).fetchone()
+    if row:
+        connection.execute("DELETE FROM postings WHERE file_id = ?", row)
+        connection.execute("DELETE FROM files WHERE id = ?", row)
+
+def _walk_files(root):
+    stack = [root]
+    while stack:
+        current = stack.pop()
+        try:
+            entries = os.scandir(current)
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file():
+                    yield os.path.relpath(entry.path, BASE_PATH)
+
+def rebuild(workers=None):
+    # Tokenizing is CPU bound: it is spread over a process pool, the single writer stays in this process
+    from concurrent.futures import ProcessPoolExecutor
+    connection = get_connection()
+    paths = list(_walk_files(BASE_PATH))
+    indexed = 0
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        connection.execute("DELETE FROM postings")
+        connection.execute("DELETE FROM files")
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for tokenized in executor.map(tokenize_file, paths, chunksize=64):
+                if tokenized is not None:
+                    _store(connection, tokenized, replace=False)
+                    indexed += 1
+        connection.execute("INSERT OR REPLACE INTO state (key, value) VALUES ('built_at', ?)", (time.time(),))
+        connection.execute("COMMIT")
+    except BaseException:
+        connection.execute("ROLLBACK")
+        raise
+    return indexed
+
+def index_files(relative_paths):
+    # Incremental update after create/modifier; directories are walked, unindexable files are forgotten
+    if not is_built():
+        return
+    connection = get_connection()
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        for relative_path in relative_paths:
+            relative_path = os.path.normpath(relative_path)
+            full_path = os.path.join(BASE_PATH, relative_path)
+            targets = _walk_files(full_path) if os.path.isdir(full_path) else [relative_path]
+            for target in targets:
+                tokenized = tokenize_file(target)
+                if tokenized is None:
+                    _forget(connection, target)
+                else:
+                    _store(connection, tokenized)
+        connection.execute("COMMIT")
+    except Exception:
+        connection.execute("ROLLBACK")
+        raise
+
+def index_file(relative_path):
+    index_files([relative_path])
+
+def remove_path(relative_path):
+    if not is_built():
+        return
+    relative_path = os.path.normpath(relative_path)
+    connection = get_connection()
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        file_ids = [row[0] for row in connection.execute(
+            "SELECT id FROM files WHERE path = ? OR (path >= ? AND path < ?)",
+            (relative_path, relative_path + "/", relative_path + "0"))]
+        connection.executemany("DELETE FROM postings WHERE file_id = ?", ((file_id,) for file_id in file_ids))
+        connection.executemany("DELETE FROM files WHERE id = ?", ((file_id,) for file_id in file_ids))
+        connection.execute("COMMIT")
+    except Exception:
+        connection.execute("ROLLBACK")
+        raise
+
+def parse_query(query):
+    # "mots entre guillemets" -> phrase, mot* -> prefix, sinon terme ; toutes les clauses doivent correspondre
+    clauses = []
+    for phrase, word in re.findall(r'"([^"]*)"|(\S+)', query):
+        if phrase:
+            terms = tokenize(phrase)
+            if terms:
+                clauses.append(("phrase", terms))
+        elif word.endswith("*") and tokenize(word):
+            clauses.append(("prefix", tokenize(word)[0]))
+        else:
+            terms = tokenize(word)
+            clauses.append(("phrase", terms) if len(terms) > 1 else ("term", terms[0]) if terms else None)
+    return [clause for clause in clauses if clause]
+
+def _postings(connection, term):
+    return {file_id: array("I", positions) for file_id, positions in
+            connection.execute("SELECT file_id, positions FROM postings WHERE term = ?", (term,))}
+
+def _match(connection, clause):
+    kind, value = clause
+    if kind == "term":
+        return {file_id for (file_id,) in connection.execute("SELECT file_id FROM postings WHERE term = ?", (value,))}
+    if kind == "prefix":
+        rows = connection.execute("SELECT DISTINCT file_id FROM postings WHERE term >= ? AND term < ?",
+                                  (value, value + "\U0010ffff"))
+        return {file_id for (file_id,) in rows}
+
+    # Phrase: files holding every word, then a start position p with word i at p + i
+    postings = [_postings(connection, term) for term in value]
+    candidates = set(postings[0])
+    for term_postings in postings[1:]:
+        candidates &= set(term_postings)
+    matches = set()
+    for file_id in candidates:
+        following = [set(term_postings[file_id]) for term_postings in postings[1:]]
+        if any(all(start + offset in positions for offset, positions in enumerate(following, 1))
+               for start in postings[0][file_id]):
+            matches.add(file_id)
+    return matches
+
+def search(query, limit=None):
+    clauses = parse_query(query)
+    if not clauses or not is_built():
+        return []
+    connection = get_connection()
+    file_ids = None
+    for clause in clauses:
+        matches = _match(connection, clause)
+        file_ids = matches if file_ids is None else file_ids & matches
+        if not file_ids:
+            return []
+
+    rows = connection.execute(
+        f"SELECT path FROM files WHERE id IN ({','.join('?' * len(file_ids))}) ORDER BY path", tuple(file_ids))
+    paths = [path for (path,) in rows]
+    return paths[:limit] if limit is not None else paths
+
+def snippets(relative_path, query, max_lines=1):
+    # Lines of the file that contain one of the query words, grep style
+    words = set()
+    for kind, value in parse_query(query):
+        words.update(value if kind == "phrase" else [value])
+    pattern = re.compile("|".join(rf"\b{re.escape(word)}" for word in sorted(words)), re.IGNORECASE)
+    found = []
+    with open(os.path.join(BASE_PATH, relative_path), "r", errors="replace") as file:
+        for line_number, line in enumerate(file, 1):
+            if pattern.search(line):
+                found.append((line_number, line.rstrip("\n")))
+                if len(found) >= max_lines:
+                    break
+    return found
@@ -1,25 +1,59 @@
 #!/usr/bin/python3
-import json
+import fnmatch
 import os
+import re
 import argparse
-from datetime import datetime
-
-LOG_PATH = os.path.join(os.path.expanduser("~"), "ID1FS/log")
-LOG_FILE_NAME = "execution_log.txt"
-
-def check_login_status():
-    file_path = os.path.join(os.path.expanduser("~"), "ID1FS/metadata/login_status.json")
-    try:
-        with open(file_path, "r") as status_file:
-            status_data = json.load(status_file)
-            return status_data["status"]
-    except FileNotFoundError:
-        return False
+import sys
+import name_index
+import walker
+from execution_log import log_execution
+from session import check_login_status
 
 def est_executable(chemin_fichier):
     return os.access(chemin_fichier, os.X_OK)
 
-def chercher_fichier(chemin, nom_fichier, afficher_type, afficher_executable):
+def afficher_resultat(chemin_fichier_trouve, afficher_type, afficher_executable, est_repertoire=None, est_fichier=None):
+    nom_fichier = os.path.basename(chemin_fichier_trouve)
+
+    # Le type est déjà connu quand le résultat vient du parcours (DirEntry), sinon on le lit sur le disque
+    if est_repertoire is None:
+        est_repertoire = os.path.isdir(chemin_fichier_trouve)
+    if est_fichier is None:
+        est_fichier = os.path.isfile(chemin_fichier_trouve)
+
+    if afficher_type:
+        if est_fichier:
+            print(f"Le chemin '{chemin_fichier_trouve}' est un fichier.")
+            log_execution("Search", f"Found file: {chemin_fichier_trouve} (File)")
+        elif est_repertoire:
+            print(f"Le chemin '{chemin_fichier_trouve}' est un répertoire.")
+            log_execution("Search", f"Found file: {chemin_fichier_trouve} (Directory)")
+
+    if afficher_executable:
+        if est_fichier:
+            est_script_executable = est_executable(chemin_fichier_trouve)
+
+            if est_script_executable:
+                print(f"Le fichier '{nom_fichier}' est un script exécutable.")
+                log_execution("Search", f"Found file: {chemin_fichier_trouve} (Executable Script)")
+            else:
+                print(f"Le fichier '{nom_fichier}' est un fichier texte.")
+                log_execution("Search", f"Found file: {chemin_fichier_trouve} (Text File)")
+        else:
+            print(f"Le chemin '{chemin_fichier_trouve}' est un répertoire.")
+            log_execution("Search", f"Found file: {chemin_fichier_trouve} (Directory)")
+
+def construire_filtre(nom_fichier, mode):
+    if mode == "exact":
+        return lambda nom: nom == nom_fichier
+    if mode == "prefix":
+        return lambda nom: nom.startswith(nom_fichier)
+    if mode == "glob":
+        return lambda nom: fnmatch.fnmatchcase(nom, nom_fichier)
+    expression = re.compile(nom_fichier)
+    return lambda nom: expression.search(nom) is not None
+
+def chercher_fichier(chemin, nom_fichier, afficher_type, afficher_executable, mode="exact", tous=False):
     if not nom_fichier:
         print("Erreur : Veuillez fournir un nom de fichier.")
         log_execution("Error", "No file name provided")
@@ -30,72 +64,76 @@ def chercher_fichier(chemin, nom_fichier, afficher_type, afficher_executable):
         log_execution("Error", "Missing -type or -x option")
         return None
 
+    if mode == "regex":
+        # Vérifiée avant la recherche : l'index comme le parcours compileraient l'expression
+        try:
+            re.compile(nom_fichier)
+        except re.error as e:
+            print(f"Erreur : Expression régulière invalide '{nom_fichier}' : {e}")
+            log_execution("Error", f"Invalid regular expression '{nom_fichier}': {e}")
+            return None
+
     chemin = os.path.expanduser(chemin)
+    limite = None if tous else 1
+    resultats = []
 
-    for dossier_actuel, sous_dossiers, fichiers in os.walk(chemin):
-        if nom_fichier in fichiers or nom_fichier in sous_dossiers:
-            chemin_fichier_trouve = os.path.join(dossier_actuel, nom_fichier)
-
-            if afficher_type:
-                est_repertoire = os.path.isdir(chemin_fichier_trouve)
-                est_fichier = os.path.isfile(chemin_fichier_trouve)
-
-                if est_fichier:
-                    print(f"Le chemin '{chemin_fichier_trouve}' est un fichier.")
-                    log_execution("Search", f"Found file: {chemin_fichier_trouve} (File)")
-                elif est_repertoire:
-                    print(f"Le chemin '{chemin_fichier_trouve}' est un répertoire.")
-                    log_execution("Search", f"Found file: {chemin_fichier_trouve} (Directory)")
-
-            if afficher_executable:
-                if os.path.isfile(chemin_fichier_trouve):
-                    est_script_executable = est_executable(chemin_fichier_trouve)
-
-                    if est_script_executable:
-                        print(f"Le fichier '{nom_fichier}' est un script exécutable.")
-                        log_execution("Search", f"Found file: {chemin_fichier_trouve} (Executable Script)")
-                    else:
-                        print(f"Le fichier '{nom_fichier}' est un fichier texte.")
-                        log_execution("Search", f"Found file: {chemin_fichier_trouve} (Text File)")
-                else:
-                    print(f"Le chemin '{chemin_fichier_trouve}' est un répertoire.")
-                    log_execution("Search", f"Found file: {chemin_fichier_trouve} (Directory)")
-
-            return chemin_fichier_trouve
-
-    print(f"Le fichier '{nom_fichier}' n'a pas été trouvé dans le chemin spécifié.")
-    log_execution("Search", f"File not found: {nom_fichier}")
-    return None
-
-def log_execution(action, details):
-    log_file_path = os.path.join(LOG_PATH, LOG_FILE_NAME)
-
-    with open(log_file_path, "a") as log_file:
-        log_file.write(f"Action: {action}\n")
-        log_file.write(f"Timestamp: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-        log_file.write(f"Details: {details}\n")
-        log_file.write("\n")  # Add a separator for better readability between log entries
-
-def main():
+    if os.path.abspath(chemin) == os.path.abspath(name_index.BASE_PATH) and not name_index.is_stale():
+        for chemin_fichier_trouve in name_index.find(nom_fichier, mode, limite):
+            afficher_resultat(chemin_fichier_trouve, afficher_type, afficher_executable)
+            resultats.append(chemin_fichier_trouve)
+    else:
+        # Sans index à jour : parcours parallèle, chaque correspondance est affichée dès qu'elle est trouvée
+        for chemin_fichier_trouve, est_repertoire, est_fichier in walker.walk(chemin, construire_filtre(nom_fichier, mode), limite):
+            afficher_resultat(chemin_fichier_trouve, afficher_type, afficher_executable, est_repertoire, est_fichier)
+            resultats.append(chemin_fichier_trouve)
+
+    if not resultats:
+        print(f"Le fichier '{nom_fichier}' n'a pas été trouvé dans le chemin spécifié.")
+        log_execution("Search", f"File not found: {nom_fichier}")
+        return None
+
+    return resultats if tous else resultats[0]
+
+def build_parser():
     parser = argparse.ArgumentParser(description="Trouver un fichier dans les sous-dossiers du répertoire pré-défini.")
     parser.add_argument("nom_fichier", nargs="?", help="Le nom du fichier ou du répertoire à rechercher.")
     parser.add_argument("-type", "--type", action="store_true", help="Afficher le type du chemin (fichier ou répertoire).")
     parser.add_argument("-x", "--executable", action="store_true", help="Vérifier si le fichier est un script exécutable.")
-
-    args = parser.parse_args()
-    nom_fichier_recherche = args.nom_fichier
+    parser.add_argument("--all", action="store_true", help="Afficher toutes les correspondances au lieu de la première.")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--prefix", dest="mode", action="store_const", const="prefix", help="Rechercher les noms commençant par NOM_FICHIER.")
+    mode.add_argument("--glob", dest="mode", action="store_const", const="glob", help="Interpréter NOM_FICHIER comme un motif glob (*, ?, [...]).")
+    mode.add_argument("--regex", dest="mode", action="store_const", const="regex", help="Interpréter NOM_FICHIER comme une expression régulière.")
+    parser.add_argument("--rebuild-index", action="store_true", help="Reconstruire l'index des noms de fichiers (sinon, un index périmé est remplacé par un parcours parallèle).")
+    parser.set_defaults(mode="exact")
+    return parser
+
+def run(args):
+    if args.rebuild_index:
+        total = name_index.rebuild()
+        print(f"Index des noms reconstruit : {total} entrées.")
+        log_execution("Index Rebuild", f"Name index rebuilt with {total} entries.")
+        if not args.nom_fichier:
+            return 0
+
+    # Remplacez cela par le répertoire que vous souhaitez explorer
+    chemin_recherche = "~/ID1FS/home"
+
+    # Utilisation de la fonction chercher_fichier avec les options ; code de sortie 1 si rien n'est trouvé
+    resultat = chercher_fichier(
+        chemin_recherche, args.nom_fichier,
+        args.type, args.executable,
+        args.mode, args.all
+    )
+    return 0 if resultat is not None else 1
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
 
     if check_login_status():
-        # Remplacez cela par le répertoire que vous souhaitez explorer
-        chemin_recherche = "~/ID1FS/home"
-
-        # Utilisation de la fonction chercher_fichier avec les options
-        resultat = chercher_fichier(
-            chemin_recherche, nom_fichier_recherche,
-            args.type, args.executable
-        )
-    else:
-        print("Le statut de connexion est désactivé. Veuillez activer le système.")
+        return run(args)
+    print("Le statut de connexion est désactivé. Veuillez activer le système.")
+    return 1
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+import os
+import queue
+import threading
+import time
+from execution_log import record_span
+
+# Directory listing is I/O bound (NFS-backed home), so threads overlap the round trips
+WORKERS = 8
+
+_DONE = object()
+
+def _list_directory(directory, match):
+    # One directory, in name order: its matching entries and its subdirectories
+    matches = []
+    subdirectories = []
+    try:
+        with os.scandir(directory) as entries:
+            for entry in sorted(entries, key=lambda entry: entry.name):
+                is_dir = entry.is_dir(follow_symlinks=False)
+                if match(entry.name):
+                    matches.append((entry.path, is_dir or entry.is_dir(), entry.is_file()))
+                if is_dir:
+                    subdirectories.append(entry.path)
+    except OSError:
+        pass
+    return matches, subdirectories
+
+def _walk_by_depth(root, match, limit, workers):
+    # With a limit, the hits must not depend on thread scheduling: the tree is listed one depth at a time
+    # (the directories of a level in parallel) and the hits are yielded shallowest first, in name order
+    from concurrent.futures import ThreadPoolExecutor
+    executor = ThreadPoolExecutor(max_workers=max(1, workers))
+    found = 0
+    try:
+        level = [root]
+        while level:
+            next_level = []
+            for matches, subdirectories in executor.map(lambda directory: _list_directory(directory, match), level):
+                for result in matches:
+                    yield result
+                    found += 1
+                    if found >= limit:
+                        return
+                next_level.extend(subdirectories)
+            level = next_level
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def walk(root, match, limit=None, workers=WORKERS):
+    # Yields (path, is_dir, is_file) for every entry whose name satisfies match(name). Without a limit, hits are
+    # yielded as soon as they are found; with one, the shallowest hits are returned, as os.walk did.
+    # The type information comes from the DirEntry, so callers do not need to stat the hits again.
+    if limit is not None:
+        start = time.perf_counter()
+        found = 0
+        try:
+            for result in _walk_by_depth(root, match, limit, workers):
+                found += 1
+                yield result
+        finally:
+            record_span("walk", time.perf_counter() - start, entries=found)
+        return
+
+    directories = queue.Queue()
+    results = queue.Queue()
+    stop = threading.Event()
+    pending = [1]
+    pending_lock = threading.Lock()
+
+    def worker():
+        while True:
+            directory = directories.get()
+            if directory is _DONE:
+                return
+            try:
+                if not stop.is_set():
+                    with os.scandir(directory) as entries:
+                        for entry in entries:
+                            if stop.is_set():
+                                break
+                            is_dir = entry.is_dir(follow_symlinks=False)
+                            if match(entry.name):
+                                results.put((entry.path, is_dir or entry.is_dir(), entry.is_file()))
+                            if is_dir:
+                                with pending_lock:
+                                    pending[0] += 1
+                                directories.put(entry.path)
+            except OSError:
+                pass
+            finally:
+                with pending_lock:
+                    pending[0] -= 1
+                    finished = pending[0] == 0
+                if finished:
+                    results.put(_DONE)
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(max(1, workers))]
+    for thread in threads:
+        thread.start()
+    directories.put(root)
+
+    found = 0
+    start = time.perf_counter()
+    try:
+        while limit is None or found < limit:
+            result = results.get()
+            if result is _DONE:
+                break
+            found += 1
+            yield result
+    finally:
+        # Early termination: workers stop listing and drain the remaining directories quickly
+        stop.set()
+        for _ in threads:
+            directories.put(_DONE)
+        record_span("walk", time.perf_counter() - start, entries=found)